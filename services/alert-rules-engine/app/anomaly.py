@@ -0,0 +1,212 @@
+"""Streaming mean and variance for ANOMALY rules.
+
+A series is one (service, metric, lookback_minutes) triple; every ANOMALY
+rule on the same triple shares it. Events are summarised per minute of event
+time with Welford's mean and sum of squared deviations, and each closed
+minute is folded into an exponentially weighted mean and variance whose
+span is the lookback, so history is never rescanned and a series costs a
+fixed handful of float32 values: about 32 bytes, a million series in
+tens of MB of arrays plus the key table.
+
+An event is scored against the baseline of the minutes closed before its
+own, so a spike does not dilute the baseline it is measured against. A
+series only scores once ``warmup_minutes`` minutes have closed. Minutes
+without events are skipped rather than decayed.
+"""
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+from .columnar import EventBatch, ServiceIds
+
+# Per-series arrays and their dtypes
+FIELDS = {
+    "mean": np.float32,
+    "var": np.float32,
+    "alpha": np.float32,
+    "closed": np.int32,
+    "minute": np.int32,
+    "count": np.float32,
+    "bucket_mean": np.float32,
+    "bucket_m2": np.float32,
+}
+
+# Which side of the baseline each operator alerts on; == and != mean either
+DIRECTIONS = {">": 1, ">=": 1, "<": -1, "<=": -1, "==": 0, "!=": 0}
+
+
+class SeriesStats:
+    """Array-backed statistics of the series seen in one partition"""
+
+    def __init__(self, capacity: int = 1024):
+        self.slots: Dict[Hashable, int] = {}
+        self._free: List[int] = []
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in FIELDS.items()}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def lookup(self, keys: Iterable[Tuple[Hashable, int]]) -> np.ndarray:
+        """Slots of (series key, lookback minutes), allocating new series"""
+        slots = []
+        for key, lookback in keys:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = self._allocate()
+                self._reset(slot, lookback)
+            slots.append(slot)
+        return np.array(slots, dtype=np.int64)
+
+    def retain(self, live: Iterable[Hashable]):
+        """Free every series not in ``live``"""
+        live = set(live)
+        for key in [key for key in self.slots if key not in live]:
+            self._free.append(self.slots.pop(key))
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self.slots)
+        capacity = len(self.arrays["mean"])
+        if slot >= capacity:
+            for name, values in self.arrays.items():
+                grown = np.zeros(capacity * 2, dtype=values.dtype)
+                grown[:capacity] = values
+                self.arrays[name] = grown
+        return slot
+
+    def _reset(self, slot: int, lookback: int):
+        for values in self.arrays.values():
+            values[slot] = 0
+        self.arrays["alpha"][slot] = 2.0 / (lookback + 1)
+        self.arrays["minute"][slot] = -1
+
+    def close(self, slots: np.ndarray, minute: int):
+        """Fold buckets of minutes before ``minute`` into the baselines"""
+        a = self.arrays
+        stale = slots[a["minute"][slots] < minute]
+        if not len(stale):
+            return
+        full = stale[a["count"][stale] > 0]
+        if len(full):
+            bucket_mean = a["bucket_mean"][full]
+            bucket_var = a["bucket_m2"][full] / a["count"][full]
+            first = a["closed"][full] == 0
+            alpha = np.where(first, 1.0, a["alpha"][full])
+            delta = bucket_mean - a["mean"][full]
+            # Variance of the (1 - alpha, alpha) mixture of baseline and bucket
+            a["var"][full] = (1 - alpha) * a["var"][full] + alpha * bucket_var + alpha * (1 - alpha) * delta * delta
+            a["mean"][full] += alpha * delta
+            a["closed"][full] += 1
+            a["count"][full] = 0
+            a["bucket_mean"][full] = 0
+            a["bucket_m2"][full] = 0
+        a["minute"][stale] = minute
+
+    def score(
+        self, slots: np.ndarray, values: np.ndarray, warmup_minutes: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(z, mean, std): standard deviations from the baseline, NaN while
+        warming up, and the baseline itself"""
+        a = self.arrays
+        mean = a["mean"][slots].astype(np.float64)
+        std = np.sqrt(a["var"][slots].astype(np.float64))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (values - mean) / std
+        z[a["closed"][slots] < warmup_minutes] = np.nan
+        return z, mean, std
+
+    def merge(self, slots: np.ndarray, values: np.ndarray):
+        """Add values to their series' open minute (Chan's parallel update)"""
+        a = self.arrays
+        unique, inverse = np.unique(slots, return_inverse=True)
+        n_b = np.bincount(inverse).astype(np.float64)
+        mean_b = np.bincount(inverse, weights=values) / n_b
+        deviation = values - mean_b[inverse]
+        m2_b = np.bincount(inverse, weights=deviation * deviation)
+
+        n_a = a["count"][unique].astype(np.float64)
+        n = n_a + n_b
+        delta = mean_b - a["bucket_mean"][unique]
+        a["bucket_mean"][unique] += delta * n_b / n
+        a["bucket_m2"][unique] += m2_b + delta * delta * n_a * n_b / n
+        a["count"][unique] = n
+
+
+class AnomalyGroup:
+    """ANOMALY rules on one metric, with their series laid out by service id.
+
+    Series of service id s are series[offsets[s]:offsets[s + 1]]; the rules
+    of series i are rules[rule_offsets[i]:rule_offsets[i + 1]].
+    """
+
+    def __init__(self, metric: str, rules: List, ids: ServiceIds):
+        self.metric = metric
+        by_series: Dict[Tuple[int, int], List] = {}
+        for rule in rules:
+            by_series.setdefault((ids.intern(rule.service), rule.lookback), []).append(rule)
+        ordered = sorted(by_series)
+        # Series keys use names, not ids, so they mean the same in any process
+        self.keys = [
+            ((by_series[(service_id, lookback)][0].service, metric, lookback), lookback)
+            for service_id, lookback in ordered
+        ]
+        services = np.array([service_id for service_id, _ in ordered], dtype=np.int64)
+        counts = np.bincount(services, minlength=len(ids))
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+        self.rules = [rule for series in ordered for rule in by_series[series]]
+        self.rule_offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+        np.cumsum([len(by_series[series]) for series in ordered], out=self.rule_offsets[1:])
+        self.std_devs = np.array([rule.std_devs for rule in self.rules], dtype=np.float64)
+        self.directions = np.array([DIRECTIONS[rule.operator] for rule in self.rules], dtype=np.int8)
+
+    def observe(self, stats: SeriesStats, batch: EventBatch, warmup_minutes: int) -> Tuple[np.ndarray, ...]:
+        """Score a batch against its series, then add it to them.
+
+        Returns parallel arrays (event position, rule position, value, z,
+        mean, std) with a row per rule that fired, minute by minute.
+        """
+        service_id = batch.service_id
+        values = batch.column(self.metric)
+        candidates = np.flatnonzero(
+            (service_id >= 0) & (service_id < len(self.offsets) - 1) & ~np.isnan(values)
+        )
+        starts = self.offsets[service_id[candidates]]
+        counts = self.offsets[service_id[candidates] + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, *(np.zeros(0) for _ in range(4))
+        # One row per (event, series of its service) pair
+        events = np.repeat(candidates, counts)
+        series = np.arange(total) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        unique, inverse = np.unique(series, return_inverse=True)
+        slots = stats.lookup(self.keys[i] for i in unique.tolist())[inverse]
+        pair_values = values[events]
+        minutes = batch.timestamp[events] // 60
+
+        fired = []
+        for minute in np.unique(minutes).tolist():
+            in_minute = np.flatnonzero(minutes == minute)
+            minute_slots = slots[in_minute]
+            minute_values = pair_values[in_minute]
+            stats.close(np.unique(minute_slots), minute)
+            z, mean, std = stats.score(minute_slots, minute_values, warmup_minutes)
+            stats.merge(minute_slots, minute_values)
+            rows, rules = self._fire(series[in_minute], z)
+            fired.append((events[in_minute][rows], rules, minute_values[rows], z[rows], mean[rows], std[rows]))
+        return tuple(np.concatenate(column) for column in zip(*fired))
+
+    def _fire(self, series: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(row, rule position) of every rule that fires on the scored rows"""
+        starts = self.rule_offsets[series]
+        counts = self.rule_offsets[series + 1] - starts
+        rows = np.repeat(np.arange(len(series)), counts)
+        rules = np.arange(int(counts.sum())) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        direction = self.directions[rules]
+        deviation = np.where(direction > 0, z[rows], np.where(direction < 0, -z[rows], np.abs(z[rows])))
+        with np.errstate(invalid="ignore"):
+            fired = deviation > self.std_devs[rules]
+        return rows[fired], rules[fired]
@@ -0,0 +1,210 @@
+"""Local snapshots of per-partition rule state, aligned with committed offsets.
+
+After a batch's offsets are committed, partitions whose state moved since
+their last snapshot are written to ``<checkpoint_dir>/<topic>-<partition>.npz``
+at most once per interval, and again when the partition is revoked. A
+snapshot holds the offset it is exact at plus the RATE windows, run lengths
+(each with the condition it was accumulated under), ANOMALY series and open
+alerts, as flat NumPy arrays written with a rename so a crash never leaves
+half a file.
+
+On assignment the worker restores the snapshot and seeks back to its offset;
+records up to the committed offset are replayed into the state with their
+alerts suppressed, since they were published before. The rule definitions
+are snapshotted alongside, as the window state is keyed by rule id.
+"""
+from prometheus_client import Gauge, Histogram
+from typing import Callable, Dict, List, Optional
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .anomaly import FIELDS, SeriesStats
+from .config import settings
+from .dedup import AlertDeduplicator
+from .engine import PartitionState
+from .models import Rule
+from .windows import RateWindow, RunLength
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DURATION = Histogram(
+    "rules_engine_snapshot_duration_seconds",
+    "Time to write one partition snapshot to disk",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+SNAPSHOT_BYTES = Gauge(
+    "rules_engine_snapshot_bytes",
+    "Size of the latest snapshot of each partition",
+    ["partition"],
+    multiprocess_mode="livemostrecent"
+)
+
+RESTORE_DURATION = Histogram(
+    "rules_engine_restore_duration_seconds",
+    "Time to load a partition snapshot on assignment",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+SNAPSHOT_VERSION = 2
+
+
+def _conditions(prefix: str, states: List) -> Dict[str, np.ndarray]:
+    return {
+        f"{prefix}_metrics": np.array([s.condition[0] for _, s in states], dtype=str),
+        f"{prefix}_operators": np.array([s.condition[1] for _, s in states], dtype=str),
+        f"{prefix}_thresholds": np.array([s.condition[2] for _, s in states], dtype=np.float64),
+    }
+
+
+def _conditions_of(prefix: str, arrays: Dict[str, np.ndarray]) -> List:
+    return list(zip(
+        arrays[f"{prefix}_metrics"].tolist(),
+        arrays[f"{prefix}_operators"].tolist(),
+        arrays[f"{prefix}_thresholds"].tolist()
+    ))
+
+
+def encode(state: PartitionState) -> Dict[str, np.ndarray]:
+    """Flat arrays of a partition's state; copies, so the state may move on"""
+    windows = [(rule_id, window) for rule_id, window in state.rules.items()
+               if isinstance(window, RateWindow) and window.head is not None]
+    runs = [(rule_id, counter) for rule_id, counter in state.rules.items() if isinstance(counter, RunLength)]
+    series = state.series
+    keys = list(series.slots)
+    slots = np.array([series.slots[key] for key in keys], dtype=np.int64)
+
+    arrays = {
+        "version": np.array(SNAPSHOT_VERSION),
+        "offset": np.array(state.next_offset, dtype=np.int64),
+        "rate_ids": np.array([rule_id for rule_id, _ in windows], dtype=str),
+        "rate_params": np.array(
+            [(w.window, w.grace, w.start, w.head, w.run) for _, w in windows], dtype=np.int64
+        ).reshape(-1, 5),
+        "rate_totals": np.array([w.total for _, w in windows], dtype=np.float64),
+        "rate_buckets": np.concatenate([w.buckets for _, w in windows]) if windows else np.zeros(0),
+        "run_ids": np.array([rule_id for rule_id, _ in runs], dtype=str),
+        "run_lengths": np.array([counter.run for _, counter in runs], dtype=np.int64),
+        "series_services": np.array([service for service, _, _ in keys], dtype=str),
+        "series_metrics": np.array([metric for _, metric, _ in keys], dtype=str),
+        "series_lookbacks": np.array([lookback for _, _, lookback in keys], dtype=np.int32),
+        **_conditions("rate", windows),
+        **_conditions("run", runs),
+    }
+    for name in FIELDS:
+        arrays[f"series_{name}"] = series.arrays[name][slots]
+    groups = state.alerts.export() if state.alerts is not None else []
+    arrays["alert_groups"] = np.array([json.dumps(group) for group in groups], dtype=str)
+    return arrays
+
+
+def decode(
+    partition: int,
+    arrays: Dict[str, np.ndarray],
+    deduplicator: Optional[Callable[[], AlertDeduplicator]] = None
+) -> PartitionState:
+    state = PartitionState(partition)
+    state.next_offset = int(arrays["offset"])
+
+    buckets = arrays["rate_buckets"]
+    position = 0
+    for rule_id, params, total, condition in zip(
+        arrays["rate_ids"].tolist(),
+        arrays["rate_params"].tolist(),
+        arrays["rate_totals"].tolist(),
+        _conditions_of("rate", arrays)
+    ):
+        window_seconds, grace, start, head, run = params
+        window = RateWindow(window_seconds, grace, condition)
+        size = len(window.buckets)
+        window.buckets[:] = buckets[position:position + size]
+        position += size
+        window.start, window.head, window.total, window.run = start, head, total, run
+        state.rules[rule_id] = window
+    for rule_id, run, condition in zip(
+        arrays["run_ids"].tolist(), arrays["run_lengths"].tolist(), _conditions_of("run", arrays)
+    ):
+        counter = state.rules[rule_id] = RunLength(condition)
+        counter.run = run
+
+    count = len(arrays["series_services"])
+    series = state.series = SeriesStats(max(count, 1024))
+    for name in FIELDS:
+        series.arrays[name][:count] = arrays[f"series_{name}"]
+    series.slots = {
+        key: slot for slot, key in enumerate(zip(
+            arrays["series_services"].tolist(),
+            arrays["series_metrics"].tolist(),
+            arrays["series_lookbacks"].tolist()
+        ))
+    }
+    if deduplicator is not None and "alert_groups" in arrays:
+        state.alerts = deduplicator()
+        state.alerts.load([json.loads(group) for group in arrays["alert_groups"].tolist()])
+    return state
+
+
+class Checkpoints:
+    def __init__(self, directory: str, topic: str):
+        self.directory = directory
+        self.topic = topic
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _replace(self, name: str, write) -> int:
+        """Write a file through a temporary name; returns its size"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name)
+        # Per process: worker processes share the directory
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        return os.path.getsize(path)
+
+    def save(self, partition: int, arrays: Dict[str, np.ndarray]):
+        """Write an encoded snapshot; blocking, so run off the event loop"""
+        started = time.perf_counter()
+        size = self._replace(f"{self.topic}-{partition}.npz", lambda f: np.savez(f, **arrays))
+        SNAPSHOT_DURATION.observe(time.perf_counter() - started)
+        SNAPSHOT_BYTES.labels(partition=str(partition)).set(size)
+
+    def load(
+        self, partition: int, deduplicator: Optional[Callable[[], AlertDeduplicator]] = None
+    ) -> Optional[PartitionState]:
+        """The partition's snapshot, None if there is none or it is unreadable"""
+        path = self._path(f"{self.topic}-{partition}.npz")
+        if not os.path.exists(path):
+            return None
+        started = time.perf_counter()
+        try:
+            with np.load(path, allow_pickle=False) as snapshot:
+                if int(snapshot["version"]) != SNAPSHOT_VERSION:
+                    raise ValueError(f"unsupported version {int(snapshot['version'])}")
+                state = decode(partition, {name: snapshot[name] for name in snapshot.files}, deduplicator)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return None
+        RESTORE_DURATION.observe(time.perf_counter() - started)
+        return state
+
+    def save_rules(self, rules: List[Rule]):
+        payload = json.dumps([rule.model_dump(mode="json") for rule in rules]).encode("utf-8")
+        self._replace("rules.json", lambda f: f.write(payload))
+
+    def load_rules(self) -> List[Rule]:
+        path = self._path("rules.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            return [Rule.model_validate(rule) for rule in json.load(f)]
+
+
+checkpoints = Checkpoints(settings.checkpoint_dir, settings.kafka_topic_events)
@@ -0,0 +1,154 @@
+"""Columnar view of a decoded micro-batch.
+
+Each poll's events are decoded once and laid out as NumPy arrays: timestamps,
+latency (NaN where absent), status codes and service ids. Rules then compare
+whole columns at a time instead of looping over events in Python. Metrics
+read from event metadata become columns on first use.
+
+Batches are normally built from decoded event dicts; ``from_columns``
+builds one straight from columns read elsewhere (a Parquet file, say), with
+events materialised only for the rows that fire.
+
+Service ids come from a process-wide interning table that only the rule
+index adds to, so it is bounded by the services that have rules; events of
+any other service get id -1 and match nothing.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from .serializers import STATUS_CODES, decode_event, keyed_by_service
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_SERVICE = -1
+# Status column value of an event without a recognised status
+UNKNOWN_STATUS = 255
+
+
+class ServiceIds:
+    """Service name -> small integer id"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, service: str) -> int:
+        service_id = self._ids.get(service)
+        if service_id is None:
+            service_id = self._ids[service] = len(self._ids)
+        return service_id
+
+    def get(self, service: str) -> int:
+        return self._ids.get(service, UNKNOWN_SERVICE)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+service_ids = ServiceIds()
+
+
+def _metadata_value(event: Dict[str, Any], metric: str) -> float:
+    metadata = event.get("metadata")
+    if metadata:
+        value = metadata.get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+    return np.nan
+
+
+class EventBatch:
+    """Decoded events of one poll plus their columns"""
+
+    def __init__(self, events: List[Dict[str, Any]], ids: ServiceIds = service_ids):
+        self.events = events
+        self.size = len(events)
+        self.service_id = np.array([ids.get(event.get("service")) for event in events], dtype=np.int32)
+        self.timestamp = np.array([event.get("timestamp", 0) for event in events], dtype=np.int64)
+        # None becomes NaN, which fails every comparison it is masked out of
+        self.latency_ms = np.array([event.get("latency_ms") for event in events], dtype=np.float64)
+        self.status = np.array(
+            [STATUS_CODES.get(event.get("status"), UNKNOWN_STATUS) for event in events], dtype=np.uint8
+        )
+        # Positions of events not keyed by service when produced
+        self.split_keys = np.zeros(0, dtype=np.int64)
+        self._columns: Dict[str, np.ndarray] = {}
+        # Metadata fields as columns, for batches built from columns
+        self._metadata: Optional[Dict[str, np.ndarray]] = None
+
+    @classmethod
+    def from_columns(
+        cls,
+        events: Sequence[Dict[str, Any]],
+        service_id: np.ndarray,
+        timestamp: np.ndarray,
+        latency_ms: np.ndarray,
+        status: np.ndarray,
+        metadata: Dict[str, np.ndarray]
+    ) -> "EventBatch":
+        """A batch from ready-made columns, laid out as in ``__init__``.
+
+        ``events`` is only indexed for events that fire, so it may build
+        them on access; metadata fields missing from ``metadata`` are NaN.
+        """
+        batch = cls.__new__(cls)
+        batch.events = events
+        batch.size = len(timestamp)
+        batch.service_id = service_id.astype(np.int32, copy=False)
+        batch.timestamp = timestamp.astype(np.int64, copy=False)
+        batch.latency_ms = latency_ms.astype(np.float64, copy=False)
+        batch.status = status.astype(np.uint8, copy=False)
+        batch.split_keys = np.zeros(0, dtype=np.int64)
+        batch._columns = {}
+        batch._metadata = {name: values.astype(np.float64, copy=False) for name, values in metadata.items()}
+        return batch
+
+    def column(self, metric: str) -> np.ndarray:
+        """float64 values of a rule metric, NaN where an event lacks it.
+
+        Same metric names as rules.metric_accessor: events, latency_ms,
+        error, status_code, else a numeric metadata field.
+        """
+        values = self._columns.get(metric)
+        if values is None:
+            if metric == "events":
+                values = np.ones(self.size, dtype=np.float64)
+            elif metric == "latency_ms":
+                values = self.latency_ms
+            elif metric == "error":
+                values = (self.status == STATUS_CODES["ERROR"]).astype(np.float64)
+            elif metric == "status_code":
+                values = self.status.astype(np.float64)
+                values[self.status == UNKNOWN_STATUS] = np.nan
+            elif self._metadata is not None:
+                values = self._metadata.get(metric)
+                if values is None:
+                    values = np.full(self.size, np.nan)
+            else:
+                values = np.array(
+                    [_metadata_value(event, metric) for event in self.events], dtype=np.float64
+                )
+            self._columns[metric] = values
+        return values
+
+
+def decode_records(partition: int, records: Sequence[Any]) -> Tuple[EventBatch, int]:
+    """Decode Kafka records into a batch; returns (batch, undecodable count)"""
+    events = []
+    split_keys = []
+    failed = 0
+    for record in records:
+        try:
+            events.append(decode_event(record.value, record.headers))
+        except Exception as e:
+            # A poison message must not stall the partition
+            failed += 1
+            logger.warning(f"Skipping undecodable event at {partition}:{record.offset}: {e}")
+            continue
+        if record.headers and not keyed_by_service(record.headers):
+            split_keys.append(len(events) - 1)
+    batch = EventBatch(events)
+    if split_keys:
+        batch.split_keys = np.array(split_keys, dtype=np.int64)
+    return batch, failed
@@ -0,0 +1,74 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # App Configuration
+    app_name: str = "Alert Rules Engine"
+    environment: str = "development"
+    debug: bool = True
+    log_level: str = "info"
+    port: int = 8002
+    
+    # Kafka Configuration
+    kafka_bootstrap_servers: str = "localhost:9092"
+    kafka_topic_events: str = "service-events"
+    kafka_topic_alerts: str = "alert-events"
+    kafka_consumer_group_alerts: str = "alert-rules-engine"
+    kafka_auto_offset_reset: str = "earliest"
+    kafka_client_id: str = "alert-rules-engine"
+    kafka_acks: str = "all"
+    kafka_linger_ms: int = 5
+    
+    # Evaluation Worker
+    # Off runs the rules API only, e.g. for local development without Kafka
+    worker_enabled: bool = True
+    # Micro-batch per poll: at most this many records, or what arrived
+    # within the timeout
+    worker_max_batch_records: int = 5000
+    worker_poll_timeout_ms: int = 100
+    worker_start_retry_seconds: float = 5.0
+    # 1 evaluates in the API process. Above 1, a supervisor runs that many
+    # worker processes sharing the partitions, and 0 runs one per CPU core;
+    # set PROMETHEUS_MULTIPROC_DIR to aggregate their metrics. The throughput
+    # gain is unmeasured so far, see benchmarks/bench_workers.py
+    worker_processes: int = 1
+    worker_restart_seconds: float = 5.0
+    worker_stop_timeout_seconds: float = 30.0
+    
+    # Windowed Rules
+    # A RATE window's second is evaluated once an event this much newer
+    # arrives; events out of order by up to this much are still on time
+    rate_grace_seconds: int = 5
+    # ANOMALY series score events only after this many minutes with events
+    anomaly_warmup_minutes: int = 5
+    
+    # Alert Deduplication
+    # Repeated firings of a rule fold into one open alert, re-published with
+    # its count at most every update interval; it closes after the rule is
+    # quiet for the cool-down. Groups tracked per partition are capped
+    alert_dedup_enabled: bool = True
+    alert_cooldown_seconds: int = 300
+    alert_update_interval_seconds: int = 60
+    alert_dedup_max_groups: int = 100000
+    
+    # Checkpoints
+    # Per-partition rule state snapshots on local disk; a restarted or
+    # rebalanced worker restores them and replays only the tail
+    checkpoint_enabled: bool = True
+    checkpoint_dir: str = "checkpoints"
+    checkpoint_interval_seconds: float = 30.0
+    # A snapshot further than this behind the committed offset is discarded
+    # and the state rebuilt from scratch instead
+    checkpoint_max_replay_records: int = 1000000
+    
+    # OpenTelemetry
+    jaeger_agent_host: str = "localhost"
+    jaeger_agent_port: int = 6831
+    otel_service_name: str = "alert-rules-engine"
+    
+    class Config:
+        env_file = ".env"
+        case_sensitive = False
+
+
+settings = Settings()
@@ -0,0 +1,267 @@
+"""Consumer-group worker feeding the rule engine from the events topic.
+
+Each poll returns a micro-batch per assigned partition. Alerts from the
+batch are published to the alerts topic and the batch's offsets committed
+only once every alert is acknowledged, so delivery is at least once: after
+a crash the uncommitted batch is evaluated again, and after a failed
+publish the same alert messages are sent again with the retried batch.
+They are kept rather than re-evaluated because the deduplicator has
+already recorded them as published (see app/dedup.py), and the engine
+skips records its state has already absorbed, so a retry never counts a
+batch twice in a RATE window, run length or ANOMALY series.
+
+With checkpoints enabled, rule state is snapshotted after commits and on
+revocation, and restored on assignment (see app/checkpoint.py). Only state
+exact at the committed offset is snapshotted; while a batch is being
+retried the previous snapshot stands.
+"""
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.abc import ConsumerRebalanceListener
+from prometheus_client import Gauge, Histogram
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import asyncio
+import logging
+import time
+
+from .checkpoint import Checkpoints, checkpoints, encode
+from .config import settings
+from .engine import RuleEngine, engine
+from .serializers import dumps
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = Histogram(
+    "rules_engine_batch_size",
+    "Records per consumer poll",
+    buckets=(1, 10, 100, 500, 1000, 2500, 5000, 10000)
+)
+
+BATCH_DURATION = Histogram(
+    "rules_engine_batch_duration_seconds",
+    "Time to evaluate a polled batch and publish its alerts",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+CONSUMER_LAG = Gauge(
+    "rules_engine_consumer_lag",
+    "Records between the last evaluated offset and the partition end",
+    ["partition"],
+    multiprocess_mode="livemostrecent"
+)
+
+WORKER_RUNNING = Gauge(
+    "rules_engine_worker_running",
+    "Workers consuming events",
+    multiprocess_mode="livesum"
+)
+
+
+class _Rebalance(ConsumerRebalanceListener):
+    def __init__(self, worker: "RuleEngineWorker"):
+        self.worker = worker
+        self.engine = worker.engine
+
+    async def on_partitions_revoked(self, revoked):
+        await self.worker.checkpoint(tp.partition for tp in revoked)
+        self.engine.revoke(tp.partition for tp in revoked)
+        for tp in revoked:
+            # The new owner evaluates the uncommitted records again
+            self.worker._unpublished.pop(tp.partition, None)
+            self.worker._committed.pop(tp.partition, None)
+            try:
+                CONSUMER_LAG.remove(str(tp.partition))
+            except KeyError:
+                pass  # Revoked before its first batch
+        if revoked:
+            logger.info(f"Partitions revoked: {sorted(tp.partition for tp in revoked)}")
+
+    async def on_partitions_assigned(self, assigned):
+        self.engine.assign(tp.partition for tp in assigned)
+        if assigned:
+            logger.info(f"Partitions assigned: {sorted(tp.partition for tp in assigned)}")
+        for tp in assigned:
+            await self.worker.restore(tp)
+
+
+class RuleEngineWorker:
+    def __init__(
+        self,
+        engine: RuleEngine,
+        consumer_factory: Callable[..., Any] = AIOKafkaConsumer,
+        producer_factory: Callable[..., Any] = AIOKafkaProducer,
+        checkpoints: Optional[Checkpoints] = None
+    ):
+        self.engine = engine
+        self.consumer_factory = consumer_factory
+        self.producer_factory = producer_factory
+        self.checkpoints = checkpoints
+        self.consumer: AIOKafkaConsumer = None
+        self.producer: AIOKafkaProducer = None
+        self._task: asyncio.Task = None
+        # Partition -> alert messages evaluated but not yet acknowledged
+        self._unpublished: Dict[int, List[Dict[str, Any]]] = {}
+        # Partition -> offset committed for it by this worker
+        self._committed: Dict[int, int] = {}
+        # Partition -> offset of its latest snapshot
+        self._checkpointed: Dict[int, int] = {}
+        self._checkpointed_rules = None
+        self._last_checkpoint = time.monotonic()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.consumer is not None:
+            await self.checkpoint()
+            await self.consumer.stop()
+            self.consumer = None
+        if self.producer is not None:
+            await self.producer.stop()
+            self.producer = None
+        WORKER_RUNNING.set(0)
+        logger.info("Rule engine worker stopped")
+
+    async def _connect(self):
+        producer = self.producer_factory(
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            client_id=settings.kafka_client_id,
+            acks=settings.kafka_acks,
+            linger_ms=settings.kafka_linger_ms
+        )
+        consumer = self.consumer_factory(
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            client_id=settings.kafka_client_id,
+            group_id=settings.kafka_consumer_group_alerts,
+            auto_offset_reset=settings.kafka_auto_offset_reset,
+            enable_auto_commit=False
+        )
+        try:
+            await producer.start()
+            await consumer.start()
+        except Exception:
+            await consumer.stop()
+            await producer.stop()
+            raise
+        consumer.subscribe([settings.kafka_topic_events], listener=_Rebalance(self))
+        self.producer = producer
+        self.consumer = consumer
+
+    async def _run(self):
+        while self.consumer is None:
+            try:
+                await self._connect()
+            except Exception as e:
+                logger.error(f"Failed to connect rule engine worker to Kafka: {e}")
+                await asyncio.sleep(settings.worker_start_retry_seconds)
+        WORKER_RUNNING.set(1)
+        logger.info(f"Rule engine worker consuming {settings.kafka_topic_events}")
+        while True:
+            batches = await self.consumer.getmany(
+                timeout_ms=settings.worker_poll_timeout_ms,
+                max_records=settings.worker_max_batch_records
+            )
+            if batches:
+                try:
+                    await self._process(batches)
+                except Exception as e:
+                    logger.error(f"Failed to process batch, will retry it: {e}")
+                    assigned = self.consumer.assignment()
+                    for tp, records in batches.items():
+                        if tp in assigned:
+                            self.consumer.seek(tp, records[0].offset)
+                    await asyncio.sleep(settings.worker_start_retry_seconds)
+                    continue
+            if time.monotonic() - self._last_checkpoint >= settings.checkpoint_interval_seconds:
+                await self.checkpoint()
+
+    async def _process(self, batches: Dict[Any, List[Any]]):
+        started = time.perf_counter()
+        for tp, records in batches.items():
+            alerts = self.engine.process(tp.partition, records)
+            if alerts:
+                self._unpublished.setdefault(tp.partition, []).extend(alerts)
+        alerts = [alert for pending in self._unpublished.values() for alert in pending]
+        if alerts:
+            await self._publish(alerts)
+            self._unpublished.clear()
+        offsets = {tp: records[-1].offset + 1 for tp, records in batches.items()}
+        await self.consumer.commit(offsets)
+        for tp, offset in offsets.items():
+            self._committed[tp.partition] = offset
+
+        BATCH_SIZE.observe(sum(len(records) for records in batches.values()))
+        BATCH_DURATION.observe(time.perf_counter() - started)
+        for tp, records in batches.items():
+            highwater = self.consumer.highwater(tp)
+            if highwater is not None:
+                CONSUMER_LAG.labels(partition=str(tp.partition)).set(highwater - records[-1].offset - 1)
+
+    async def checkpoint(self, partitions: Optional[Iterable[int]] = None):
+        """Snapshot partitions whose state moved since their last snapshot,
+        and the rules if they changed"""
+        if self.checkpoints is None:
+            return
+        self._last_checkpoint = time.monotonic()
+        for partition in list(self.engine.partitions) if partitions is None else list(partitions):
+            state = self.engine.partitions.get(partition)
+            if state is None or self._checkpointed.get(partition) == state.next_offset:
+                continue
+            if self._committed.get(partition) != state.next_offset:
+                # Evaluated past the committed offset by a batch not yet committed
+                continue
+            # Encode on the loop so the copy is consistent; write off it
+            arrays = encode(state)
+            try:
+                await asyncio.to_thread(self.checkpoints.save, partition, arrays)
+            except Exception as e:
+                logger.error(f"Failed to snapshot partition {partition}: {e}")
+                continue
+            self._checkpointed[partition] = state.next_offset
+
+        store = self.engine.store
+        if self._checkpointed_rules != store.index.version:
+            version = store.index.version
+            try:
+                await asyncio.to_thread(self.checkpoints.save_rules, store.list())
+                self._checkpointed_rules = version
+            except Exception as e:
+                logger.error(f"Failed to snapshot rules: {e}")
+
+    async def restore(self, tp):
+        """Resume a newly assigned partition from its snapshot, if usable"""
+        if self.checkpoints is None:
+            return
+        state = await asyncio.to_thread(self.checkpoints.load, tp.partition, self.engine.deduplicator)
+        if state is None:
+            return
+        committed = await self.consumer.committed(tp)
+        behind = None if committed is None else committed - state.next_offset
+        if behind is None or not 0 <= behind <= settings.checkpoint_max_replay_records:
+            logger.warning(
+                f"Discarding snapshot of partition {tp.partition} at offset {state.next_offset}, "
+                f"committed offset is {committed}"
+            )
+            return
+        state.replay_until = committed
+        self._committed[tp.partition] = committed
+        self.engine.partitions[tp.partition] = state
+        self._checkpointed[tp.partition] = state.next_offset
+        if behind:
+            self.consumer.seek(tp, state.next_offset)
+        logger.info(f"Restored partition {tp.partition} at offset {state.next_offset}, replaying {behind} records")
+
+    async def _publish(self, alerts: List[Dict[str, Any]]):
+        """Send alerts keyed by service and wait for every acknowledgement"""
+        topic = settings.kafka_topic_alerts
+        futures = [
+            await self.producer.send(topic, value=dumps(alert), key=alert["service"].encode("utf-8"))
+            for alert in alerts
+        ]
+        await asyncio.gather(*futures)
+
+
+worker = RuleEngineWorker(engine, checkpoints=checkpoints if settings.checkpoint_enabled else None)
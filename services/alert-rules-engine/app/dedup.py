@@ -0,0 +1,142 @@
+"""Collapsing of repeated rule firings into one open alert.
+
+A busy service can trip a rule on every event. After evaluation, firings of
+the same (rule_id, service) are folded into a single open alert: the first
+firing is published, later ones only bump its count and last-seen time,
+and the alert is re-published under the same id, with the latest firing's
+message, at most once per update interval so the alerts store can upsert
+it. An alert stays open until the
+rule has been quiet for the cool-down; a firing within the cool-down
+reopens the same alert instead of starting a new one, which is what keeps a
+flapping rule to one alert. Time is the alerts' event time.
+
+A group is marked published when its message is handed out, before the
+publish is acknowledged. The worker keeps every message it was handed until
+the publish succeeds and sends it again on a retry, so a later firing
+folded into the group never hides a message that was lost.
+
+State is bounded: groups are kept in least-recently-fired order, and those
+quiet for longer than the cool-down, or beyond ``max_groups``, are dropped.
+"""
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+from typing import Any, Dict, List, Tuple
+
+ALERTS_DEDUPLICATED = Counter(
+    "rules_engine_alert_firings_total",
+    "Rule firings after deduplication: opened a new alert, re-published an open one, or folded into it",
+    ["outcome"]
+)
+
+ALERT_GROUPS = Gauge(
+    "rules_engine_alert_groups",
+    "Open alerts tracked for deduplication",
+    multiprocess_mode="livesum"
+)
+
+
+class AlertGroup:
+    __slots__ = ("id", "latest", "count", "first_seen", "last_seen", "published")
+
+    def __init__(self, alert: Dict[str, Any]):
+        self.id = alert["id"]
+        self.latest = alert
+        self.count = 0
+        self.first_seen = alert["timestamp"]
+        self.last_seen = alert["timestamp"]
+        # Event time of the last publish
+        self.published = alert["timestamp"]
+
+
+class AlertDeduplicator:
+    def __init__(self, cooldown_seconds: int, update_interval_seconds: int, max_groups: int):
+        self.cooldown_seconds = cooldown_seconds
+        self.update_interval_seconds = update_interval_seconds
+        self.max_groups = max_groups
+        self.groups: "OrderedDict[Tuple[str, str], AlertGroup]" = OrderedDict()
+        self.now = 0
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def collapse(self, alerts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The alerts to publish for a batch's firings"""
+        if not alerts:
+            return alerts
+        published: Dict[Tuple[str, str], AlertGroup] = {}
+        opened = updated = folded = 0
+        for alert in alerts:
+            key = (alert["rule_id"], alert["service"])
+            timestamp = alert["timestamp"]
+            self.now = max(self.now, timestamp)
+            group = self.groups.get(key)
+            if group is None or timestamp - group.last_seen > self.cooldown_seconds:
+                if group is None:
+                    ALERT_GROUPS.inc()
+                group = self.groups[key] = AlertGroup(alert)
+                published[key] = group
+                opened += 1
+            elif key not in published and timestamp - group.published >= self.update_interval_seconds:
+                group.published = timestamp
+                published[key] = group
+                updated += 1
+            else:
+                # Already going out in this batch, or re-published too recently
+                folded += 1
+            group.latest = alert
+            group.count += 1
+            group.last_seen = max(group.last_seen, timestamp)
+            self.groups.move_to_end(key)
+        self._evict()
+
+        ALERTS_DEDUPLICATED.labels(outcome="opened").inc(opened)
+        ALERTS_DEDUPLICATED.labels(outcome="updated").inc(updated)
+        ALERTS_DEDUPLICATED.labels(outcome="folded").inc(folded)
+        # One message per group, carrying its count as of the end of the batch
+        return [self._message(group) for group in published.values()]
+
+    def _message(self, group: AlertGroup) -> Dict[str, Any]:
+        alert = dict(group.latest)
+        alert["id"] = group.id
+        alert["timestamp"] = group.first_seen
+        alert["metadata"] = {
+            **(alert.get("metadata") or {}),
+            "count": group.count,
+            "first_seen": group.first_seen,
+            "last_seen": group.last_seen,
+        }
+        return alert
+
+    def export(self) -> List[Dict[str, Any]]:
+        """Groups as plain values, oldest first, for snapshots"""
+        return [
+            {slot: getattr(group, slot) for slot in AlertGroup.__slots__}
+            for group in self.groups.values()
+        ]
+
+    def load(self, groups: List[Dict[str, Any]]):
+        """Restore groups from ``export``"""
+        for values in groups:
+            group = AlertGroup(values["latest"])
+            for slot in AlertGroup.__slots__:
+                setattr(group, slot, values[slot])
+            key = (group.latest["rule_id"], group.latest["service"])
+            if key not in self.groups:
+                ALERT_GROUPS.inc()
+            self.groups[key] = group
+            self.now = max(self.now, group.last_seen)
+
+    def release(self):
+        """Drop every group, when the partition is revoked"""
+        ALERT_GROUPS.dec(len(self.groups))
+        self.groups.clear()
+
+    def _evict(self):
+        horizon = self.now - self.cooldown_seconds
+        groups = self.groups
+        while groups:
+            key, group = next(iter(groups.items()))
+            if group.last_seen >= horizon and len(groups) <= self.max_groups:
+                break
+            del groups[key]
+            ALERT_GROUPS.dec()
@@ -0,0 +1,406 @@
+"""Micro-batch rule evaluation over consumed events.
+
+The worker hands the engine one batch of Kafka records per assigned
+partition. Records are decoded according to their content-format header
+into a columnar EventBatch, and THRESHOLD rules are evaluated group by
+group as array comparisons over the batch; only the pairs that fire go
+back to Python to become alert messages for the alerts topic. Stateful
+rules (RATE windows, consecutive_events) then see the events of their
+service in offset order, and ANOMALY rules score the batch against their
+series' baselines before adding it to them. Finally the partition's
+deduplicator folds repeated firings into open alerts (see app/dedup.py).
+
+State the engine keeps per partition, including every stateful rule's
+window and run length and the ANOMALY series statistics, is created on
+assignment and dropped on revocation, so it always follows the partitions
+this worker owns. Events are keyed by service, so a service's rule state
+lives in exactly one partition. event-ingestion's salted and metadata
+partition strategies would break that, so it keeps every service with
+stateful rules keyed by service (it polls ``/rules/stateful-services``).
+Events of such a service that arrive keyed otherwise, from a producer that
+does not, are still evaluated but counted in
+rules_engine_split_service_events_total and logged once per service.
+
+The rule index is read once per batch, so a rule change swapped in by the
+store takes effect between batches and a batch is evaluated against one
+version. State of rules the new version drops is released then; state of
+rules it changed is kept where it still applies (see app/windows.py).
+"""
+from functools import partial
+from prometheus_client import Counter
+from random import getrandbits
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+import logging
+
+import numpy as np
+
+from .anomaly import SeriesStats
+from .columnar import EventBatch, decode_records
+from .config import settings
+from .dedup import AlertDeduplicator
+from .rules import CompiledRule, RuleIndex, RuleStore, rule_store
+from .windows import RateWindow, RunLength, run_lengths
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PROCESSED = Counter(
+    "rules_engine_events_total",
+    "Events consumed by outcome",
+    ["result"]
+)
+
+SPLIT_SERVICE_EVENTS = Counter(
+    "rules_engine_split_service_events_total",
+    "Events of services with stateful rules that were not partitioned by service"
+)
+
+ALERTS_EMITTED = Counter(
+    "rules_engine_alerts_total",
+    "Alerts produced by rule type",
+    ["type"]
+)
+
+_UUID4_CLEAR = ~((0xF000 << 64) | (0xC000 << 48))
+_UUID4_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+def new_alert_id() -> str:
+    """Random version-4 UUID string without the uuid module's overhead.
+    
+    The same generator as event-ingestion's models.new_event_id. Each
+    service image is built from its own app/ only, so keep the two in step.
+    """
+    h = f"{getrandbits(128) & _UUID4_CLEAR | _UUID4_SET:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def threshold_alert(rule: CompiledRule, event: Dict[str, Any], value: float) -> Dict[str, Any]:
+    return {
+        "id": new_alert_id(),
+        "service": rule.service,
+        "rule_id": rule.id,
+        "severity": rule.severity,
+        "message": f"{rule.name}: {rule.metric} {value:g} {rule.operator} {rule.threshold:g}",
+        "timestamp": event["timestamp"],
+        "metadata": {
+            "rule_type": rule.type.value,
+            "metric": rule.metric,
+            "value": value,
+            "operator": rule.operator,
+            "threshold": rule.threshold,
+            "event_id": event.get("id"),
+        },
+    }
+
+
+def rate_alert(rule: CompiledRule, second: int, rate: float) -> Dict[str, Any]:
+    return {
+        "id": new_alert_id(),
+        "service": rule.service,
+        "rule_id": rule.id,
+        "severity": rule.severity,
+        "message": (
+            f"{rule.name}: {rule.metric} rate {rate:g}/s over {rule.window}s "
+            f"{rule.operator} {rule.threshold:g}"
+        ),
+        "timestamp": second,
+        "metadata": {
+            "rule_type": rule.type.value,
+            "metric": rule.metric,
+            "value": rate,
+            "operator": rule.operator,
+            "threshold": rule.threshold,
+            "time_window_seconds": rule.window,
+        },
+    }
+
+
+def anomaly_alert(
+    rule: CompiledRule, event: Dict[str, Any], value: float, z: float, mean: float, std: float
+) -> Dict[str, Any]:
+    return {
+        "id": new_alert_id(),
+        "service": rule.service,
+        "rule_id": rule.id,
+        "severity": rule.severity,
+        "message": (
+            f"{rule.name}: {rule.metric} {value:g} is {z:+.1f} std devs from "
+            f"its {rule.lookback}m mean {mean:g}"
+        ),
+        "timestamp": event["timestamp"],
+        "metadata": {
+            "rule_type": rule.type.value,
+            "metric": rule.metric,
+            "value": value,
+            "mean": mean,
+            "std_dev": std,
+            "z_score": z,
+            "threshold_std_dev": rule.std_devs,
+            "lookback_minutes": rule.lookback,
+            "event_id": event.get("id"),
+        },
+    }
+
+
+class PartitionState:
+    """Everything the engine keeps for one assigned partition"""
+
+    def __init__(self, partition: int):
+        self.partition = partition
+        # Offset of the next record to evaluate
+        self.next_offset = 0
+        # Records before this offset were evaluated before a restore; their
+        # alerts are already published
+        self.replay_until = 0
+        # Stateful rule id -> its window or run length in this partition
+        self.rules: Dict[str, Union[RateWindow, RunLength]] = {}
+        # ANOMALY series statistics
+        self.series = SeriesStats()
+        # Open alerts, created by the engine when deduplication is on
+        self.alerts: Optional[AlertDeduplicator] = None
+        self.index_version = 0
+
+    def sync(self, index: RuleIndex):
+        """Drop the state of rules and series no longer in the index"""
+        if self.index_version != index.version:
+            compiled = index.compiled
+            for rule_id in [rule_id for rule_id in self.rules
+                            if rule_id not in compiled or not compiled[rule_id].stateful]:
+                del self.rules[rule_id]
+            self.series.retain(key for group in index.anomaly_groups for key, _ in group.keys)
+            self.index_version = index.version
+
+
+class RuleEngine:
+    def __init__(
+        self,
+        store: RuleStore,
+        grace_seconds: int = 0,
+        warmup_minutes: int = 5,
+        deduplicator: Optional[Callable[[], AlertDeduplicator]] = None
+    ):
+        self.store = store
+        self.grace_seconds = grace_seconds
+        self.warmup_minutes = warmup_minutes
+        self.deduplicator = deduplicator
+        self.partitions: Dict[int, PartitionState] = {}
+        self._split_services: Set[str] = set()
+
+    def assign(self, partitions: Iterable[int]):
+        for partition in partitions:
+            if partition not in self.partitions:
+                self.partitions[partition] = PartitionState(partition)
+
+    def revoke(self, partitions: Iterable[int]):
+        for partition in partitions:
+            state = self.partitions.pop(partition, None)
+            if state is not None and state.alerts is not None:
+                state.alerts.release()
+
+    def process(self, partition: int, records: Sequence[Any]) -> List[Dict[str, Any]]:
+        """Evaluate one partition's batch of Kafka records; returns alert messages"""
+        state = self.partitions.get(partition)
+        if state is None:
+            state = self.partitions[partition] = PartitionState(partition)
+        if records and records[0].offset < state.next_offset:
+            # Already in the state: a batch retried after its publish or commit
+            # failed; the worker still holds the alerts it produced
+            skip = next(
+                (i for i, record in enumerate(records) if record.offset >= state.next_offset), len(records)
+            )
+            EVENTS_PROCESSED.labels(result="skipped").inc(skip)
+            records = records[skip:]
+        if records and records[0].offset < state.replay_until:
+            split = next(
+                (i for i, record in enumerate(records) if record.offset >= state.replay_until), len(records)
+            )
+            self._evaluate_records(state, partition, records[:split], result="replayed")
+            records = records[split:]
+        return self._evaluate_records(state, partition, records)
+
+    def _evaluate_records(
+        self, state: PartitionState, partition: int, records: Sequence[Any], result: str = "evaluated"
+    ) -> List[Dict[str, Any]]:
+        batch, failed = decode_records(partition, records)
+        if failed:
+            EVENTS_PROCESSED.labels(result="decode_error").inc(failed)
+        if records:
+            state.next_offset = records[-1].offset + 1
+        return self.evaluate_partition(state, batch, result)
+
+    def evaluate_partition(
+        self, state: PartitionState, batch: EventBatch, result: str = "evaluated"
+    ) -> List[Dict[str, Any]]:
+        """Every rule over one partition's decoded batch, in offset order,
+        updating the partition's state; returns alert messages"""
+        EVENTS_PROCESSED.labels(result=result).inc(batch.size)
+        index = self.store.index
+        if len(batch.split_keys):
+            self._check_split(batch, index)
+        alerts = self.evaluate_batch(batch, index)
+        alerts.extend(self.evaluate_stateful(state, batch, index))
+        alerts.extend(self.evaluate_anomalies(state, batch, index))
+        if self.deduplicator is not None:
+            if state.alerts is None:
+                state.alerts = self.deduplicator()
+            alerts = state.alerts.collapse(alerts)
+        return alerts
+
+    def _check_split(self, batch: EventBatch, index: RuleIndex):
+        """Flag events of services with stateful rules that other partitions
+        may also see, as that state would only hold part of their events"""
+        split = [batch.events[event].get("service") for event in batch.split_keys.tolist()]
+        services = {
+            service for service in set(split)
+            if any(rule.stateful for rule in index.by_service.get(service, ()))
+        }
+        if not services:
+            return
+        SPLIT_SERVICE_EVENTS.inc(sum(1 for service in split if service in services))
+        for service in services - self._split_services:
+            logger.warning(
+                f"Events of {service} are not partitioned by service; its stateful rules "
+                f"only see the share of them in each partition"
+            )
+        self._split_services |= services
+
+    def evaluate_batch(self, batch: EventBatch, index: Optional[RuleIndex] = None) -> List[Dict[str, Any]]:
+        """Alerts for a columnar batch, in event order"""
+        index = index or self.store.index
+        groups = []
+        matched = []
+        for group in index.threshold_groups:
+            events, rules = group.match(batch)
+            if len(events):
+                groups.append(group)
+                matched.append((events, rules))
+        if not matched:
+            return []
+
+        events = np.concatenate([events for events, _ in matched])
+        rules = np.concatenate([rules for _, rules in matched])
+        owners = np.repeat(np.arange(len(groups)), [len(events) for events, _ in matched])
+        order = np.argsort(events, kind="stable")
+        alerts = []
+        for event, rule, owner in zip(events[order].tolist(), rules[order].tolist(), owners[order].tolist()):
+            group = groups[owner]
+            value = float(batch.column(group.metric)[event])
+            alerts.append(threshold_alert(group.rules[rule], batch.events[event], value))
+        ALERTS_EMITTED.labels(type="THRESHOLD").inc(len(alerts))
+        return alerts
+
+    def evaluate_stateful(
+        self, state: PartitionState, batch: EventBatch, index: Optional[RuleIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """Alerts from RATE and consecutive_events rules, updating their state"""
+        index = index or self.store.index
+        state.sync(index)
+        if not index.stateful or not batch.size:
+            return []
+        # Events grouped by service, each group still in offset order
+        order = np.argsort(batch.service_id, kind="stable")
+        service_ids = batch.service_id[order]
+        present, starts = np.unique(service_ids, return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        alerts = []
+        for service_id, start, end in zip(present.tolist(), starts.tolist(), ends.tolist()):
+            rules = index.stateful.get(service_id)
+            if not rules:
+                continue
+            service_events = order[start:end]
+            for rule in rules:
+                # Events without the rule's metric neither hold nor break its condition
+                values = batch.column(rule.metric)[service_events]
+                known = ~np.isnan(values)
+                events = service_events[known]
+                if not len(events):
+                    continue
+                if rule.window:
+                    alerts.extend(self._evaluate_rate(state, rule, batch.timestamp[events], values[known]))
+                else:
+                    alerts.extend(self._evaluate_consecutive(state, rule, batch, events, values[known]))
+        return alerts
+
+    def _evaluate_rate(self, state: PartitionState, rule: CompiledRule, timestamps, values):
+        window = state.rules.get(rule.id)
+        if not isinstance(window, RateWindow) or not window.matches(rule.window, self.grace_seconds, rule.metric):
+            window = state.rules[rule.id] = RateWindow(rule.window, self.grace_seconds, rule.condition)
+        else:
+            window.rebind(rule.condition)
+        # Within a batch, events of the same second are summed before the ring sees them
+        seconds, inverse = np.unique(timestamps, return_inverse=True)
+        closed = window.add(seconds, np.bincount(inverse, weights=values), np.bincount(inverse))
+
+        alerts = []
+        for second, rate in closed:
+            window.run = window.run + 1 if rule.compare(rate, rule.threshold) else 0
+            if window.run >= rule.consecutive:
+                alerts.append(rate_alert(rule, second, rate))
+        if alerts:
+            ALERTS_EMITTED.labels(type="RATE").inc(len(alerts))
+        return alerts
+
+    def _evaluate_consecutive(self, state: PartitionState, rule: CompiledRule, batch, events, values):
+        counter = state.rules.get(rule.id)
+        if not isinstance(counter, RunLength) or counter.condition != rule.condition:
+            counter = state.rules[rule.id] = RunLength(rule.condition)
+        held = rule.compare_array(values, rule.threshold)
+        runs = run_lengths(held, counter.run)
+        counter.run = int(runs[-1])
+        fired = np.flatnonzero(runs >= rule.consecutive)
+        if not len(fired):
+            return []
+        alerts = [
+            threshold_alert(rule, batch.events[event], value)
+            for event, value in zip(events[fired].tolist(), values[fired].tolist())
+        ]
+        ALERTS_EMITTED.labels(type="THRESHOLD").inc(len(alerts))
+        return alerts
+
+    def evaluate_anomalies(
+        self, state: PartitionState, batch: EventBatch, index: Optional[RuleIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """Alerts from ANOMALY rules, then the batch added to their series"""
+        index = index or self.store.index
+        state.sync(index)
+        alerts = []
+        for group in index.anomaly_groups:
+            fired = group.observe(state.series, batch, self.warmup_minutes)
+            for event, rule, value, z, mean, std in zip(*(column.tolist() for column in fired)):
+                alerts.append(anomaly_alert(group.rules[rule], batch.events[event], value, z, mean, std))
+        if alerts:
+            ALERTS_EMITTED.labels(type="ANOMALY").inc(len(alerts))
+        return alerts
+
+    def evaluate(self, events: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-event evaluation of stateless THRESHOLD rules; the reference
+        for evaluate_batch"""
+        index = self.store.index.by_service
+        alerts = []
+        for event in events:
+            rules = index.get(event.get("service"))
+            if not rules:
+                continue
+            for rule in rules:
+                if rule.stateful:
+                    continue
+                value = rule.value_of(event)
+                if value is not None and rule.compare(value, rule.threshold):
+                    alerts.append(threshold_alert(rule, event, value))
+        if alerts:
+            ALERTS_EMITTED.labels(type="THRESHOLD").inc(len(alerts))
+        return alerts
+
+
+engine = RuleEngine(
+    rule_store,
+    settings.rate_grace_seconds,
+    settings.anomaly_warmup_minutes,
+    partial(
+        AlertDeduplicator,
+        settings.alert_cooldown_seconds,
+        settings.alert_update_interval_seconds,
+        settings.alert_dedup_max_groups
+    ) if settings.alert_dedup_enabled else None
+)
@@ -1,16 +1,101 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
+from prometheus_client import CollectorRegistry, make_asgi_app, multiprocess
+from typing import List, Optional
 import logging
+import os
+from pythonjsonlogger import jsonlogger
+
+from .checkpoint import checkpoints
+from .config import settings
+from .consumer import worker
+from .models import Rule, RuleCreate
+from .rules import rule_store
+from .supervisor import supervisor
+
+# Configure structured logging
+logHandler = logging.StreamHandler()
+formatter = jsonlogger.JsonFormatter()
+logHandler.setFormatter(formatter)
+logger = logging.getLogger()
+logger.addHandler(logHandler)
+logger.setLevel(settings.log_level.upper())
+
+app = FastAPI(
+    title=settings.app_name,
+    version="1.0.0",
+    description="Streaming alert rule evaluation for Smart Retail Platform",
+)
+
+# Mount Prometheus metrics endpoint, aggregating worker processes if any
+if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    metrics_app = make_asgi_app(registry=registry)
+else:
+    metrics_app = make_asgi_app()
+app.mount("/metrics", metrics_app)
+
+
+@app.on_event("startup")
+async def startup_event():
+    logger.info("Starting Alert Rules Engine")
+    if settings.checkpoint_enabled:
+        rule_store.apply(checkpoints.load_rules())
+    if not settings.worker_enabled:
+        return
+    if settings.worker_processes == 1:
+        await worker.start()
+    else:
+        await supervisor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down Alert Rules Engine")
+    await worker.stop()
+    await supervisor.stop()
 
-app = FastAPI(title="Alert Rules Engine")
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {"status": "healthy", "service": "alert-rules-engine"}
+
+
+@app.get("/rules", response_model=List[Rule])
+async def get_rules(service: Optional[str] = None):
+    return rule_store.list(service)
+
+
+@app.get("/rules/stateful-services", response_model=List[str])
+async def get_stateful_services():
+    """Services whose rules keep state between events; event-ingestion
+    keeps each of them on one partition"""
+    return sorted({rule.service for rule in rule_store.index.compiled.values() if rule.stateful})
+
+
+@app.get("/rules/{rule_id}", response_model=Rule)
+async def get_rule(rule_id: str):
+    rule = rule_store.get(rule_id)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return rule
+
+
+@app.post("/rules", response_model=Rule, status_code=201)
+async def create_rule(rule: RuleCreate):
+    return rule_store.create(rule)
+
+
+@app.put("/rules/{rule_id}", response_model=Rule)
+async def update_rule(rule_id: str, rule: RuleCreate):
+    updated = rule_store.update(rule_id, rule)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return updated
 
-@app.get("/rules")
-async def get_rules():
-    return []
 
-@app.post("/rules")
-async def create_rule(rule: dict):
-    return {"id": "rule-123", **rule}
+@app.delete("/rules/{rule_id}", status_code=204)
+async def delete_rule(rule_id: str):
+    if not rule_store.delete(rule_id):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return Response(status_code=204)
@@ -0,0 +1,101 @@
+from pydantic import BaseModel, field_validator, model_validator
+from typing import Optional, Dict, Any
+from enum import Enum
+
+# Comparison operators accepted in a RuleCondition, with word aliases
+OPERATORS = {
+    ">": ">", "gt": ">",
+    ">=": ">=", "gte": ">=",
+    "<": "<", "lt": "<",
+    "<=": "<=", "lte": "<=",
+    "==": "==", "eq": "==",
+    "!=": "!=", "ne": "!=",
+}
+
+# RATE windows keep one bucket per second, so this bounds their memory
+MAX_TIME_WINDOW_SECONDS = 3600
+
+
+class RuleType(str, Enum):
+    THRESHOLD = "THRESHOLD"
+    RATE = "RATE"
+    ANOMALY = "ANOMALY"
+
+
+class RuleCondition(BaseModel):
+    metric: str
+    operator: str
+    value: float
+    consecutive_events: Optional[int] = None
+    time_window_seconds: Optional[int] = None
+    threshold_std_dev: Optional[float] = None
+    lookback_minutes: Optional[int] = None
+
+    @field_validator("operator")
+    @classmethod
+    def known_operator(cls, value: str) -> str:
+        if value not in OPERATORS:
+            raise ValueError(f"Unknown operator '{value}', expected one of: {', '.join(OPERATORS)}")
+        return value
+
+    @field_validator("consecutive_events")
+    @classmethod
+    def positive_count(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and value < 1:
+            raise ValueError("consecutive_events must be at least 1")
+        return value
+
+    @field_validator("lookback_minutes")
+    @classmethod
+    def positive_lookback(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and value < 1:
+            raise ValueError("lookback_minutes must be at least 1")
+        return value
+
+    @field_validator("time_window_seconds")
+    @classmethod
+    def bounded_window(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and not 1 <= value <= MAX_TIME_WINDOW_SECONDS:
+            raise ValueError(f"time_window_seconds must be between 1 and {MAX_TIME_WINDOW_SECONDS}")
+        return value
+
+
+class RuleCreate(BaseModel):
+    service: str
+    name: str
+    type: RuleType
+    condition: RuleCondition
+    severity: str
+    enabled: bool = True
+    description: Optional[str] = None
+
+    @model_validator(mode="after")
+    def rate_has_window(self) -> "RuleCreate":
+        if self.type == RuleType.RATE and self.condition.time_window_seconds is None:
+            raise ValueError("RATE rules need condition.time_window_seconds")
+        if self.type == RuleType.ANOMALY:
+            if self.condition.lookback_minutes is None:
+                raise ValueError("ANOMALY rules need condition.lookback_minutes")
+            if (self.condition.threshold_std_dev or self.condition.value) <= 0:
+                raise ValueError("ANOMALY rules need a positive condition.threshold_std_dev")
+        return self
+
+
+class Rule(RuleCreate):
+    id: str
+    created_at: int
+    updated_at: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AlertEvent(BaseModel):
+    """Message published to the alerts topic, shaped like the gateway's Alert"""
+    id: str
+    service: str
+    rule_id: str
+    severity: str
+    message: str
+    timestamp: int
+    metadata: Optional[Dict[str, Any]] = None
@@ -0,0 +1,387 @@
+"""Rule storage and the per-service index rules are evaluated through.
+
+Rules are kept in memory and compiled once into CompiledRule objects (metric
+accessor, comparison, threshold). The index maps each service to the
+compiled, enabled rules for it, so evaluating an event costs O(rules for its
+service) whatever the total rule count. For vectorized evaluation the
+stateless THRESHOLD rules are also grouped by (metric, operator), each group
+holding its thresholds in one array ordered by service id. Rules that keep
+state between events (RATE windows, consecutive_events) are listed per
+service id instead and evaluated against their per-partition state, and
+ANOMALY rules are grouped by metric over their (service, lookback) series.
+
+Indexes are immutable and versioned. A change is applied as a diff: the
+new version shares every group and service entry the changed rules do not
+belong to, and only those are rebuilt. It is swapped in with one
+assignment, and the evaluator reads the index once per micro-batch, so
+evaluation never pauses for a reload and never sees a half-applied change.
+"""
+from prometheus_client import Gauge, Histogram
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import operator
+import time
+import uuid
+
+import numpy as np
+
+from .anomaly import AnomalyGroup
+from .columnar import EventBatch, ServiceIds, service_ids
+from .models import OPERATORS, Rule, RuleCreate, RuleType
+
+logger = logging.getLogger(__name__)
+
+# Rule types the engine evaluates: all of them, THRESHOLD, RATE and ANOMALY
+EVALUATED_TYPES = frozenset(RuleType)
+
+COMPARISONS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+ARRAY_COMPARISONS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+RULES_LOADED = Gauge(
+    "rules_engine_rules",
+    "Rules stored, and rules in the evaluation index",
+    ["state"],
+    multiprocess_mode="livemax"
+)
+
+INDEX_RELOAD_DURATION = Histogram(
+    "rules_engine_index_reload_seconds",
+    "Time to apply a rule change to the index and swap it in",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
+INDEX_VERSION = Gauge(
+    "rules_engine_index_version",
+    "Version of the compiled rule index being evaluated",
+    multiprocess_mode="livemax"
+)
+
+
+def metric_accessor(metric: str) -> Callable[[Dict[str, Any]], Optional[float]]:
+    """Read a rule metric from a decoded event, None if the event lacks it.
+
+    ``latency_ms`` is the event field; ``error`` is 1 for ERROR events and 0
+    otherwise; ``status_code`` is 0 OK, 1 ERROR, 2 WARNING; ``events`` is 1
+    for every event, so RATE rules on it count events. Any other name is a
+    numeric field of the event's metadata.
+    """
+    if metric == "events":
+        return lambda event: 1.0
+    if metric == "latency_ms":
+        return lambda event: event.get("latency_ms")
+    if metric == "error":
+        return lambda event: 1.0 if event.get("status") == "ERROR" else 0.0
+    if metric == "status_code":
+        codes = {"OK": 0.0, "ERROR": 1.0, "WARNING": 2.0}
+        return lambda event: codes.get(event.get("status"))
+
+    def from_metadata(event):
+        metadata = event.get("metadata")
+        if not metadata:
+            return None
+        value = metadata.get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        return None
+    return from_metadata
+
+
+class CompiledRule:
+    __slots__ = ("id", "service", "name", "type", "severity", "metric", "operator",
+                 "threshold", "compare", "compare_array", "value_of", "consecutive",
+                 "window", "std_devs", "lookback", "stateful", "condition", "rule")
+
+    def __init__(self, rule: Rule):
+        condition = rule.condition
+        self.id = rule.id
+        self.service = rule.service
+        self.name = rule.name
+        self.type = rule.type
+        self.severity = rule.severity
+        self.metric = condition.metric
+        self.operator = OPERATORS[condition.operator]
+        self.threshold = condition.value
+        self.compare = COMPARISONS[self.operator]
+        self.compare_array = ARRAY_COMPARISONS[self.operator]
+        self.value_of = metric_accessor(condition.metric)
+        self.consecutive = condition.consecutive_events or 1
+        self.window = condition.time_window_seconds if rule.type == RuleType.RATE else None
+        # ANOMALY: deviations from the mean, threshold_std_dev or else value
+        self.std_devs = condition.threshold_std_dev or condition.value
+        self.lookback = condition.lookback_minutes
+        self.stateful = rule.type != RuleType.THRESHOLD or self.consecutive > 1
+        # What a stateful rule's window and run length were accumulated under
+        self.condition = (self.metric, self.operator, self.threshold)
+        self.rule = rule
+
+
+class ThresholdGroup:
+    """THRESHOLD rules sharing a metric and operator, laid out by service id.
+
+    The rules of service id s are rules[offsets[s]:offsets[s + 1]], and
+    their thresholds sit at the same positions in ``thresholds``.
+    """
+    __slots__ = ("metric", "operator", "compare", "rules", "thresholds", "offsets")
+
+    def __init__(self, metric: str, operator: str, rules: List[CompiledRule], ids: ServiceIds):
+        self.metric = metric
+        self.operator = operator
+        self.compare = ARRAY_COMPARISONS[operator]
+        services = np.array([ids.intern(rule.service) for rule in rules], dtype=np.int64)
+        order = np.argsort(services, kind="stable")
+        self.rules = [rules[i] for i in order]
+        self.thresholds = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        counts = np.bincount(services, minlength=len(ids))
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def match(self, batch: EventBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """(event positions, rule positions) of every pair that fires"""
+        service_id = batch.service_id
+        values = batch.column(self.metric)
+        # Services interned after this group was built have no rules in it
+        candidates = np.flatnonzero(
+            (service_id >= 0) & (service_id < len(self.offsets) - 1) & ~np.isnan(values)
+        )
+        starts = self.offsets[service_id[candidates]]
+        counts = self.offsets[service_id[candidates] + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            return candidates[:0], candidates[:0]
+        # One row per (event, candidate rule) pair of the event's service
+        events = np.repeat(candidates, counts)
+        rules = np.arange(total) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        fired = self.compare(values[events], self.thresholds[rules])
+        return events[fired], rules[fired]
+
+
+def _placement(rule: CompiledRule) -> str:
+    """Which part of the index evaluates a rule besides by_service"""
+    if rule.type == RuleType.ANOMALY:
+        return "anomaly"
+    return "stateful" if rule.stateful else "threshold"
+
+
+def _merge(current: Iterable[CompiledRule], changed: Set[str], added: List[CompiledRule]) -> List[CompiledRule]:
+    """``current`` without the changed rules, followed by their new versions"""
+    return [rule for rule in current if rule.id not in changed] + added
+
+
+class RuleIndex:
+    """Immutable compiled view of the enabled rules.
+
+    Holds the service -> compiled rules mapping, THRESHOLD groups by
+    (metric, operator), the stateful rules by service id and ANOMALY groups
+    by metric. ``apply`` returns a new version that shares everything a
+    change did not touch.
+    """
+
+    def __init__(
+        self,
+        version: int = 0,
+        compiled: Optional[Dict[str, CompiledRule]] = None,
+        by_service: Optional[Dict[str, Tuple[CompiledRule, ...]]] = None,
+        thresholds: Optional[Dict[Tuple[str, str], ThresholdGroup]] = None,
+        stateful: Optional[Dict[int, Tuple[CompiledRule, ...]]] = None,
+        anomalies: Optional[Dict[str, AnomalyGroup]] = None
+    ):
+        self.version = version
+        self.compiled = compiled or {}
+        self.by_service = by_service or {}
+        self.thresholds = thresholds or {}
+        self.stateful = stateful or {}
+        self.anomalies = anomalies or {}
+        self.threshold_groups = tuple(self.thresholds.values())
+        self.anomaly_groups = tuple(self.anomalies.values())
+
+    @classmethod
+    def build(cls, rules: Iterable[Rule], version: int, ids: ServiceIds = service_ids) -> "RuleIndex":
+        return cls().apply(rules, (), version, ids)
+
+    def apply(
+        self,
+        upserts: Iterable[Rule],
+        deletes: Iterable[str],
+        version: int,
+        ids: ServiceIds = service_ids
+    ) -> "RuleIndex":
+        """A new index with rules upserted and deleted; only the services and
+        groups those rules belong to, before or after, are rebuilt"""
+        compiled = dict(self.compiled)
+        changed: Set[str] = set()
+        removed: List[CompiledRule] = []
+        added: List[CompiledRule] = []
+        deletes = set(deletes)
+        for rule_id in deletes:
+            changed.add(rule_id)
+            if rule_id in compiled:
+                removed.append(compiled.pop(rule_id))
+        # As in RuleStore.apply, a delete beats an upsert of the same rule and
+        # the last upsert of a rule wins; an earlier one must not linger in the groups
+        latest = {rule.id: rule for rule in upserts if rule.id not in deletes}
+        for rule in latest.values():
+            changed.add(rule.id)
+            if rule.id in compiled:
+                removed.append(compiled.pop(rule.id))
+            if rule.enabled and rule.type in EVALUATED_TYPES:
+                compiled[rule.id] = CompiledRule(rule)
+                added.append(compiled[rule.id])
+
+        by_service = dict(self.by_service)
+        added_by_service: Dict[str, List[CompiledRule]] = {}
+        for rule in added:
+            added_by_service.setdefault(rule.service, []).append(rule)
+        for service in {rule.service for rule in removed} | added_by_service.keys():
+            rules = _merge(by_service.get(service, ()), changed, added_by_service.get(service, []))
+            if rules:
+                by_service[service] = tuple(rules)
+            else:
+                by_service.pop(service, None)
+
+        # Changed rules by placement and key, before and after the change
+        touched: Dict[str, Set[Any]] = {"threshold": set(), "stateful": set(), "anomaly": set()}
+        keys = {
+            "threshold": lambda rule: (rule.metric, rule.operator),
+            "stateful": lambda rule: ids.intern(rule.service),
+            "anomaly": lambda rule: rule.metric,
+        }
+        additions: Dict[Tuple[str, Any], List[CompiledRule]] = {}
+        for rule in removed:
+            placement = _placement(rule)
+            touched[placement].add(keys[placement](rule))
+        for rule in added:
+            placement = _placement(rule)
+            key = keys[placement](rule)
+            touched[placement].add(key)
+            additions.setdefault((placement, key), []).append(rule)
+
+        thresholds = dict(self.thresholds)
+        for key in touched["threshold"]:
+            current = thresholds[key].rules if key in thresholds else ()
+            rules = _merge(current, changed, additions.get(("threshold", key), []))
+            if rules:
+                thresholds[key] = ThresholdGroup(key[0], key[1], rules, ids)
+            else:
+                thresholds.pop(key, None)
+
+        stateful = dict(self.stateful)
+        for service_id in touched["stateful"]:
+            rules = _merge(stateful.get(service_id, ()), changed, additions.get(("stateful", service_id), []))
+            if rules:
+                stateful[service_id] = tuple(rules)
+            else:
+                stateful.pop(service_id, None)
+
+        anomalies = dict(self.anomalies)
+        for metric in touched["anomaly"]:
+            current = anomalies[metric].rules if metric in anomalies else ()
+            rules = _merge(current, changed, additions.get(("anomaly", metric), []))
+            if rules:
+                anomalies[metric] = AnomalyGroup(metric, rules, ids)
+            else:
+                anomalies.pop(metric, None)
+
+        return RuleIndex(version, compiled, by_service, thresholds, stateful, anomalies)
+
+    def __len__(self) -> int:
+        return len(self.compiled)
+
+
+class RuleStore:
+    def __init__(self):
+        self._rules: Dict[str, Rule] = {}
+        self.index = RuleIndex()
+        # Called with (upserted rules, deleted ids) after every change
+        self.listeners: List[Callable[[List[Rule], List[str]], None]] = []
+
+    def list(self, service: Optional[str] = None) -> List[Rule]:
+        if service is None:
+            return list(self._rules.values())
+        return [rule for rule in self._rules.values() if rule.service == service]
+
+    def get(self, rule_id: str) -> Optional[Rule]:
+        return self._rules.get(rule_id)
+
+    def create(self, rule: RuleCreate) -> Rule:
+        return self.load([rule])[0]
+
+    def load(self, rules: Iterable[RuleCreate]) -> List[Rule]:
+        """Create many rules with a single index change"""
+        now = int(time.time())
+        created = [Rule(id=str(uuid.uuid4()), created_at=now, **rule.model_dump()) for rule in rules]
+        for rule in created:
+            self._rules[rule.id] = rule
+        self._reindex(created, [])
+        self._notify(created, [])
+        return created
+
+    def apply(self, upserts: Iterable[Rule], deletes: Iterable[str] = ()):
+        """Apply rules made elsewhere, keeping their ids: saved by a previous
+        run, or changed in the supervisor's store"""
+        upserts = list(upserts)
+        deletes = list(deletes)
+        for rule in upserts:
+            self._rules[rule.id] = rule
+        for rule_id in deletes:
+            self._rules.pop(rule_id, None)
+        self._reindex(upserts, deletes)
+        self._notify(upserts, deletes)
+
+    def update(self, rule_id: str, rule: RuleCreate) -> Optional[Rule]:
+        current = self._rules.get(rule_id)
+        if current is None:
+            return None
+        updated = Rule(
+            id=rule_id,
+            created_at=current.created_at,
+            updated_at=int(time.time()),
+            **rule.model_dump()
+        )
+        self._rules[rule_id] = updated
+        self._reindex([updated], [])
+        self._notify([updated], [])
+        return updated
+
+    def delete(self, rule_id: str) -> bool:
+        if self._rules.pop(rule_id, None) is None:
+            return False
+        self._reindex([], [rule_id])
+        self._notify([], [rule_id])
+        return True
+
+    def _notify(self, upserts: List[Rule], deletes: List[str]):
+        for listener in self.listeners:
+            try:
+                listener(upserts, deletes)
+            except Exception as e:
+                logger.error(f"Rule change listener failed: {e}")
+
+    def _reindex(self, upserts: List[Rule], deletes: List[str]):
+        started = time.perf_counter()
+        self.index = self.index.apply(upserts, deletes, self.index.version + 1)
+        INDEX_RELOAD_DURATION.observe(time.perf_counter() - started)
+        RULES_LOADED.labels(state="stored").set(len(self._rules))
+        RULES_LOADED.labels(state="indexed").set(len(self.index))
+        INDEX_VERSION.set(self.index.version)
+        logger.info(
+            f"Rule index v{self.index.version}: {len(self.index)} rules for "
+            f"{len(self.index.by_service)} services"
+        )
+
+
+rule_store = RuleStore()
@@ -0,0 +1,136 @@
+"""Decoding of events consumed from the events topic.
+
+Mirrors the wire formats written by event-ingestion (its app/serializers.py):
+each message names its format in the ``content-format`` header, and messages
+without the header are JSON, which is what older producers wrote. Only the
+decode side lives here; the engine never produces events.
+"""
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional fast path
+    msgpack = None
+
+FORMAT_HEADER = "content-format"
+# How event-ingestion chose the message key; anything but "service" may put
+# a service's events on more than one partition
+PARTITION_STRATEGY_HEADER = "partition-strategy"
+
+# Binary layout, version 1 (little endian); see event-ingestion for the writer:
+#   B version, B flags, q timestamp, d latency_ms, B status
+#   id:         16 raw UUID bytes if FLAG_UUID_ID, else H length + UTF-8
+#   service:    H length + UTF-8
+#   error_code: H length + UTF-8, only if FLAG_ERROR_CODE
+#   metadata:   I length + JSON bytes, only if FLAG_METADATA
+BINARY_VERSION = 1
+FLAG_LATENCY = 0x01
+FLAG_ERROR_CODE = 0x02
+FLAG_METADATA = 0x04
+FLAG_UUID_ID = 0x08
+
+_FIXED = struct.Struct("<BBqdB")
+_SHORT = struct.Struct("<H")
+_LONG = struct.Struct("<I")
+
+STATUS_CODES = {"OK": 0, "ERROR": 1, "WARNING": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON, used for the alerts the engine publishes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _loads_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _decode_msgpack(payload: bytes) -> Dict[str, Any]:
+    if msgpack is None:
+        raise RuntimeError("Decoding msgpack events requires the msgpack package")
+    return msgpack.unpackb(payload)
+
+
+def _read_short_str(payload: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _SHORT.unpack_from(payload, offset)
+    offset += _SHORT.size
+    return bytes(payload[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def _decode_binary(payload: bytes) -> Dict[str, Any]:
+    version, flags, timestamp, latency, status = _FIXED.unpack_from(payload, 0)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary event version: {version}")
+    offset = _FIXED.size
+
+    if flags & FLAG_UUID_ID:
+        h = bytes(payload[offset:offset + 16]).hex()
+        event_id = f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+        offset += 16
+    else:
+        event_id, offset = _read_short_str(payload, offset)
+    service, offset = _read_short_str(payload, offset)
+    error_code = None
+    if flags & FLAG_ERROR_CODE:
+        error_code, offset = _read_short_str(payload, offset)
+    metadata = None
+    if flags & FLAG_METADATA:
+        (length,) = _LONG.unpack_from(payload, offset)
+        offset += _LONG.size
+        metadata = _loads_json(payload[offset:offset + length])
+
+    return {
+        "id": event_id,
+        "service": service,
+        "timestamp": timestamp,
+        "latency_ms": latency if flags & FLAG_LATENCY else None,
+        "error_code": error_code,
+        "status": STATUS_NAMES[status],
+        "metadata": metadata,
+    }
+
+
+DECODERS: Dict[str, Callable[[bytes], Dict[str, Any]]] = {
+    "json": _loads_json,
+    "msgpack": _decode_msgpack,
+    "binary": _decode_binary,
+}
+
+
+def wire_format(headers: Optional[Sequence[Tuple[str, bytes]]]) -> str:
+    for key, value in headers or ():
+        if key == FORMAT_HEADER:
+            return value.decode("ascii")
+    return "json"
+
+
+def keyed_by_service(headers: Optional[Sequence[Tuple[str, bytes]]]) -> bool:
+    for key, value in headers or ():
+        if key == PARTITION_STRATEGY_HEADER:
+            return value == b"service"
+    return True
+
+
+def decode_event(
+    payload: bytes,
+    headers: Optional[Sequence[Tuple[str, bytes]]] = None
+) -> Dict[str, Any]:
+    """Decode a Kafka message value using the format named in its headers"""
+    name = wire_format(headers)
+    try:
+        decoder = DECODERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown event wire format: {name}")
+    return decoder(payload)
@@ -0,0 +1,148 @@
+"""Supervisor mode: rule evaluation in several worker processes on one node.
+
+One asyncio process is GIL-bound long before Kafka is, so with
+``worker_processes`` above 1 the API process evaluates nothing itself and
+instead runs that many worker processes. Every worker joins the same
+consumer group, so Kafka hands each a disjoint set of partitions, and since
+events of services with stateful rules are keyed by service (see
+app/engine.py), each worker owns the rule state of its services.
+
+The API process keeps the rule store of record. Every change to it is sent
+down a pipe to each worker, which applies it to its own store; a worker
+started or restarted later first receives the full rule set. Metrics from
+all processes are served together when PROMETHEUS_MULTIPROC_DIR is set.
+"""
+from multiprocessing.connection import Connection
+from prometheus_client import multiprocess
+from typing import List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+
+from pythonjsonlogger import jsonlogger
+
+from .config import settings
+from .consumer import worker
+from .models import Rule
+from .rules import RuleStore, rule_store
+
+logger = logging.getLogger(__name__)
+
+# Children must not inherit the event loop or the Kafka clients' threads
+_context = multiprocessing.get_context("spawn")
+
+
+class WorkerProcess:
+    def __init__(self, index: int, process: multiprocessing.Process, conn: Connection):
+        self.index = index
+        self.process = process
+        self.conn = conn
+
+
+class Supervisor:
+    def __init__(self, store: RuleStore, processes: int):
+        self.store = store
+        self.processes = processes
+        self.workers: List[WorkerProcess] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.store.listeners.append(self._broadcast)
+        self.workers = [self._spawn(index) for index in range(self.processes)]
+        self._task = asyncio.create_task(self._watch())
+        logger.info(f"Supervising {self.processes} rule engine worker processes")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._broadcast in self.store.listeners:
+            self.store.listeners.remove(self._broadcast)
+        for child in self.workers:
+            # Closing the pipe tells the worker to stop after its current batch
+            child.conn.close()
+        for child in self.workers:
+            await asyncio.to_thread(child.process.join, settings.worker_stop_timeout_seconds)
+            if child.process.is_alive():
+                logger.warning(f"Worker process {child.index} did not stop, terminating it")
+                child.process.terminate()
+                await asyncio.to_thread(child.process.join)
+            self._reap(child)
+        self.workers = []
+
+    def _spawn(self, index: int) -> WorkerProcess:
+        conn, child_conn = _context.Pipe()
+        process = _context.Process(
+            target=run_worker, args=(index, child_conn), name=f"rules-worker-{index}"
+        )
+        process.start()
+        child_conn.close()
+        conn.send((self.store.list(), []))
+        logger.info(f"Started worker process {index} (pid {process.pid})")
+        return WorkerProcess(index, process, conn)
+
+    def _reap(self, child: WorkerProcess):
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            multiprocess.mark_process_dead(child.process.pid)
+
+    def _broadcast(self, upserts: List[Rule], deletes: List[str]):
+        for child in self.workers:
+            try:
+                child.conn.send((upserts, deletes))
+            except (OSError, ValueError) as e:
+                # A dead worker gets the full rule set when it is restarted
+                logger.warning(f"Could not send rule changes to worker process {child.index}: {e}")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(settings.worker_restart_seconds)
+            for position, child in enumerate(self.workers):
+                if child.process.is_alive():
+                    continue
+                logger.error(
+                    f"Worker process {child.index} exited with code {child.process.exitcode}, restarting it"
+                )
+                child.conn.close()
+                self._reap(child)
+                self.workers[position] = self._spawn(child.index)
+
+
+def run_worker(index: int, conn: Connection):
+    """Entry point of a worker process"""
+    # Shutdown is driven by the supervisor closing the pipe, not by Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(jsonlogger.JsonFormatter())
+        root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+    settings.kafka_client_id = f"{settings.kafka_client_id}-{index}"
+    asyncio.run(_serve(conn))
+
+
+async def _serve(conn: Connection):
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+
+    def receive():
+        while True:
+            try:
+                upserts, deletes = conn.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(stopped.set)
+                return
+            loop.call_soon_threadsafe(worker.engine.store.apply, upserts, deletes)
+
+    # Rules arrive on a thread so a blocking recv never stalls evaluation
+    threading.Thread(target=receive, name="rule-updates", daemon=True).start()
+    await worker.start()
+    await stopped.wait()
+    await worker.stop()
+
+
+supervisor = Supervisor(rule_store, settings.worker_processes or os.cpu_count() or 1)
@@ -0,0 +1,129 @@
+"""Per-rule state for RATE windows and consecutive-event conditions.
+
+A RATE rule compares the per-second rate of its metric over the last
+``time_window_seconds`` with its threshold. Each rule keeps a ring of
+per-second sums, preallocated when the rule is first seen, plus the running
+sum of the buckets inside the window. Adding to a second and reading the
+rate are O(1), and memory per rule is fixed by its window.
+
+Time is event time. A second is closed, and the window ending at it
+evaluated, once an event ``grace`` seconds newer has been seen; until then
+events for it may arrive in any order. A straggler whose second is already
+closed still counts toward the window it falls in but does not re-evaluate
+closed seconds, and one older than the ring is dropped. Seconds closed
+before the rule has seen a full window are not evaluated, so a rule that
+fires on a low rate does not fire just because its history is short.
+
+A rule with ``consecutive_events`` fires only once its condition has held
+on that many evaluations in a row: events for THRESHOLD rules, closed
+seconds for RATE rules. The run length is one counter per rule.
+
+State remembers the (metric, operator, threshold) it was accumulated under,
+so an edit to a rule keeps whatever is still valid: a RATE ring survives
+anything but a change of metric or window, and a run length is reset when
+the condition it counted changes.
+"""
+from prometheus_client import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+LATE_EVENTS = Counter(
+    "rules_engine_late_events_total",
+    "Events for an already closed second of a RATE window, by whether they still counted",
+    ["outcome"]
+)
+
+
+def run_lengths(held: np.ndarray, carry: int) -> np.ndarray:
+    """Run length of held conditions ending at each position.
+
+    ``carry`` is the run in progress before the first position.
+    """
+    positions = np.arange(len(held))
+    last_break = np.maximum.accumulate(np.where(held, -1, positions))
+    return np.where(last_break >= 0, positions - last_break, carry + positions + 1)
+
+
+class RunLength:
+    """State of a THRESHOLD rule with consecutive_events"""
+    __slots__ = ("condition", "run")
+
+    def __init__(self, condition: Tuple[str, str, float]):
+        self.condition = condition
+        self.run = 0
+
+
+class RateWindow:
+    """Ring of per-second sums for one RATE rule.
+
+    The ring covers seconds (head - size, head] where head is the newest
+    second seen; ``total`` is the sum over the window ending at the newest
+    closed second, head - grace - 1. ``start`` is the first second seen.
+    """
+    __slots__ = ("window", "grace", "condition", "buckets", "start", "head", "total", "run")
+
+    def __init__(self, window: int, grace: int, condition: Tuple[str, str, float]):
+        self.window = window
+        self.grace = grace
+        self.condition = condition
+        self.buckets = np.zeros(window + grace + 1, dtype=np.float64)
+        self.start = None
+        self.head = None
+        self.total = 0.0
+        self.run = 0
+
+    def matches(self, window: int, grace: int, metric: str) -> bool:
+        """Whether the ring can serve a rule with these parameters"""
+        return self.window == window and self.grace == grace and self.condition[0] == metric
+
+    def rebind(self, condition: Tuple[str, str, float]):
+        """Keep the sums for a new operator or threshold; the run counted the old one"""
+        if condition != self.condition:
+            self.condition = condition
+            self.run = 0
+
+    def add(self, seconds: np.ndarray, sums: np.ndarray, counts: np.ndarray) -> List[Tuple[int, float]]:
+        """Add the metric sums and event counts of distinct seconds, ascending.
+
+        Returns (second, rate) for every second closed along the way once
+        the window is warm.
+        """
+        closed = []
+        buckets = self.buckets
+        size = len(buckets)
+        for second, value, count in zip(seconds.tolist(), sums.tolist(), counts.tolist()):
+            if self.head is None:
+                self.start = self.head = second
+            elif second > self.head:
+                self._advance(second, closed)
+            head = self.head
+            if second <= head - size:
+                LATE_EVENTS.labels(outcome="dropped").inc(count)
+                continue
+            buckets[second % size] += value
+            if second <= head - self.grace - 1:
+                self.total += value
+                LATE_EVENTS.labels(outcome="counted").inc(count)
+        warm = self.start + self.window - 1
+        return [(second, rate) for second, rate in closed if second >= warm]
+
+    def _advance(self, head: int, closed: List[Tuple[int, float]]):
+        buckets = self.buckets
+        size = len(buckets)
+        lag = self.grace + 1
+        if head - self.head > size:
+            # Everything in the ring has left the window; evaluate the gap once
+            buckets[:] = 0.0
+            self.total = 0.0
+            self.head = head
+            closed.append((head - lag, 0.0))
+            return
+        for second in range(self.head + 1, head + 1):
+            # The bucket reused for this second held the one leaving the window
+            slot = second % size
+            self.total -= float(buckets[slot])
+            buckets[slot] = 0.0
+            self.total += float(buckets[(second - lag) % size])
+            closed.append((second - lag, self.total / self.window))
+        self.head = head
@@ -0,0 +1,95 @@
+"""Events per second through decode and THRESHOLD evaluation.
+
+Rules are spread over services with a fixed number per service, so the
+total rule count grows with the number of services. With the per-service
+index the throughput should stay flat as total rules grow; per-event cost
+follows the rules of the event's own service only.
+
+Run from services/alert-rules-engine:
+
+    python -m benchmarks.bench_engine [--events N] [--rules-per-service N]
+"""
+from collections import namedtuple
+import argparse
+import json
+import random
+import time
+
+from app.engine import RuleEngine
+from app.models import RuleCreate
+from app.rules import RuleStore
+from app.serializers import dumps
+
+Record = namedtuple("Record", "value headers offset")
+HEADERS = [("content-format", b"json")]
+METRICS = [("latency_ms", ">", 250.0), ("error", "==", 1.0), ("register", ">=", 11.0)]
+
+
+def make_store(total_rules: int, rules_per_service: int) -> RuleStore:
+    store = RuleStore()
+    store.load(
+        RuleCreate(
+            service=f"service-{i // rules_per_service}",
+            name=f"rule-{i}",
+            type="THRESHOLD",
+            condition=dict(zip(("metric", "operator", "value"), METRICS[i % len(METRICS)])),
+            severity="HIGH"
+        )
+        for i in range(total_rules)
+    )
+    return store
+
+
+def make_records(count: int, services: int, seed: int = 7):
+    rng = random.Random(seed)
+    records = []
+    for offset in range(count):
+        is_error = rng.random() < 0.01
+        event = {
+            "id": f"event-{offset}",
+            "service": f"service-{rng.randrange(services)}",
+            "timestamp": 1_700_000_000 + offset // 1000,
+            "latency_ms": round(rng.lognormvariate(3.5, 0.6), 3),
+            "error_code": "E_TIMEOUT" if is_error else None,
+            "status": "ERROR" if is_error else "OK",
+            "metadata": {"store_id": f"store-{rng.randrange(2000):04d}", "register": rng.randrange(12)},
+        }
+        records.append(Record(dumps(event), HEADERS, offset))
+    return records
+
+
+def run(total_rules: int, rules_per_service: int, records, repeat: int):
+    engine = RuleEngine(make_store(total_rules, rules_per_service))
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        alerts = 0
+        for start in range(0, len(records), 5000):
+            alerts += len(engine.process(0, records[start:start + 5000]))
+        best = min(best, time.perf_counter() - started)
+    return {
+        "total_rules": total_rules,
+        "rules_per_service": rules_per_service,
+        "events": len(records),
+        "alerts": alerts,
+        "events_per_second": round(len(records) / best),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--rules-per-service", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    results = []
+    for total_rules in (30, 300, 3000, 30000):
+        services = max(1, total_rules // args.rules_per_service)
+        # Events only go to services that have rules, so every event is evaluated
+        records = make_records(args.events, min(services, 100))
+        results.append(run(total_rules, args.rules_per_service, records, args.repeat))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-event vs vectorized THRESHOLD evaluation at 1, 100 and 10,000 rules.
+
+Both paths see the same decoded events, so the numbers compare evaluation
+alone; decoding into the columnar batch is timed separately. Rules are
+spread over the services the events come from, three metric/operator
+combinations in turn, and the two paths are checked to fire the same
+(event, rule) pairs.
+
+Run from services/alert-rules-engine:
+
+    python -m benchmarks.bench_vectorized [--events N] [--services N]
+"""
+import argparse
+import json
+import time
+
+from app.columnar import EventBatch
+from app.engine import RuleEngine
+from app.serializers import decode_event
+
+from .bench_engine import make_records, make_store
+
+
+def best_of(repeat: int, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def fired(alerts):
+    return sorted((alert["metadata"]["event_id"], alert["rule_id"]) for alert in alerts)
+
+
+def run(total_rules: int, services: int, events, batch_size: int, repeat: int):
+    engine = RuleEngine(make_store(total_rules, max(1, total_rules // services)))
+    chunks = [events[start:start + batch_size] for start in range(0, len(events), batch_size)]
+
+    decode_seconds, batches = best_of(repeat, lambda: [EventBatch(chunk) for chunk in chunks])
+    per_event_seconds, per_event = best_of(
+        repeat, lambda: [alert for chunk in chunks for alert in engine.evaluate(chunk)]
+    )
+    vectorized_seconds, vectorized = best_of(
+        repeat, lambda: [alert for batch in batches for alert in engine.evaluate_batch(batch)]
+    )
+    if fired(per_event) != fired(vectorized):
+        raise AssertionError(f"Paths disagree at {total_rules} rules")
+    return {
+        "total_rules": total_rules,
+        "events": len(events),
+        "alerts": len(vectorized),
+        "per_event_events_per_second": round(len(events) / per_event_seconds),
+        "vectorized_events_per_second": round(len(events) / vectorized_seconds),
+        "columnar_build_events_per_second": round(len(events) / decode_seconds),
+        "speedup": round(per_event_seconds / vectorized_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--services", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    events = [decode_event(record.value, record.headers) for record in make_records(args.events, args.services)]
+    results = [
+        run(total_rules, args.services, events, args.batch_size, args.repeat)
+        for total_rules in (1, 100, 10_000)
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
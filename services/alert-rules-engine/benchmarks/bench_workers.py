@@ -0,0 +1,88 @@
+"""Throughput scaling of partition-sharded worker processes, 1 to 8.
+
+Each process stands in for one supervisor worker: it owns its own
+partitions, builds the same rule set and evaluates its share of the events
+through RuleEngine.process, as it would from Kafka. Processes start timing
+together, so aggregate throughput is all events over the slowest worker.
+Results with more workers than cores are marked ``oversubscribed``; they
+show the cost of sharing a core, not scaling.
+
+Multi-core scaling has not been measured yet. The only recorded run is on a
+single-core host (--events-per-worker 20000 --rules 300 --max-workers 4),
+where throughput with 1, 2 and 4 workers was 206k, 155k and 157k events/s,
+i.e. the process overhead and no speedup. Record a run on a multi-core host
+here before relying on worker_processes for throughput.
+
+Run from services/alert-rules-engine:
+
+    python -m benchmarks.bench_workers [--events-per-worker N] [--max-workers N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from app.engine import RuleEngine
+
+from .bench_engine import make_records, make_store
+
+BATCH = 5000
+
+
+def shard(index: int, args, barrier, results):
+    engine = RuleEngine(make_store(args.rules, args.rules_per_service))
+    services = args.rules // args.rules_per_service
+    # Partition p of the worker holds its own events, as Kafka would hand out
+    records = make_records(args.events_per_worker, services, seed=index)
+    partitions = [records[start:start + BATCH] for start in range(0, len(records), BATCH)]
+    barrier.wait()
+    started = time.perf_counter()
+    for position, batch in enumerate(partitions):
+        engine.process(index * 1000 + position % args.partitions_per_worker, batch)
+    results.put(time.perf_counter() - started)
+
+
+def run(workers: int, args):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=shard, args=(index, args, barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    slowest = max(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    events = workers * args.events_per_worker
+    return {
+        "workers": workers,
+        "events": events,
+        "events_per_second": round(events / slowest),
+        "oversubscribed": workers > (os.cpu_count() or 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events-per-worker", type=int, default=200_000)
+    parser.add_argument("--partitions-per-worker", type=int, default=4)
+    parser.add_argument("--rules", type=int, default=3000)
+    parser.add_argument("--rules-per-service", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+    results = []
+    workers = 1
+    while workers <= args.max_workers:
+        results.append(run(workers, args))
+        workers *= 2
+    baseline = results[0]["events_per_second"]
+    for result in results:
+        result["speedup"] = round(result["events_per_second"] / baseline, 2)
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import pytest
+
+from app.rules import RuleStore
+
+
+@pytest.fixture
+def store():
+    return RuleStore()
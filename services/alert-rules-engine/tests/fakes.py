@@ -0,0 +1,44 @@
+"""Kafka-shaped stand-ins for worker tests"""
+from collections import namedtuple
+import asyncio
+
+import orjson
+
+Record = namedtuple("Record", "offset value headers")
+TopicPartition = namedtuple("TopicPartition", "topic partition")
+
+
+def records(events, start=0):
+    """Kafka-shaped JSON records of events, from offset ``start``"""
+    return [Record(start + i, orjson.dumps(event), None) for i, event in enumerate(events)]
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.commits = []
+        self.seeks = []
+
+    async def commit(self, offsets):
+        self.commits.append(offsets)
+
+    def highwater(self, tp):
+        return None
+
+    def seek(self, tp, offset):
+        self.seeks.append((tp, offset))
+
+
+class FakeProducer:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, topic, value, key):
+        future = asyncio.get_running_loop().create_future()
+        if self.failures:
+            self.failures -= 1
+            future.set_exception(ConnectionError("broker unavailable"))
+        else:
+            self.sent.append(orjson.loads(value))
+            future.set_result(None)
+        return future
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from app.anomaly import SeriesStats
+
+
+def test_merged_chunks_match_the_minute_statistics():
+    stats = SeriesStats()
+    slots = stats.lookup([("checkout", 10), ("payments", 10)])
+    values = np.array([1.0, 4.0, 2.0, 8.0, 3.0, 5.0])
+    owners = slots[[0, 1, 0, 1, 0, 1]]
+    stats.merge(owners[:2], values[:2])
+    stats.merge(owners[2:], values[2:])
+    a = stats.arrays
+    for slot, series in zip(slots, (values[0::2], values[1::2])):
+        assert a["count"][slot] == 3
+        assert a["bucket_mean"][slot] == pytest.approx(series.mean())
+        assert a["bucket_m2"][slot] / 3 == pytest.approx(series.var())
+
+
+def test_closed_minutes_fold_into_an_ewm_baseline():
+    stats = SeriesStats()
+    slot = stats.lookup([("checkout", 3)])
+    stats.close(slot, minute=0)
+    stats.merge(slot[[0, 0]], np.array([10.0, 20.0]))
+    stats.close(slot, minute=1)
+    a = stats.arrays
+    # The first minute becomes the baseline as is
+    assert (a["mean"][0], a["var"][0], a["closed"][0]) == (15.0, 25.0, 1)
+
+    stats.merge(slot[[0, 0]], np.array([30.0, 30.0]))
+    stats.close(slot, minute=2)
+    alpha = 2.0 / (3 + 1)
+    assert a["mean"][0] == pytest.approx(15.0 + alpha * 15.0)
+    assert a["var"][0] == pytest.approx((1 - alpha) * 25.0 + alpha * (1 - alpha) * 15.0 ** 2)
+    # Closing the same minute again changes nothing
+    stats.close(slot, minute=2)
+    assert a["closed"][0] == 2
+
+
+def test_scores_are_nan_while_warming_up():
+    stats = SeriesStats()
+    slot = stats.lookup([("checkout", 5)])
+    stats.merge(slot[[0, 0]], np.array([10.0, 20.0]))
+    stats.close(slot, minute=1)
+    z, mean, std = stats.score(slot, np.array([25.0]), warmup_minutes=2)
+    assert np.isnan(z[0]) and mean[0] == 15.0
+    z, mean, std = stats.score(slot, np.array([25.0]), warmup_minutes=1)
+    assert z[0] == pytest.approx(2.0) and std[0] == pytest.approx(5.0)
+
+
+def test_slots_grow_and_are_reused():
+    stats = SeriesStats(capacity=2)
+    slots = stats.lookup([(f"s{i}", 10) for i in range(5)])
+    assert slots.tolist() == [0, 1, 2, 3, 4]
+    assert len(stats.arrays["mean"]) >= 5
+    stats.merge(slots[[1]], np.array([7.0]))
+
+    stats.retain(["s0", "s2", "s3", "s4"])
+    assert len(stats) == 4
+    reused = stats.lookup([("s5", 10)])
+    assert reused.tolist() == [1]
+    # A reused slot starts from a clean series
+    assert stats.arrays["count"][1] == 0 and stats.arrays["minute"][1] == -1
+    assert stats.lookup([("s0", 10)]).tolist() == [0]
@@ -0,0 +1,89 @@
+from functools import partial
+import random
+
+import numpy as np
+import pytest
+
+from app.checkpoint import Checkpoints, decode, encode
+from app.dedup import AlertDeduplicator
+from app.engine import RuleEngine
+from app.models import RuleCreate
+
+from .fakes import records
+
+
+def rule(kind, service="checkout", **condition):
+    return RuleCreate(
+        service=service,
+        name=kind.lower(),
+        type=kind,
+        condition={"metric": "latency_ms", "operator": ">", "value": 2, **condition},
+        severity="HIGH",
+    )
+
+
+RULES = [
+    rule("RATE", time_window_seconds=30),
+    rule("THRESHOLD", value=150, consecutive_events=3),
+    rule("ANOMALY", lookback_minutes=5),
+    rule("RATE", service="payments", operator="<", time_window_seconds=10),
+]
+
+
+def events(count, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"e{i}",
+            "service": rng.choice(["checkout", "payments"]),
+            "timestamp": 1_700_000_000 + i // 4,
+            "latency_ms": 2000.0 if i % 500 == 499 else rng.gauss(140, 15),
+        }
+        for i in range(count)
+    ]
+
+
+def engine(store, dedup=True):
+    return RuleEngine(store, 2, 1, partial(AlertDeduplicator, 60.0, 30.0, 1000) if dedup else None)
+
+
+def without_ids(alerts):
+    return [{key: value for key, value in alert.items() if key != "id"} for alert in alerts]
+
+
+@pytest.mark.parametrize("dedup", [True, False], ids=["dedup", "every-firing"])
+def test_restored_state_continues_like_the_original(store, tmp_path, dedup):
+    store.load(RULES)
+    stream = records(events(4000))
+    head, tail = stream[:2500], stream[2500:]
+
+    original = engine(store, dedup)
+    original.process(0, head)
+    checkpoints = Checkpoints(str(tmp_path), "events")
+    checkpoints.save(0, encode(original.partitions[0]))
+    expected = original.process(0, tail)
+    assert expected
+
+    restored = engine(store, dedup)
+    state = checkpoints.load(0, restored.deduplicator)
+    assert state.next_offset == len(head)
+    restored.partitions[0] = state
+    assert without_ids(restored.process(0, tail)) == without_ids(expected)
+
+
+def test_encode_decode_round_trip(store):
+    store.load(RULES)
+    first = engine(store)
+    first.process(0, records(events(2000)))
+    arrays = encode(first.partitions[0])
+    again = encode(decode(0, arrays, first.deduplicator))
+    assert arrays.keys() == again.keys()
+    for name in arrays:
+        assert np.array_equal(arrays[name], again[name]), name
+
+
+def test_unreadable_snapshots_are_ignored(tmp_path):
+    checkpoints = Checkpoints(str(tmp_path), "events")
+    assert checkpoints.load(0) is None
+    (tmp_path / "events-0.npz").write_bytes(b"not a snapshot")
+    assert checkpoints.load(0) is None
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.consumer import RuleEngineWorker
+from app.dedup import AlertDeduplicator
+from app.engine import RuleEngine
+from app.models import RuleCreate
+
+from .fakes import FakeConsumer, FakeProducer, TopicPartition, records
+
+
+def slow_rule():
+    return RuleCreate(
+        service="checkout",
+        name="slow",
+        type="THRESHOLD",
+        condition={"metric": "latency_ms", "operator": ">", "value": 100},
+        severity="HIGH",
+    )
+
+
+def test_failed_publish_resends_the_same_alerts(store):
+    store.create(slow_rule())
+    engine = RuleEngine(store, deduplicator=lambda: AlertDeduplicator(300, 60, 100))
+    worker = RuleEngineWorker(engine)
+    worker.consumer = FakeConsumer()
+    worker.producer = FakeProducer(failures=1)
+    tp = TopicPartition("service-events", 0)
+    batch = {tp: records([{"service": "checkout", "timestamp": 1000, "latency_ms": 250.0}])}
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(worker._process(batch))
+    assert worker.consumer.commits == []
+    # The retried batch finds the deduplicator's group already open
+    asyncio.run(worker._process(batch))
+    assert len(worker.producer.sent) == 1
+    assert worker.producer.sent[0]["metadata"]["value"] == 250.0
+    assert worker.consumer.commits == [{tp: 1}]
+
+
+async def failing_commit(offsets):
+    raise ConnectionError("group coordinator unavailable")
+
+
+def test_retried_batch_is_not_counted_twice(store):
+    store.create(RuleCreate(
+        service="checkout",
+        name="slow twice",
+        type="THRESHOLD",
+        condition={"metric": "latency_ms", "operator": ">", "value": 100, "consecutive_events": 2},
+        severity="HIGH",
+    ))
+    worker = RuleEngineWorker(RuleEngine(store))
+    worker.consumer = FakeConsumer()
+    worker.producer = FakeProducer()
+    tp = TopicPartition("service-events", 0)
+    batch = {tp: records([{"service": "checkout", "timestamp": 1000, "latency_ms": 250.0}])}
+
+    worker.consumer.commit = failing_commit
+    with pytest.raises(ConnectionError):
+        asyncio.run(worker._process(batch))
+    worker.consumer.commit = FakeConsumer().commit
+    asyncio.run(worker._process(batch))
+    # One slow event so far, however often its batch was retried
+    assert worker.producer.sent == []
+    assert worker.engine.partitions[0].rules.popitem()[1].run == 1
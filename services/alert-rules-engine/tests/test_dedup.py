@@ -0,0 +1,54 @@
+from app.dedup import AlertDeduplicator
+
+
+def firing(rule_id, timestamp, service="checkout"):
+    return {
+        "id": f"{rule_id}-{timestamp}",
+        "service": service,
+        "rule_id": rule_id,
+        "severity": "HIGH",
+        "message": f"fired at {timestamp}",
+        "timestamp": timestamp,
+        "metadata": {},
+    }
+
+
+def test_repeated_firings_fold_into_one_alert():
+    dedup = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=100)
+    published = dedup.collapse([firing("r1", 1000) for _ in range(10)])
+    assert len(published) == 1
+    assert published[0]["id"] == "r1-1000"
+    assert published[0]["metadata"]["count"] == 10
+
+
+def test_open_alert_is_republished_per_update_interval():
+    dedup = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=100)
+    published = []
+    for second in range(1000, 1200):
+        published += dedup.collapse([firing("r1", second)])
+    assert [alert["metadata"]["last_seen"] for alert in published] == [1000, 1060, 1120, 1180]
+    assert {alert["id"] for alert in published} == {"r1-1000"}
+
+
+def test_cooldown_reopens_or_starts_a_new_alert():
+    dedup = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=100)
+    first = dedup.collapse([firing("r1", 1000)])[0]
+    assert dedup.collapse([firing("r1", 1200)])[0]["id"] == first["id"]
+    assert dedup.collapse([firing("r1", 1600)])[0]["id"] == "r1-1600"
+
+
+def test_groups_are_bounded():
+    dedup = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=3)
+    for i in range(10):
+        dedup.collapse([firing(f"r{i}", 1000)])
+    assert len(dedup) == 3
+
+
+def test_export_load_round_trip():
+    dedup = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=100)
+    dedup.collapse([firing("r1", 1000), firing("r2", 1010, service="payments")])
+    restored = AlertDeduplicator(cooldown_seconds=300, update_interval_seconds=60, max_groups=100)
+    restored.load(dedup.export())
+    assert restored.export() == dedup.export()
+    # Still open after the restore: folded, not reopened
+    assert restored.collapse([firing("r1", 1020)]) == []
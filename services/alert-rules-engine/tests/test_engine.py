@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+
+import httpx
+import orjson
+
+from app.columnar import decode_records
+from app.engine import SPLIT_SERVICE_EVENTS, RuleEngine
+from app.models import RuleCreate
+
+from .fakes import Record, records
+
+
+def rule(service="checkout", **condition):
+    kind = "RATE" if "time_window_seconds" in condition else "THRESHOLD"
+    return RuleCreate(
+        service=service,
+        name="rule",
+        type=kind,
+        condition={"metric": "latency_ms", "operator": ">", "value": 100, **condition},
+        severity="HIGH",
+    )
+
+
+def test_threshold_rules_fire_per_event(store):
+    store.load([rule(), rule("payments")])
+    engine = RuleEngine(store)
+    alerts = engine.process(0, records([
+        {"id": "e1", "service": "checkout", "timestamp": 1, "latency_ms": 250.0},
+        {"id": "e2", "service": "checkout", "timestamp": 2, "latency_ms": 50.0},
+        {"id": "e3", "service": "inventory", "timestamp": 3, "latency_ms": 999.0},
+    ]))
+    assert [alert["metadata"]["event_id"] for alert in alerts] == ["e1"]
+    assert uuid.UUID(alerts[0]["id"]).version == 4
+
+
+def test_vectorized_matches_per_event_evaluation(store):
+    store.load([rule(value=value) for value in (10, 100, 200)])
+    engine = RuleEngine(store)
+    events = [
+        {"id": str(i), "service": "checkout", "timestamp": i, "latency_ms": float(i)} for i in range(300)
+    ]
+    batch, _ = decode_records(0, records(events))
+    fired = sorted((a["metadata"]["event_id"], a["rule_id"]) for a in engine.evaluate_batch(batch))
+    assert fired == sorted((a["metadata"]["event_id"], a["rule_id"]) for a in engine.evaluate(events))
+
+
+def test_records_not_keyed_by_service_are_flagged(store):
+    store.create(rule(time_window_seconds=10))
+    engine = RuleEngine(store)
+    before = SPLIT_SERVICE_EVENTS._value.get()
+    event = orjson.dumps({"service": "checkout", "timestamp": 1, "latency_ms": 1.0})
+    engine.process(0, [
+        Record(0, event, [("partition-strategy", b"salted")]),
+        Record(1, event, [("partition-strategy", b"service")]),
+    ])
+    assert SPLIT_SERVICE_EVENTS._value.get() - before == 1
+
+
+def test_stateful_services_endpoint():
+    from app.main import app
+    from app.rules import rule_store
+
+    created = rule_store.load([rule("checkout", consecutive_events=3), rule("payments")])
+
+    async def get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://engine") as client:
+            return (await client.get("/rules/stateful-services")).json()
+
+    try:
+        assert asyncio.run(get()) == ["checkout"]
+    finally:
+        for created_rule in created:
+            rule_store.delete(created_rule.id)
@@ -0,0 +1,89 @@
+import random
+
+from app.columnar import ServiceIds
+from app.models import Rule
+from app.rules import RuleIndex
+
+
+def make_rule(rule_id, service, kind="THRESHOLD", metric="latency_ms", operator=">", enabled=True, **condition):
+    if kind == "RATE":
+        condition.setdefault("time_window_seconds", 60)
+    if kind == "ANOMALY":
+        condition.setdefault("lookback_minutes", 30)
+    return Rule(
+        id=rule_id,
+        created_at=0,
+        service=service,
+        name=rule_id,
+        type=kind,
+        condition={"metric": metric, "operator": operator, "value": 3, **condition},
+        severity="HIGH",
+        enabled=enabled,
+    )
+
+
+def shape(index):
+    """Rule ids per part of the index, order aside"""
+    return {
+        "compiled": sorted(index.compiled),
+        "by_service": {key: sorted(rule.id for rule in rules) for key, rules in index.by_service.items()},
+        "thresholds": {key: sorted(rule.id for rule in group.rules) for key, group in index.thresholds.items()},
+        "stateful": {key: sorted(rule.id for rule in rules) for key, rules in index.stateful.items()},
+        "anomalies": {key: sorted(rule.id for rule in group.rules) for key, group in index.anomalies.items()},
+    }
+
+
+def random_rule(rng, rule_id):
+    return make_rule(
+        rule_id,
+        rng.choice(["checkout", "payments", "inventory"]),
+        kind=rng.choice(["THRESHOLD", "THRESHOLD", "RATE", "ANOMALY"]),
+        metric=rng.choice(["latency_ms", "count"]),
+        operator=rng.choice([">", "<"]),
+        enabled=rng.random() > 0.1,
+        consecutive_events=rng.choice([None, None, 3]),
+    )
+
+
+def test_diffs_match_a_full_rebuild():
+    rng = random.Random(7)
+    ids = ServiceIds()
+    rules = {}
+    index = RuleIndex.build([], 0, ids)
+    for version in range(1, 200):
+        upserts = [random_rule(rng, f"r{rng.randrange(40)}") for _ in range(rng.randrange(4))]
+        deletes = rng.sample(sorted(rules), min(len(rules), rng.randrange(3)))
+        # Applied like RuleStore.apply: upserts in order, then deletes
+        rules.update((rule.id, rule) for rule in upserts)
+        for rule_id in deletes:
+            rules.pop(rule_id, None)
+        index = index.apply(upserts, deletes, version, ids)
+        assert shape(index) == shape(RuleIndex.build(rules.values(), version, ids))
+
+
+def test_untouched_groups_are_shared():
+    ids = ServiceIds()
+    index = RuleIndex.build([
+        make_rule("a", "checkout"),
+        make_rule("b", "payments", metric="count"),
+        make_rule("c", "payments", kind="RATE"),
+        make_rule("d", "inventory", kind="ANOMALY"),
+    ], 1, ids)
+    updated = index.apply([make_rule("a", "checkout", operator="<")], [], 2, ids)
+    assert updated.version == 2
+    assert updated.thresholds[("count", ">")] is index.thresholds[("count", ">")]
+    assert updated.stateful is not index.stateful
+    assert updated.stateful[ids.intern("payments")] == index.stateful[ids.intern("payments")]
+    assert updated.anomalies["latency_ms"] is index.anomalies["latency_ms"]
+    assert ("latency_ms", ">") not in updated.thresholds
+    assert [rule.id for rule in updated.thresholds[("latency_ms", "<")].rules] == ["a"]
+
+
+def test_disabling_or_retyping_moves_a_rule():
+    ids = ServiceIds()
+    index = RuleIndex.build([make_rule("a", "checkout"), make_rule("b", "checkout")], 1, ids)
+    index = index.apply([make_rule("a", "checkout", kind="RATE")], [], 2, ids)
+    assert [rule.id for rule in index.stateful[ids.intern("checkout")]] == ["a"]
+    assert [rule.id for rule in index.thresholds[("latency_ms", ">")].rules] == ["b"]
+    index = index.apply([make_rule("b", "checkout", enabled=False)], ["a"], 3, ids)
+    assert shape(index) == shape(RuleIndex.build([], 3, ids))
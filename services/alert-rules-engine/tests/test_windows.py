@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.windows import RateWindow, run_lengths
+
+
+def add(window, seconds, sums):
+    return window.add(np.array(seconds), np.array(sums, dtype=np.float64), np.ones(len(seconds), dtype=np.int64))
+
+
+def test_run_lengths_continue_the_carried_run():
+    held = np.array([True, True, False, True, True])
+    assert run_lengths(held, carry=2).tolist() == [3, 4, 0, 1, 2]
+    assert run_lengths(np.array([False, True]), carry=5).tolist() == [0, 1]
+    assert run_lengths(np.ones(3, dtype=bool), carry=0).tolist() == [1, 2, 3]
+
+
+def test_rate_evaluated_once_the_window_is_warm():
+    window = RateWindow(3, 0, ("latency_ms", ">", 1.0))
+    # Seconds 10 and 11 close before a full window has been seen
+    assert add(window, [10, 11, 12, 13, 14], [3, 3, 3, 3, 6]) == [(12, 3.0), (13, 3.0)]
+    assert add(window, [15], [0]) == [(14, 4.0)]
+
+
+def test_stragglers_within_grace_and_closed_seconds():
+    window = RateWindow(3, 1, ("count", ">", 1.0))
+    assert add(window, [10, 11, 12, 13, 14, 15], [3] * 6) == [(12, 3.0), (13, 3.0)]
+    # Second 12 is closed: the event counts toward later windows only
+    assert add(window, [12], [30]) == []
+    assert add(window, [16], [0]) == [(14, 13.0)]
+    # Older than the ring: dropped
+    total = window.total
+    assert add(window, [11], [100]) == []
+    assert window.total == total
+
+
+def test_gap_longer_than_the_ring_evaluates_once():
+    window = RateWindow(3, 1, ("count", ">", 1.0))
+    add(window, [10, 11, 12, 13, 14, 15], [3] * 6)
+    assert add(window, [100], [1]) == [(98, 0.0)]
+    assert window.total == 0.0
+
+
+def test_rebind_keeps_sums_and_resets_the_run():
+    window = RateWindow(3, 0, ("latency_ms", ">", 1.0))
+    add(window, [10, 11, 12, 13], [3, 3, 3, 3])
+    window.run = 4
+    assert window.matches(3, 0, "latency_ms") and not window.matches(3, 0, "count")
+    window.rebind(("latency_ms", ">", 1.0))
+    assert window.run == 4
+    window.rebind(("latency_ms", "<", 1.0))
+    assert window.run == 0 and window.total == 9.0
@@ -0,0 +1,214 @@
+"""In-process response cache for hot gateway GET routes.
+
+Entries are keyed by route, caller identity and the full request URL, so one
+user never sees a response fetched with another user's credentials. Each
+entry carries invalidation tags; the gateway's mutating routes invalidate
+those tags after the upstream write succeeds. A fetch that started before
+an invalidation of one of its tags is served but not stored, so a slow
+read cannot put stale data back into the cache.
+
+The cache is per gateway replica: writes made through another replica only
+become visible here when the entry's TTL expires.
+"""
+from collections import OrderedDict
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import urlencode
+import hashlib
+import time
+
+from .config import settings
+from .singleflight import flight_key, singleflight
+
+CACHE_REQUESTS = Counter(
+    "api_gateway_cache_requests_total",
+    "Cacheable requests by route and outcome",
+    ["route", "result"]
+)
+
+CACHE_NOT_MODIFIED = Counter(
+    "api_gateway_cache_not_modified_total",
+    "Requests answered with 304 Not Modified",
+    ["route"]
+)
+
+CACHE_EVICTIONS = Counter(
+    "api_gateway_cache_evictions_total",
+    "Cache entries removed by reason",
+    ["reason"]
+)
+
+CACHE_ENTRIES = Gauge(
+    "api_gateway_cache_entries",
+    "Entries currently held in the response cache"
+)
+
+CACHE_BYTES = Gauge(
+    "api_gateway_cache_bytes",
+    "Response body bytes currently held in the response cache"
+)
+
+# Loads (body, media type) from the upstream on a miss
+Loader = Callable[[], Awaitable[Tuple[bytes, str]]]
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "etag", "expires", "tags")
+
+    def __init__(self, body: bytes, media_type: str, expires: float, tags: Tuple[str, ...]):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.expires = expires
+        self.tags = tags
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        enabled: bool,
+        max_entries: int,
+        max_bytes: int,
+        max_entry_bytes: int,
+        ttls: Dict[str, float]
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttls = ttls
+        self.bytes = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tag_keys: Dict[str, Set[str]] = {}
+        # Invalidation counter, and the counter value at each tag's last invalidation
+        self._version = 0
+        self._tag_versions: Dict[str, int] = {}
+
+    def cacheable(self, route: str) -> bool:
+        return self.enabled and self.ttls.get(route, 0) > 0
+
+    async def respond(
+        self,
+        request: Request,
+        route: str,
+        identity: str,
+        tags: Tuple[str, ...],
+        load: Loader
+    ) -> Response:
+        """Serve a GET from cache, or load, store and serve it.
+        
+        Concurrent misses for the same key share one load. The flight key
+        includes the invalidation counter so a miss after a write never
+        joins a load that started before it.
+        """
+        flight = flight_key(request, identity)
+        if not self.cacheable(route):
+            body, media_type = await singleflight.do(route, flight, load)
+            return Response(body, media_type=media_type)
+
+        key = self._key(route, identity, request)
+        entry = self._get(key)
+        if entry is not None:
+            CACHE_REQUESTS.labels(route=route, result="hit").inc()
+            cache_status = "HIT"
+        else:
+            CACHE_REQUESTS.labels(route=route, result="miss").inc()
+            cache_status = "MISS"
+            since = self._version
+            body, media_type = await singleflight.do(route, f"{flight}#{since}", load)
+            entry = CachedResponse(body, media_type, time.monotonic() + self.ttls[route], tags)
+            self._put(key, entry, since)
+
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"private, max-age={max(0, int(entry.expires - time.monotonic()))}",
+            "X-Cache": cache_status,
+        }
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            CACHE_NOT_MODIFIED.labels(route=route).inc()
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying any of tags"""
+        self._version += 1
+        for tag in tags:
+            self._tag_versions[tag] = self._version
+            for key in self._tag_keys.pop(tag, ()):
+                if key in self._entries:
+                    self._remove(key, "invalidated")
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key, "invalidated")
+
+    def _key(self, route: str, identity: str, request: Request) -> str:
+        # Fixed-size keys whatever the identity looks like
+        principal = hashlib.blake2b(identity.encode("utf-8"), digest_size=16).hexdigest()
+        # Escaped, so "a=1&b=2" and a single a="1&b=2" get different keys
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{route}|{principal}|{request.url.path}?{query}"
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(key, "expired")
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, entry: CachedResponse, since: int):
+        if len(entry.body) > self.max_entry_bytes:
+            return
+        if any(self._tag_versions.get(tag, 0) > since for tag in entry.tags):
+            # Invalidated while we were loading; the body may predate the write
+            return
+        if key in self._entries:
+            self._remove(key, "replaced")
+        self._entries[key] = entry
+        self.bytes += len(entry.body)
+        for tag in entry.tags:
+            self._tag_keys.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)), "size")
+        CACHE_ENTRIES.set(len(self._entries))
+        CACHE_BYTES.set(self.bytes)
+
+    def _remove(self, key: str, reason: str):
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+        CACHE_EVICTIONS.labels(reason=reason).inc()
+        CACHE_ENTRIES.set(len(self._entries))
+        CACHE_BYTES.set(self.bytes)
+
+
+response_cache = ResponseCache(
+    enabled=settings.cache_enabled,
+    max_entries=settings.cache_max_entries,
+    max_bytes=settings.cache_max_bytes,
+    max_entry_bytes=settings.cache_max_entry_bytes,
+    ttls={
+        "rules": settings.cache_ttl_rules_seconds,
+        "rule": settings.cache_ttl_rule_seconds,
+        "alerts": settings.cache_ttl_alerts_seconds,
+    }
+)
@@ -18,6 +18,20 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     jwt_expiration_minutes: int = 60
     jwt_refresh_expiration_days: int = 7
+    # Rotation: secrets still accepted for tokens signed before a key change
+    jwt_previous_secret_keys: str = ""
+    # Optional JWKS (path on user_management_url) for asymmetric algorithms
+    jwt_jwks_path: str = ""
+    jwt_jwks_refresh_seconds: float = 300.0
+    jwt_issuer: str = ""
+    jwt_audience: str = ""
+    jwt_leeway_seconds: int = 30
+    # Verified tokens are remembered until expiry, at most this long
+    jwt_verified_cache_size: int = 10000
+    jwt_verified_cache_ttl_seconds: float = 300.0
+    # Resolve non-JWT tokens through user-management /auth/me on every request.
+    # Only for a user-management that really validates them; never cached.
+    auth_allow_opaque_tokens: bool = False
     
     # CORS
     cors_origins: str = "http://localhost:3000,https://smart-retail-frontend.onrender.com"
@@ -28,6 +42,54 @@ class Settings(BaseSettings):
     query_analytics_url: str = "http://localhost:8003"
     user_management_url: str = "http://localhost:8004"
     
+    # Upstream HTTP clients (one pooled client per service URL above)
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry_seconds: float = 30.0
+    upstream_http2: bool = False
+    upstream_connect_timeout_seconds: float = 2.0
+    upstream_pool_timeout_seconds: float = 5.0
+    upstream_retries: int = 0  # Connection attempts retried, not requests
+    # Read/write timeout per upstream
+    event_ingestion_timeout_seconds: float = 10.0
+    alert_rules_engine_timeout_seconds: float = 10.0
+    query_analytics_timeout_seconds: float = 30.0
+    user_management_timeout_seconds: float = 10.0
+    # Read timeouts follow observed latency: p99 x multiplier, at least the
+    # minimum and at most the per-upstream timeout above
+    upstream_adaptive_timeouts: bool = True
+    upstream_timeout_p99_multiplier: float = 3.0
+    upstream_min_timeout_seconds: float = 1.0
+    # Circuit breakers over a rolling window of calls per upstream
+    breaker_enabled: bool = True
+    breaker_window_seconds: float = 30.0
+    breaker_min_requests: int = 20
+    breaker_failure_ratio: float = 0.5  # Of failed (error/5xx) or of slow calls
+    breaker_slow_call_seconds: float = 5.0
+    breaker_open_seconds: float = 10.0
+    breaker_half_open_probes: int = 3
+    # Upstreams whose GETs are re-sent once they exceed the observed p95
+    hedge_upstreams: str = ""
+    hedge_max_ratio: float = 0.05  # Hedges per call, at most
+    hedge_min_delay_seconds: float = 0.01
+    # Trusted upstreams whose list pages are streamed through unvalidated
+    passthrough_upstreams: str = "query_analytics"
+    
+    # Response cache (per replica) for hot GET routes; a TTL of 0 disables a route
+    cache_enabled: bool = True
+    cache_max_entries: int = 10000
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_max_entry_bytes: int = 1024 * 1024
+    cache_ttl_rules_seconds: float = 30.0
+    cache_ttl_rule_seconds: float = 30.0
+    cache_ttl_alerts_seconds: float = 5.0
+    
+    # Coalesce identical concurrent upstream GETs into one call
+    singleflight_enabled: bool = True
+    
+    # Per-phase request timings in a Server-Timing response header
+    server_timing_enabled: bool = True
+    
     # OpenTelemetry
     jaeger_agent_host: str = "localhost"
     jaeger_agent_port: int = 6831
@@ -35,6 +97,22 @@ class Settings(BaseSettings):
     
     # Rate Limiting
     rate_limit_per_minute: int = 100
+    rate_limit_enabled: bool = True
+    # Route groups as "path-prefix=key:per-minute", longest prefix wins.
+    # key is user, api_key or ip; per-minute "default" means rate_limit_per_minute.
+    # Paths outside every group (health, metrics) are not limited.
+    rate_limit_groups: str = "/api/v1/auth=ip:30,/api/v1/events=user:600,/api/v1=user:default"
+    rate_limit_api_key_header: str = "x-api-key"
+    # Client IP from X-Forwarded-For, only behind proxies that append to it:
+    # the entry added by the outermost of trusted_proxy_hops trusted proxies
+    rate_limit_trust_forwarded_for: bool = False
+    rate_limit_trusted_proxy_hops: int = 1
+    rate_limit_shards: int = 16
+    rate_limit_max_keys: int = 100000
+    # Shared backend so limits hold across replicas: local (none), memory or redis
+    rate_limit_backend: str = "local"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_sync_interval_seconds: float = 0.5
     
     class Config:
         env_file = ".env"
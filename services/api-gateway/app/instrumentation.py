@@ -0,0 +1,184 @@
+"""Per-request latency instrumentation as pure ASGI middleware.
+
+Requests are counted and timed by route template (``/api/v1/rules/{rule_id}``)
+rather than raw path, so label cardinality is bounded by the route table;
+paths no route matched share the ``unmatched`` label. Each request is also
+broken down into phases, accumulated in a context-local RequestTimings by
+the code doing the work:
+
+- ``auth``: bearer token verification, including any introspection call
+- ``upstream_connect``: waiting for a pooled connection plus TCP/TLS setup
+- ``upstream_wait``: from sending upstream request headers to the response headers
+- ``serialize``: from the last upstream body being read to the gateway's
+  response starting (decoding, validation and re-encoding)
+
+Phases are exported as ``api_gateway_request_phase_seconds`` and, when
+``server_timing_enabled``, in a ``Server-Timing`` response header.
+"""
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram
+from typing import Dict, Optional, Tuple
+import time
+
+import httpx
+
+from .config import settings
+
+PHASES = ("auth", "upstream_connect", "upstream_wait", "serialize")
+
+# Anything else a client sends is folded into one label value
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+REQUEST_COUNT = Counter(
+    "api_gateway_requests_total",
+    "Total requests",
+    ["method", "endpoint", "status"]
+)
+
+REQUEST_DURATION = Histogram(
+    "api_gateway_request_duration_seconds",
+    "Request duration",
+    ["method", "endpoint"]
+)
+
+REQUEST_PHASE_DURATION = Histogram(
+    "api_gateway_request_phase_seconds",
+    "Time spent per request phase",
+    ["endpoint", "phase"]
+)
+
+
+class RequestTimings:
+    __slots__ = ("auth", "upstream_connect", "upstream_wait", "serialize", "upstream_done")
+
+    def __init__(self):
+        self.auth = 0.0
+        self.upstream_connect = 0.0
+        self.upstream_wait = 0.0
+        self.serialize = 0.0
+        # perf_counter() when the last upstream response body was fully read
+        self.upstream_done: Optional[float] = None
+
+    def server_timing(self, total: float) -> bytes:
+        metrics = [
+            b"%s;dur=%.3f" % (phase.encode(), getattr(self, phase) * 1000)
+            for phase in PHASES
+            if getattr(self, phase)
+        ]
+        metrics.append(b"total;dur=%.3f" % (total * 1000))
+        return b", ".join(metrics)
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being served, or None outside one"""
+    return _timings.get()
+
+
+class UpstreamTrace:
+    """httpcore trace callback splitting an upstream call into connect and wait"""
+    __slots__ = ("timings", "started", "sent")
+
+    def __init__(self, timings: RequestTimings, started: float):
+        self.timings = timings
+        self.started = started
+        self.sent = started
+
+    async def __call__(self, event: str, info: dict):
+        # Events are prefixed by protocol (http11./http2.); pool waits and
+        # connection setup all happen before the request headers go out
+        if event.endswith(".send_request_headers.started"):
+            self.sent = time.perf_counter()
+            self.timings.upstream_connect += self.sent - self.started
+        elif event.endswith(".receive_response_headers.complete"):
+            self.timings.upstream_wait += time.perf_counter() - self.sent
+
+
+class TimedResponseStream(httpx.AsyncByteStream):
+    """Marks when an upstream response body has been read to the end"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, timings: RequestTimings):
+        self.stream = stream
+        self.timings = timings
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+        self.timings.upstream_done = time.perf_counter()
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        # Mounted sub-application such as /metrics; label it by mount point
+        return scope.get("root_path") or "unmatched"
+    return "unmatched"
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app, server_timing: bool = None):
+        self.app = app
+        self.server_timing = (
+            settings.server_timing_enabled if server_timing is None else server_timing
+        )
+        # Label children per (method, endpoint, status); bounded by the route table
+        self._children: Dict[Tuple[str, str, int], tuple] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                if timings.upstream_done is not None and now > timings.upstream_done:
+                    timings.serialize = now - timings.upstream_done
+                if self.server_timing:
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (b"server-timing", timings.server_timing(now - started)),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            self._record(scope, status, timings, time.perf_counter() - started)
+
+    def _record(self, scope, status: int, timings: RequestTimings, duration: float):
+        method = scope["method"] if scope["method"] in METHODS else "OTHER"
+        endpoint = route_template(scope)
+        key = (method, endpoint, status)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (
+                REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=str(status)),
+                REQUEST_DURATION.labels(method=method, endpoint=endpoint),
+                tuple(
+                    (phase, REQUEST_PHASE_DURATION.labels(endpoint=endpoint, phase=phase))
+                    for phase in PHASES
+                ),
+            )
+        count, duration_histogram, phases = children
+        count.inc()
+        duration_histogram.observe(duration)
+        for phase, histogram in phases:
+            value = getattr(timings, phase)
+            if value:
+                histogram.observe(value)
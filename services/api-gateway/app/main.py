@@ -1,10 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from prometheus_client import make_asgi_app, Counter, Histogram
+from prometheus_client import make_asgi_app
 import logging
 from pythonjsonlogger import jsonlogger
 
 from .config import settings
+from .instrumentation import InstrumentationMiddleware
+from .ratelimit import RateLimitMiddleware, rate_limiter
+from .upstreams import upstreams
 from .routers import auth, events, alerts, rules, health
 
 # Configure structured logging
@@ -24,6 +27,10 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Rate limiting; added before CORS so CORS stays outermost, answering
+# preflights without spending tokens and decorating 429s for browsers
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,20 +38,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "RateLimit-Limit",
+        "RateLimit-Remaining",
+        "RateLimit-Reset",
+        "Retry-After",
+        "Server-Timing",
+    ],
 )
 
-# Prometheus metrics
-REQUEST_COUNT = Counter(
-    "api_gateway_requests_total",
-    "Total requests",
-    ["method", "endpoint", "status"]
-)
-
-REQUEST_DURATION = Histogram(
-    "api_gateway_request_duration_seconds",
-    "Request duration",
-    ["method", "endpoint"]
-)
+# Request metrics and Server-Timing; outermost, so rejected and preflight
+# requests are measured too
+app.add_middleware(InstrumentationMiddleware)
 
 # Include routers
 app.include_router(health.router, tags=["Health"])
@@ -83,11 +88,15 @@ async def startup_event():
             "service": settings.otel_service_name
         }
     )
+    await upstreams.start()
+    await rate_limiter.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down API Gateway")
+    await rate_limiter.stop()
+    await upstreams.stop()
 
 
 @app.get("/")
@@ -13,6 +13,31 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
 
 
+class Principal(BaseModel):
+    """Authenticated caller, resolved from a bearer token"""
+    user_id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    expires_at: Optional[int] = None
+    token: str  # Forwarded to upstream services as-is
+    verified: bool = True  # False when user-management resolved an opaque token
+    
+    @property
+    def cache_identity(self) -> str:
+        # Only identities the gateway checked itself may share cached responses
+        if not self.verified:
+            return f"token:{self.token}"
+        return f"{self.user_id}:{self.role}"
+
+
+class CurrentUser(BaseModel):
+    """The caller as the gateway resolved it"""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    expires_at: Optional[int] = None
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -0,0 +1,92 @@
+"""Pass-through proxying of upstream responses.
+
+For trusted internal upstreams (``passthrough_upstreams``) list endpoints
+stream the upstream body to the client as raw bytes, still compressed if
+the upstream compressed it, instead of decoding the JSON, validating it
+against the response model and encoding it again. Memory per request stays
+at one chunk rather than the whole page.
+"""
+from fastapi.responses import StreamingResponse
+from functools import lru_cache
+from pydantic import TypeAdapter
+from starlette.background import BackgroundTask
+from typing import Dict, FrozenSet, Tuple
+
+import httpx
+
+from .config import settings
+
+# Connection-specific headers that must not be forwarded (RFC 9110 7.6.1),
+# plus headers the gateway's own server sets
+EXCLUDED_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+    "date",
+    "server",
+})
+
+
+@lru_cache(maxsize=4)
+def _trusted_upstreams(configured: str) -> FrozenSet[str]:
+    return frozenset(name.strip() for name in configured.split(",") if name.strip())
+
+
+def passthrough_enabled(upstream: str) -> bool:
+    return upstream in _trusted_upstreams(settings.passthrough_upstreams)
+
+
+def forwarded_headers(response: httpx.Response) -> Dict[str, str]:
+    return {
+        name: value
+        for name, value in response.headers.items()
+        if name.lower() not in EXCLUDED_HEADERS
+    }
+
+
+async def stream_get(
+    client: httpx.AsyncClient,
+    path: str,
+    params: dict = None,
+    headers: dict = None
+) -> StreamingResponse:
+    """Proxy a GET without decoding the body.
+
+    Error statuses raise httpx.HTTPStatusError before anything is sent, so
+    routers map them exactly as they do for buffered responses.
+    """
+    request = client.build_request("GET", path, params=params, headers=headers)
+    response = await client.send(request, stream=True)
+    if response.is_error:
+        await response.aclose()
+        response.raise_for_status()
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=forwarded_headers(response),
+        background=BackgroundTask(response.aclose)
+    )
+
+
+async def fetch_body(
+    client: httpx.AsyncClient,
+    path: str,
+    params: dict = None,
+    headers: dict = None,
+    adapter: TypeAdapter = None
+) -> Tuple[bytes, str]:
+    """GET an upstream body for caching, as (body, media type).
+
+    With an adapter the body is validated and re-encoded, as FastAPI would
+    for a response_model; without one the upstream bytes are kept as is.
+    """
+    response = await client.get(path, params=params, headers=headers)
+    response.raise_for_status()
+    if adapter is None:
+        return response.content, response.headers.get("content-type", "application/json")
+    return adapter.dump_json(adapter.validate_json(response.content)), "application/json"
@@ -0,0 +1,352 @@
+"""Token-bucket rate limiting as pure ASGI middleware.
+
+Each route group (longest matching path prefix from ``rate_limit_groups``)
+has its own per-minute limit and client key: the authenticated user, an
+API key, or the client IP. A bearer token only earns a per-user bucket once
+it has been verified; until then its requests count against the client IP,
+so a stream of made-up tokens cannot mint fresh buckets. Behind trusted
+proxies the IP is read from X-Forwarded-For, counting entries from the
+right: the left end is whatever the client chose to send.
+
+Buckets live in sharded dicts and are updated without locks: the
+check-and-take runs without awaiting, so it is atomic on the event loop. A
+bucket that has been idle long enough to refill completely carries no
+state, so the background sweep drops it for free.
+
+With a shared backend (``rate_limit_backend`` memory or redis) each replica
+periodically adds its own consumption per key to a shared counter and
+debits its local buckets by what the other replicas consumed in the same
+interval. Limits therefore hold across replicas to within one sync
+interval, without a network round trip per request.
+"""
+from prometheus_client import Counter, Gauge
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+from .config import settings
+from .security import authenticator
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - optional shared backend
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_TYPES = ("user", "api_key", "ip")
+
+RATE_LIMITED_REQUESTS = Counter(
+    "api_gateway_rate_limited_requests_total",
+    "Requests rejected with 429 by route group",
+    ["group"]
+)
+
+RATE_LIMIT_KEYS = Gauge(
+    "api_gateway_rate_limit_keys",
+    "Client keys currently tracked by the rate limiter"
+)
+
+RATE_LIMIT_SYNC_FAILURES = Counter(
+    "api_gateway_rate_limit_sync_failures_total",
+    "Failed exchanges with the shared rate limit backend"
+)
+
+
+class RouteGroup:
+    __slots__ = ("prefix", "key_type", "per_minute", "capacity", "rate", "limit", "policy")
+
+    def __init__(self, prefix: str, key_type: str, per_minute: int):
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"Unknown rate limit key type: {key_type}")
+        self.prefix = prefix
+        self.key_type = key_type
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.limit = b"%d" % per_minute
+        self.policy = b"%d;w=60" % per_minute
+
+
+def parse_groups(spec: str, default_per_minute: int) -> List[RouteGroup]:
+    """Parse "prefix=key:per-minute,..." into groups, longest prefix first"""
+    groups = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        prefix, _, rule = item.strip().partition("=")
+        key_type, _, per_minute = rule.partition(":")
+        limit = default_per_minute if per_minute == "default" else int(per_minute)
+        groups.append(RouteGroup(prefix, key_type, limit))
+    return sorted(groups, key=lambda group: len(group.prefix), reverse=True)
+
+
+class TokenBuckets:
+    """Sharded table of key -> [tokens, updated_at, capacity, rate]"""
+
+    def __init__(self, shards: int, max_keys: int):
+        count = 1
+        while count < shards:
+            count *= 2
+        self.mask = count - 1
+        self.shards: List[Dict[str, list]] = [{} for _ in range(count)]
+        self.max_keys_per_shard = max(1, max_keys // count)
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, tokens left)"""
+        shard = self.shards[hash(key) & self.mask]
+        bucket = shard.get(key)
+        if bucket is None:
+            if len(shard) >= self.max_keys_per_shard:
+                # Oldest-inserted key goes first; it is the likeliest to be idle
+                del shard[next(iter(shard))]
+            bucket = shard[key] = [capacity, now, capacity, rate]
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True, tokens - 1.0
+        bucket[0] = tokens
+        return False, tokens
+
+    def debit(self, key: str, amount: float):
+        """Remove tokens consumed elsewhere, down to one bucket of debt"""
+        bucket = self.shards[hash(key) & self.mask].get(key)
+        if bucket is not None:
+            bucket[0] = max(-bucket[2], bucket[0] - amount)
+
+    def sweep(self, index: int, now: float) -> int:
+        """Drop buckets of one shard that have refilled completely"""
+        shard = self.shards[index & self.mask]
+        idle = [
+            key for key, (tokens, updated, capacity, rate) in shard.items()
+            if tokens + (now - updated) * rate >= capacity
+        ]
+        for key in idle:
+            del shard[key]
+        return len(idle)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+
+class InMemoryBackend:
+    """Process-wide shared counters; stands in for redis in tests and benchmarks"""
+    counters: Dict[str, int] = {}
+
+    async def add(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        counters = InMemoryBackend.counters
+        for key, delta in deltas.items():
+            counters[key] = counters.get(key, 0) + delta
+        return {key: counters[key] for key in deltas}
+
+    async def close(self):
+        pass
+
+
+class RedisBackend:
+    # Counters outlive any sync gap but do not accumulate forever
+    KEY_TTL_SECONDS = 120
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("The 'redis' rate limit backend requires the redis package")
+        self.client = aioredis.from_url(url)
+
+    async def add(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        keys = list(deltas)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incrby(f"ratelimit:{key}", deltas[key])
+                pipe.expire(f"ratelimit:{key}", self.KEY_TTL_SECONDS)
+            results = await pipe.execute()
+        return {key: int(results[2 * i]) for i, key in enumerate(keys)}
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_backend(name: str):
+    if name == "local":
+        return None
+    if name == "memory":
+        return InMemoryBackend()
+    if name == "redis":
+        return RedisBackend(settings.rate_limit_redis_url)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = settings.rate_limit_enabled
+        self.groups = parse_groups(settings.rate_limit_groups, settings.rate_limit_per_minute)
+        self.buckets = TokenBuckets(settings.rate_limit_shards, settings.rate_limit_max_keys)
+        self.api_key_header = settings.rate_limit_api_key_header.lower().encode()
+        self.trust_forwarded = settings.rate_limit_trust_forwarded_for
+        self.proxy_hops = max(1, settings.rate_limit_trusted_proxy_hops)
+        # Authorization header -> client key, for tokens already verified
+        self._user_keys: Dict[bytes, str] = {}
+        self.backend = None
+        # Local consumption since the last sync, and shared totals seen then
+        self._deltas: Dict[str, int] = {}
+        self._totals: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.backend = create_backend(settings.rate_limit_backend)
+        self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    def check(self, scope) -> Optional[Tuple[bool, list]]:
+        """Take a token for the request; None when the path is not limited.
+
+        Returns (allowed, response headers to add).
+        """
+        path = scope["path"]
+        for group in self.groups:
+            if path.startswith(group.prefix):
+                break
+        else:
+            return None
+
+        key = f"{group.prefix}|{self._client_key(scope, group.key_type)}"
+        allowed, tokens = self.buckets.take(key, group.capacity, group.rate, time.monotonic())
+        if allowed and self.backend is not None:
+            self._deltas[key] = self._deltas.get(key, 0) + 1
+
+        headers = [
+            (b"ratelimit-limit", group.limit),
+            (b"ratelimit-remaining", b"%d" % max(0, int(tokens))),
+            (b"ratelimit-reset", b"%d" % math.ceil((group.capacity - tokens) / group.rate)),
+            (b"ratelimit-policy", group.policy),
+        ]
+        if not allowed:
+            RATE_LIMITED_REQUESTS.labels(group=group.prefix).inc()
+            headers.append((b"retry-after", b"%d" % math.ceil((1.0 - tokens) / group.rate)))
+        return allowed, headers
+
+    def _client_key(self, scope, key_type: str) -> str:
+        authorization = api_key = forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value
+            elif name == self.api_key_header:
+                api_key = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+
+        if key_type == "user" and authorization:
+            client_key = self._user_keys.get(authorization)
+            if client_key is not None:
+                return client_key
+            token = authorization[7:] if authorization[:7].lower() == b"bearer " else authorization
+            digest = hashlib.sha256(token).digest()
+            # Key by user once the token has been verified, so all of a user's
+            # tokens share one bucket; never trust unverified claims here
+            principal = authenticator.verified.get(digest)
+            if principal is not None:
+                if len(self._user_keys) >= settings.rate_limit_max_keys:
+                    self._user_keys.clear()
+                client_key = self._user_keys[authorization] = f"user:{principal.user_id}"
+                return client_key
+            # Unverified: the token is the caller's to vary, the address is not
+            return self._client_ip(scope, forwarded)
+        if key_type != "ip" and api_key:
+            return f"key:{hashlib.blake2b(api_key, digest_size=16).hexdigest()}"
+        return self._client_ip(scope, forwarded)
+
+    def _client_ip(self, scope, forwarded: Optional[bytes]) -> str:
+        if forwarded and self.trust_forwarded:
+            # Each proxy appends the address it received from; the entry
+            # added by the outermost trusted one is the first we can trust
+            hops = forwarded.split(b",")
+            if len(hops) >= self.proxy_hops:
+                return f"ip:{hops[-self.proxy_hops].strip().decode('latin-1')}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def _maintenance_loop(self):
+        interval = settings.rate_limit_sync_interval_seconds
+        shard = 0
+        while True:
+            await asyncio.sleep(interval)
+            self.buckets.sweep(shard, time.monotonic())
+            shard += 1
+            RATE_LIMIT_KEYS.set(len(self.buckets))
+            if self.backend is not None:
+                await self._sync()
+
+    async def _sync(self):
+        deltas, self._deltas = self._deltas, {}
+        if not deltas:
+            self._totals = {}
+            return
+        try:
+            totals = await self.backend.add(deltas)
+        except Exception as e:
+            RATE_LIMIT_SYNC_FAILURES.inc()
+            logger.error(f"Rate limit sync failed: {e}")
+            return
+        previous, self._totals = self._totals, totals
+        for key, total in totals.items():
+            # Only keys also active in the previous interval have a baseline
+            if key in previous:
+                remote = total - previous[key] - deltas[key]
+                if remote > 0:
+                    self.buckets.debit(key, remote)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        decision = self.limiter.check(scope)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, headers = decision
+        if not allowed:
+            body = b'{"detail":"Rate limit exceeded"}'
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,307 @@
+"""Per-upstream circuit breaking, adaptive timeouts and hedged reads.
+
+Every upstream call's outcome and time to response headers go into a
+rolling window per upstream (``breaker_window_seconds``). From that window:
+
+- The circuit breaker opens once at least ``breaker_min_requests`` calls
+  are in the window and the share of failures (transport errors and 5xx)
+  or of calls slower than ``breaker_slow_call_seconds`` reaches
+  ``breaker_failure_ratio``. While open, calls fail fast with a 503 instead
+  of holding a worker for the full timeout. After ``breaker_open_seconds``
+  up to ``breaker_half_open_probes`` calls are let through; if all succeed
+  the breaker closes, and any failure opens it again. ``breaker_enabled``
+  turns this part off; windows, timeouts and hedging stay on.
+- The read timeout is the observed p99 times ``upstream_timeout_p99_multiplier``,
+  kept between ``upstream_min_timeout_seconds`` and the upstream's
+  configured timeout, which still applies until the window has enough calls.
+- For upstreams listed in ``hedge_upstreams``, a GET still waiting for
+  headers after the observed p95 is sent again and the first response wins.
+  Hedges are capped at ``hedge_max_ratio`` of calls, so a degraded upstream
+  never sees its load doubled.
+"""
+from collections import deque
+from prometheus_client import Counter, Gauge
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+import asyncio
+import logging
+import math
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Calls needed in the window before its quantiles are trusted
+MIN_QUANTILE_SAMPLES = 20
+QUANTILE_REFRESH_SECONDS = 1.0
+WINDOW_MAX_SAMPLES = 2048
+# Unused hedge allowance carried over, in hedges
+HEDGE_BURST = 10.0
+
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "api_gateway_upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"]
+)
+
+UPSTREAM_CIRCUIT_TRANSITIONS = Counter(
+    "api_gateway_upstream_circuit_transitions_total",
+    "Circuit breaker state changes per upstream",
+    ["upstream", "state"]
+)
+
+UPSTREAM_FAST_FAILURES = Counter(
+    "api_gateway_upstream_fast_failures_total",
+    "Upstream calls rejected without being sent because the breaker was open",
+    ["upstream"]
+)
+
+UPSTREAM_TIMEOUT = Gauge(
+    "api_gateway_upstream_read_timeout_seconds",
+    "Read timeout currently applied to upstream calls",
+    ["upstream"]
+)
+
+UPSTREAM_HEDGED_REQUESTS = Counter(
+    "api_gateway_upstream_hedged_requests_total",
+    "Second requests sent because the first exceeded the upstream p95",
+    ["upstream"]
+)
+
+UPSTREAM_HEDGE_WINS = Counter(
+    "api_gateway_upstream_hedge_wins_total",
+    "Hedged calls answered by the second request",
+    ["upstream"]
+)
+
+
+class RollingWindow:
+    """Recent calls as (finished at, seconds, failed, slow), bounded by age and count"""
+
+    def __init__(self, seconds: float, slow_call_seconds: float):
+        self.seconds = seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.samples: Deque[Tuple[float, float, bool, bool]] = deque()
+        self.failures = 0
+        self.slow = 0
+        self._quantiles: Optional[Tuple[float, float]] = None
+        self._quantiles_at = 0.0
+
+    def add(self, now: float, seconds: float, failed: bool):
+        slow = seconds >= self.slow_call_seconds
+        self.samples.append((now, seconds, failed, slow))
+        self.failures += failed
+        self.slow += slow
+        if len(self.samples) > WINDOW_MAX_SAMPLES:
+            self._drop()
+        self.trim(now)
+
+    def trim(self, now: float):
+        horizon = now - self.seconds
+        while self.samples and self.samples[0][0] < horizon:
+            self._drop()
+
+    def _drop(self):
+        _, _, failed, slow = self.samples.popleft()
+        self.failures -= failed
+        self.slow -= slow
+
+    def clear(self):
+        self.samples.clear()
+        self.failures = self.slow = 0
+        self._quantiles = None
+
+    def quantiles(self, now: float) -> Optional[Tuple[float, float]]:
+        """(p95, p99) of call latency, recomputed at most once a second"""
+        if now - self._quantiles_at >= QUANTILE_REFRESH_SECONDS:
+            self._quantiles_at = now
+            self.trim(now)
+            if len(self.samples) < MIN_QUANTILE_SAMPLES:
+                self._quantiles = None
+            else:
+                latencies = sorted(sample[1] for sample in self.samples)
+                last = len(latencies) - 1
+                self._quantiles = (
+                    latencies[min(last, int(len(latencies) * 0.95))],
+                    latencies[min(last, int(len(latencies) * 0.99))],
+                )
+        return self._quantiles
+
+
+class CircuitBreaker:
+    def __init__(self, upstream: str, window: RollingWindow):
+        self.upstream = upstream
+        self.window = window
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        self.state_gauge = UPSTREAM_CIRCUIT_STATE.labels(upstream=upstream)
+        self.state_gauge.set(STATE_VALUES[CLOSED])
+
+    def admit(self, now: float) -> Optional[bool]:
+        """None if the call must fail fast, else whether it is a half-open probe"""
+        if self.state == CLOSED or not settings.breaker_enabled:
+            return False
+        if self.state == OPEN:
+            if now - self.opened_at < settings.breaker_open_seconds:
+                return None
+            self._transition(HALF_OPEN)
+            self.probes = self.probe_successes = 0
+        if self.probes >= settings.breaker_half_open_probes:
+            return None
+        self.probes += 1
+        return True
+
+    def record(self, now: float, seconds: float, failed: Optional[bool], probe: bool):
+        """Account a finished call; failed is None for calls abandoned by the caller"""
+        if probe:
+            self.probes -= 1
+            if self.state != HALF_OPEN or failed is None:
+                return
+            if failed or seconds >= self.window.slow_call_seconds:
+                self._open(now)
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= settings.breaker_half_open_probes:
+                # Start over, so failures from before the outage don't re-open it
+                self.window.clear()
+                self._transition(CLOSED)
+            return
+
+        if failed is None:
+            return
+        self.window.add(now, seconds, failed)
+        if self.state != CLOSED or not settings.breaker_enabled:
+            return
+        calls = len(self.window.samples)
+        if calls >= settings.breaker_min_requests and (
+            self.window.failures >= calls * settings.breaker_failure_ratio
+            or self.window.slow >= calls * settings.breaker_failure_ratio
+        ):
+            self._open(now)
+
+    def retry_after(self, now: float) -> float:
+        return max(0.0, settings.breaker_open_seconds - (now - self.opened_at))
+
+    def _open(self, now: float):
+        self.opened_at = now
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        logger.warning(f"Circuit breaker for {self.upstream}: {self.state} -> {state}")
+        self.state = state
+        self.state_gauge.set(STATE_VALUES[state])
+        UPSTREAM_CIRCUIT_TRANSITIONS.labels(upstream=self.upstream, state=state).inc()
+
+
+async def _discard(tasks: List[asyncio.Task]):
+    """Cancel unused attempts and give back the connection of any that got a response"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is None:
+            await task.result().aclose()
+
+
+class UpstreamResilience:
+    """Breaker, timeout and hedging policy for one upstream"""
+
+    def __init__(self, upstream: str, timeout_seconds: float, hedge: bool):
+        self.upstream = upstream
+        self.timeout_seconds = timeout_seconds
+        self.hedge = hedge
+        self.window = RollingWindow(settings.breaker_window_seconds, settings.breaker_slow_call_seconds)
+        self.breaker = CircuitBreaker(upstream, self.window)
+        self.hedge_allowance = HEDGE_BURST
+        self.fast_failures = UPSTREAM_FAST_FAILURES.labels(upstream=upstream)
+        self.hedges = UPSTREAM_HEDGED_REQUESTS.labels(upstream=upstream)
+        self.hedge_wins = UPSTREAM_HEDGE_WINS.labels(upstream=upstream)
+        self.timeout_gauge = UPSTREAM_TIMEOUT.labels(upstream=upstream)
+        self.timeout_gauge.set(timeout_seconds)
+
+    def fast_fail(self, request: httpx.Request, now: float) -> httpx.Response:
+        """503 answered on the upstream's behalf while its breaker is open"""
+        self.fast_failures.inc()
+        return httpx.Response(
+            503,
+            headers={
+                "retry-after": "%d" % math.ceil(self.breaker.retry_after(now)),
+                "x-circuit-breaker": "open",
+            },
+            json={"detail": f"{self.upstream} is unavailable (circuit breaker open)"},
+            request=request
+        )
+
+    def read_timeout(self, now: float) -> float:
+        if not settings.upstream_adaptive_timeouts:
+            return self.timeout_seconds
+        quantiles = self.window.quantiles(now)
+        if quantiles is None:
+            timeout = self.timeout_seconds
+        else:
+            timeout = min(
+                self.timeout_seconds,
+                max(
+                    settings.upstream_min_timeout_seconds,
+                    quantiles[1] * settings.upstream_timeout_p99_multiplier
+                )
+            )
+        self.timeout_gauge.set(timeout)
+        return timeout
+
+    def hedge_delay(self, request: httpx.Request, now: float) -> Optional[float]:
+        """Seconds to wait before hedging request, or None to never hedge it"""
+        if not self.hedge or request.method not in ("GET", "HEAD"):
+            return None
+        self.hedge_allowance = min(HEDGE_BURST, self.hedge_allowance + settings.hedge_max_ratio)
+        quantiles = self.window.quantiles(now)
+        if quantiles is None:
+            return None
+        return max(settings.hedge_min_delay_seconds, quantiles[0])
+
+    async def hedged(
+        self,
+        send: Callable[[httpx.Request], Awaitable[httpx.Response]],
+        request: httpx.Request,
+        delay: float
+    ) -> httpx.Response:
+        """Send request, and a copy of it if no headers arrive within delay"""
+        primary = asyncio.ensure_future(send(request))
+        tasks = [primary]
+        winner = None
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.hedge_allowance >= 1.0:
+                self.hedge_allowance -= 1.0
+                self.hedges.inc()
+                # The copy leaves out the trace hook so phase timings count one call
+                extensions = {k: v for k, v in request.extensions.items() if k != "trace"}
+                second = asyncio.ensure_future(send(httpx.Request(
+                    request.method, request.url, headers=request.headers, extensions=extensions
+                )))
+                tasks.append(second)
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    # Both may finish together; the original wins ties
+                    for task in tasks:
+                        if task in done and task.exception() is None:
+                            if task is second:
+                                self.hedge_wins.inc()
+                            winner = task
+                            return task.result()
+                # Both failed; report the original request's error
+                return primary.result()
+            response = await primary
+            winner = primary
+            return response
+        finally:
+            await _discard([task for task in tasks if task is not winner])
@@ -1,18 +1,26 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from pydantic import TypeAdapter
 import httpx
 import logging
 
+from ..cache import response_cache
 from ..models.alerts import Alert, AlertResponse
-from ..config import settings
+from ..models.auth import Principal
+from ..proxy import fetch_body, passthrough_enabled, stream_get
+from ..security import authenticate
+from ..singleflight import flight_key, singleflight
+from ..upstreams import upstreams
 
 router = APIRouter()
-security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+ALERT_ADAPTER = TypeAdapter(Alert)
+ALERT_RESPONSE_ADAPTER = TypeAdapter(AlertResponse)
+
 
 @router.get("/", response_model=AlertResponse)
 async def get_alerts(
+    request: Request,
     service: str = Query(None, description="Filter by service name"),
     severity: str = Query(None, description="Filter by severity"),
     acknowledged: bool = Query(None, description="Filter by acknowledged status"),
@@ -20,7 +28,7 @@ async def get_alerts(
     to_timestamp: int = Query(None, description="End timestamp"),
     page: int = Query(1, ge=1),
     page_size: int = Query(100, ge=1, le=1000),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Get alerts with filters"""
     try:
@@ -38,16 +46,29 @@ async def get_alerts(
             params["from_timestamp"] = from_timestamp
         if to_timestamp:
             params["to_timestamp"] = to_timestamp
-            
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.query_analytics_url}/alerts",
+        headers = {"Authorization": f"Bearer {principal.token}"}
+        passthrough = passthrough_enabled("query_analytics")
+        
+        if passthrough and not response_cache.cacheable("alerts"):
+            return await stream_get(
+                upstreams.query_analytics,
+                "/alerts",
+                params=params,
+                headers=headers
+            )
+        return await response_cache.respond(
+            request,
+            "alerts",
+            identity=principal.cache_identity,
+            tags=("alerts",),
+            load=lambda: fetch_body(
+                upstreams.query_analytics,
+                "/alerts",
                 params=params,
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=30.0
+                headers=headers,
+                adapter=None if passthrough else ALERT_RESPONSE_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
     except httpx.HTTPStatusError as e:
         logger.error(f"Get alerts failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -59,18 +80,22 @@ async def get_alerts(
 @router.get("/{alert_id}", response_model=Alert)
 async def get_alert(
     alert_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    principal: Principal = Depends(authenticate)
 ):
     """Get a specific alert by ID"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.query_analytics_url}/alerts/{alert_id}",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
+        body, media_type = await singleflight.do(
+            "alert",
+            flight_key(request, principal.cache_identity),
+            lambda: fetch_body(
+                upstreams.query_analytics,
+                f"/alerts/{alert_id}",
+                headers={"Authorization": f"Bearer {principal.token}"},
+                adapter=None if passthrough_enabled("query_analytics") else ALERT_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
+        return Response(body, media_type=media_type)
     except httpx.HTTPStatusError as e:
         logger.error(f"Get alert failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -82,18 +107,17 @@ async def get_alert(
 @router.patch("/{alert_id}/acknowledge")
 async def acknowledge_alert(
     alert_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Acknowledge an alert"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.patch(
-                f"{settings.query_analytics_url}/alerts/{alert_id}/acknowledge",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.query_analytics.patch(
+            f"/alerts/{alert_id}/acknowledge",
+            headers={"Authorization": f"Bearer {principal.token}"}
+        )
+        response.raise_for_status()
+        response_cache.invalidate("alerts")
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"Acknowledge alert failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
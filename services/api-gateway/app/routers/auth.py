@@ -1,13 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
 import logging
 
-from ..models.auth import UserLogin, UserCreate, Token, User
-from ..config import settings
+from ..models.auth import UserLogin, UserCreate, Token, User, Principal, CurrentUser
+from ..security import authenticate
+from ..upstreams import upstreams
 
 router = APIRouter()
-security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
 
@@ -15,14 +14,12 @@ logger = logging.getLogger(__name__)
 async def register(user_data: UserCreate):
     """Register a new user"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.user_management_url}/auth/register",
-                json=user_data.model_dump(),
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.user_management.post(
+            "/auth/register",
+            json=user_data.model_dump(exclude_none=True)
+        )
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"User registration failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -35,14 +32,12 @@ async def register(user_data: UserCreate):
 async def login(credentials: UserLogin):
     """Login and get access token"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.user_management_url}/auth/login",
-                json=credentials.model_dump(),
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.user_management.post(
+            "/auth/login",
+            json=credentials.model_dump()
+        )
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"Login failed: {e}")
         raise HTTPException(
@@ -54,24 +49,13 @@ async def login(credentials: UserLogin):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@router.get("/me", response_model=User)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+@router.get("/me", response_model=CurrentUser)
+async def get_current_user(principal: Principal = Depends(authenticate)):
     """Get current user info"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.user_management_url}/auth/me",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Get user failed: {e}")
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail="Unauthorized"
-        )
-    except Exception as e:
-        logger.error(f"Error getting user: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    # Already resolved by authenticate; no second user-management call
+    return CurrentUser(
+        id=principal.user_id,
+        email=principal.email,
+        role=principal.role,
+        expires_at=principal.expires_at
+    )
@@ -1,32 +1,36 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from pydantic import TypeAdapter
 import httpx
 import logging
 
 from ..models.events import EventCreate, Event, EventResponse
-from ..config import settings
+from ..models.auth import Principal
+from ..proxy import fetch_body, passthrough_enabled, stream_get
+from ..security import authenticate
+from ..singleflight import flight_key, singleflight
+from ..upstreams import upstreams
 
 router = APIRouter()
-security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+EVENT_ADAPTER = TypeAdapter(Event)
+EVENT_RESPONSE_ADAPTER = TypeAdapter(EventResponse)
+
 
 @router.post("/", response_model=Event, status_code=201)
 async def create_event(
     event: EventCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Create a new event"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.event_ingestion_url}/events",
-                json=event.model_dump(),
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.event_ingestion.post(
+            "/events",
+            json=event.model_dump(),
+            headers={"Authorization": f"Bearer {principal.token}"}
+        )
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"Event creation failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -37,13 +41,14 @@ async def create_event(
 
 @router.get("/", response_model=EventResponse)
 async def get_events(
+    request: Request,
     service: str = Query(None, description="Filter by service name"),
     from_timestamp: int = Query(None, description="Start timestamp"),
     to_timestamp: int = Query(None, description="End timestamp"),
     status: str = Query(None, description="Filter by status"),
     page: int = Query(1, ge=1),
     page_size: int = Query(100, ge=1, le=1000),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Get events with filters"""
     try:
@@ -59,16 +64,28 @@ async def get_events(
             params["to_timestamp"] = to_timestamp
         if status:
             params["status"] = status
-            
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.query_analytics_url}/events",
+        headers = {"Authorization": f"Bearer {principal.token}"}
+        
+        if passthrough_enabled("query_analytics"):
+            # A stream can only be read once, so streamed pages are not coalesced
+            return await stream_get(
+                upstreams.query_analytics,
+                "/events",
+                params=params,
+                headers=headers
+            )
+        body, media_type = await singleflight.do(
+            "events",
+            flight_key(request, principal.cache_identity),
+            lambda: fetch_body(
+                upstreams.query_analytics,
+                "/events",
                 params=params,
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=30.0
+                headers=headers,
+                adapter=EVENT_RESPONSE_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
+        return Response(body, media_type=media_type)
     except httpx.HTTPStatusError as e:
         logger.error(f"Get events failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -80,18 +97,22 @@ async def get_events(
 @router.get("/{event_id}", response_model=Event)
 async def get_event(
     event_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    principal: Principal = Depends(authenticate)
 ):
     """Get a specific event by ID"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.query_analytics_url}/events/{event_id}",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
+        body, media_type = await singleflight.do(
+            "event",
+            flight_key(request, principal.cache_identity),
+            lambda: fetch_body(
+                upstreams.query_analytics,
+                f"/events/{event_id}",
+                headers={"Authorization": f"Bearer {principal.token}"},
+                adapter=None if passthrough_enabled("query_analytics") else EVENT_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
+        return Response(body, media_type=media_type)
     except httpx.HTTPStatusError as e:
         logger.error(f"Get event failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
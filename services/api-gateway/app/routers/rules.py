@@ -1,32 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import TypeAdapter
 import httpx
 import logging
 
+from ..cache import response_cache
 from ..models.rules import Rule, RuleCreate
-from ..config import settings
+from ..models.auth import Principal
+from ..proxy import fetch_body, passthrough_enabled
+from ..security import authenticate
+from ..upstreams import upstreams
 
 router = APIRouter()
-security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+RULE_ADAPTER = TypeAdapter(Rule)
+RULES_ADAPTER = TypeAdapter(list[Rule])
+
 
 @router.post("/", response_model=Rule, status_code=201)
 async def create_rule(
     rule: RuleCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Create a new alert rule"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.alert_rules_engine_url}/rules",
-                json=rule.model_dump(),
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.alert_rules_engine.post(
+            "/rules",
+            json=rule.model_dump(),
+            headers={"Authorization": f"Bearer {principal.token}"}
+        )
+        response.raise_for_status()
+        response_cache.invalidate("rules")
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"Rule creation failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -37,18 +42,23 @@ async def create_rule(
 
 @router.get("/", response_model=list[Rule])
 async def get_rules(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    principal: Principal = Depends(authenticate)
 ):
     """Get all alert rules"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.alert_rules_engine_url}/rules",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
+        return await response_cache.respond(
+            request,
+            "rules",
+            identity=principal.cache_identity,
+            tags=("rules",),
+            load=lambda: fetch_body(
+                upstreams.alert_rules_engine,
+                "/rules",
+                headers={"Authorization": f"Bearer {principal.token}"},
+                adapter=None if passthrough_enabled("alert_rules_engine") else RULES_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
     except httpx.HTTPStatusError as e:
         logger.error(f"Get rules failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -60,18 +70,23 @@ async def get_rules(
 @router.get("/{rule_id}", response_model=Rule)
 async def get_rule(
     rule_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    request: Request,
+    principal: Principal = Depends(authenticate)
 ):
     """Get a specific rule by ID"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.alert_rules_engine_url}/rules/{rule_id}",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
+        return await response_cache.respond(
+            request,
+            "rule",
+            identity=principal.cache_identity,
+            tags=(f"rule:{rule_id}",),
+            load=lambda: fetch_body(
+                upstreams.alert_rules_engine,
+                f"/rules/{rule_id}",
+                headers={"Authorization": f"Bearer {principal.token}"},
+                adapter=None if passthrough_enabled("alert_rules_engine") else RULE_ADAPTER
             )
-            response.raise_for_status()
-            return response.json()
+        )
     except httpx.HTTPStatusError as e:
         logger.error(f"Get rule failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -84,19 +99,18 @@ async def get_rule(
 async def update_rule(
     rule_id: str,
     rule: RuleCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Update an alert rule"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
-                f"{settings.alert_rules_engine_url}/rules/{rule_id}",
-                json=rule.model_dump(),
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await upstreams.alert_rules_engine.put(
+            f"/rules/{rule_id}",
+            json=rule.model_dump(),
+            headers={"Authorization": f"Bearer {principal.token}"}
+        )
+        response.raise_for_status()
+        response_cache.invalidate("rules", f"rule:{rule_id}")
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"Update rule failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -108,18 +122,17 @@ async def update_rule(
 @router.delete("/{rule_id}", status_code=204)
 async def delete_rule(
     rule_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    principal: Principal = Depends(authenticate)
 ):
     """Delete an alert rule"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{settings.alert_rules_engine_url}/rules/{rule_id}",
-                headers={"Authorization": f"Bearer {credentials.credentials}"},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return None
+        response = await upstreams.alert_rules_engine.delete(
+            f"/rules/{rule_id}",
+            headers={"Authorization": f"Bearer {principal.token}"}
+        )
+        response.raise_for_status()
+        response_cache.invalidate("rules", f"rule:{rule_id}")
+        return None
     except httpx.HTTPStatusError as e:
         logger.error(f"Delete rule failed: {e}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -0,0 +1,227 @@
+"""Bearer token authentication shared by every router.
+
+Signed JWTs are verified locally against a key set (the current
+``jwt_secret_key``, any ``jwt_previous_secret_keys`` kept during a rotation,
+and an optional JWKS published by user-management), so authenticated
+requests need no identity round trip. Verified tokens are remembered by
+digest in a small LRU until they expire, which skips repeated signature
+checks for clients that reuse a token. Opaque (non-JWT) tokens are rejected
+unless ``auth_allow_opaque_tokens`` is set, in which case user-management's
+``/auth/me`` resolves them on every request. Nothing the gateway did not
+verify itself goes into the cache, and such principals key the response
+cache by token rather than by the identity user-management reported.
+"""
+from collections import OrderedDict
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, ExpiredSignatureError, JWTError
+from prometheus_client import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import time
+
+import httpx
+
+from .config import settings
+from .instrumentation import current_timings
+from .models.auth import Principal
+from .upstreams import upstreams
+
+logger = logging.getLogger(__name__)
+
+# Unknown key IDs trigger a JWKS refresh at most this often
+JWKS_MIN_REFRESH_SECONDS = 10.0
+
+AUTH_REQUESTS = Counter(
+    "api_gateway_auth_requests_total",
+    "Bearer token checks by outcome",
+    ["result"]
+)
+
+AUTH_KEYSET_REFRESHES = Counter(
+    "api_gateway_auth_keyset_refreshes_total",
+    "JWKS fetches from user-management",
+    ["result"]
+)
+
+
+class KeySet:
+    """Signing keys accepted for incoming tokens, refreshed from JWKS if set"""
+
+    def __init__(self):
+        self.secrets: List[str] = [settings.jwt_secret_key] + [
+            secret.strip()
+            for secret in settings.jwt_previous_secret_keys.split(",")
+            if secret.strip()
+        ]
+        self.jwks: Dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def keys_for(self, kid: Optional[str]) -> List:
+        """Candidate keys for a token header's kid, most likely first"""
+        if not settings.jwt_jwks_path:
+            return self.secrets
+        age = time.monotonic() - self._fetched_at
+        if age > settings.jwt_jwks_refresh_seconds or (
+            kid not in self.jwks and age > JWKS_MIN_REFRESH_SECONDS
+        ):
+            await self.refresh()
+        if kid is not None:
+            return [self.jwks[kid]] if kid in self.jwks else []
+        return list(self.jwks.values())
+
+    async def refresh(self):
+        async with self._lock:
+            if time.monotonic() - self._fetched_at < JWKS_MIN_REFRESH_SECONDS:
+                return  # Another request refreshed while we waited
+            self._fetched_at = time.monotonic()
+            try:
+                response = await upstreams.user_management.get(settings.jwt_jwks_path)
+                response.raise_for_status()
+                self.jwks = {key.get("kid"): key for key in response.json()["keys"]}
+                AUTH_KEYSET_REFRESHES.labels(result="success").inc()
+            except Exception as e:
+                # Keep serving with the keys we already have
+                AUTH_KEYSET_REFRESHES.labels(result="failure").inc()
+                logger.error(f"JWKS refresh failed: {e}")
+
+
+class VerifiedTokenCache:
+    """LRU of token digest -> (principal, valid until)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Principal, float]]" = OrderedDict()
+
+    def get(self, digest: bytes) -> Optional[Principal]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return entry[0]
+
+    def put(self, digest: bytes, principal: Principal, valid_until: float):
+        self._entries[digest] = (principal, valid_until)
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _unauthorized(detail: str = "Invalid or expired token") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+class Authenticator:
+    def __init__(self):
+        self.keys = KeySet()
+        self.verified = VerifiedTokenCache(settings.jwt_verified_cache_size)
+
+    async def authenticate(self, token: str) -> Principal:
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        principal = self.verified.get(digest)
+        if principal is not None:
+            AUTH_REQUESTS.labels(result="cached").inc()
+            return principal
+
+        if token.count(".") == 2:
+            principal = await self._verify_jwt(token)
+            AUTH_REQUESTS.labels(result="verified").inc()
+            valid_until = min(principal.expires_at, time.time() + settings.jwt_verified_cache_ttl_seconds)
+            self.verified.put(digest, principal, valid_until)
+            return principal
+        if settings.auth_allow_opaque_tokens:
+            principal = await self._resolve_opaque(token)
+            AUTH_REQUESTS.labels(result="introspected").inc()
+            return principal
+        AUTH_REQUESTS.labels(result="rejected").inc()
+        raise _unauthorized()
+
+    async def _verify_jwt(self, token: str) -> Principal:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            AUTH_REQUESTS.labels(result="rejected").inc()
+            raise _unauthorized()
+
+        options = {
+            "leeway": settings.jwt_leeway_seconds,
+            "require_exp": True,
+            "require_sub": True,
+            "verify_aud": bool(settings.jwt_audience),
+        }
+        for key in await self.keys.keys_for(header.get("kid")):
+            try:
+                claims = jwt.decode(
+                    token,
+                    key,
+                    algorithms=[settings.jwt_algorithm],
+                    audience=settings.jwt_audience or None,
+                    issuer=settings.jwt_issuer or None,
+                    options=options
+                )
+            except ExpiredSignatureError:
+                # Signature was valid, so other keys would not help
+                break
+            except JWTError:
+                continue
+            return Principal(
+                user_id=str(claims["sub"]),
+                email=claims.get("email"),
+                role=claims.get("role"),
+                expires_at=int(claims["exp"]),
+                token=token
+            )
+        AUTH_REQUESTS.labels(result="rejected").inc()
+        raise _unauthorized()
+
+    async def _resolve_opaque(self, token: str) -> Principal:
+        try:
+            response = await upstreams.user_management.get(
+                "/auth/me",
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            response.raise_for_status()
+            user = response.json()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (401, 403):
+                AUTH_REQUESTS.labels(result="rejected").inc()
+                raise _unauthorized()
+            logger.error(f"Token introspection failed: {e}")
+            raise HTTPException(status_code=503, detail="Authentication service unavailable")
+        except Exception as e:
+            logger.error(f"Error during token introspection: {e}")
+            raise HTTPException(status_code=503, detail="Authentication service unavailable")
+        return Principal(
+            user_id=str(user["id"]),
+            email=user.get("email"),
+            role=user.get("role"),
+            token=token,
+            verified=False
+        )
+
+
+bearer = HTTPBearer()
+authenticator = Authenticator()
+
+
+async def authenticate(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer)
+) -> Principal:
+    """FastAPI dependency resolving the caller of an authenticated route"""
+    timings = current_timings()
+    if timings is None:
+        return await authenticator.authenticate(credentials.credentials)
+    started = time.perf_counter()
+    upstream = timings.upstream_connect, timings.upstream_wait, timings.upstream_done
+    try:
+        return await authenticator.authenticate(credentials.credentials)
+    finally:
+        timings.auth += time.perf_counter() - started
+        # Introspection and JWKS calls count as auth, not as the proxied call
+        timings.upstream_connect, timings.upstream_wait, timings.upstream_done = upstream
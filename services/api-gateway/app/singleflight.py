@@ -0,0 +1,76 @@
+"""Coalescing of identical concurrent upstream reads.
+
+While an upstream GET is in flight, identical requests (same path, query and
+caller identity) wait for it instead of sending their own, and every waiter
+receives the same result or exception. The shared call runs as its own task,
+so it completes for the remaining waiters even if the request that started
+it is cancelled.
+"""
+from fastapi import Request
+from prometheus_client import Counter, Gauge
+from typing import Awaitable, Callable, Dict, TypeVar
+from urllib.parse import urlencode
+import asyncio
+
+from .config import settings
+
+T = TypeVar("T")
+
+COALESCED_REQUESTS = Counter(
+    "api_gateway_coalesced_requests_total",
+    "Requests served by joining an identical in-flight upstream call",
+    ["route"]
+)
+
+UPSTREAM_FLIGHTS = Counter(
+    "api_gateway_coalescing_flights_total",
+    "Upstream calls started by the coalescing layer",
+    ["route"]
+)
+
+IN_FLIGHT_KEYS = Gauge(
+    "api_gateway_coalescing_in_flight_keys",
+    "Distinct coalesced upstream calls currently in flight"
+)
+
+
+def _consume_exception(task: asyncio.Task):
+    # Every waiter may have gone; don't log the failure as unretrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    async def do(self, route: str, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run call(), or join the identical call already in flight"""
+        if not self.enabled:
+            return await call()
+        task = self._flights.get(key)
+        if task is None:
+            UPSTREAM_FLIGHTS.labels(route=route).inc()
+            task = asyncio.ensure_future(call())
+            task.add_done_callback(_consume_exception)
+            task.add_done_callback(lambda done: self._land(key, done))
+            self._flights[key] = task
+            IN_FLIGHT_KEYS.set(len(self._flights))
+        else:
+            COALESCED_REQUESTS.labels(route=route).inc()
+        return await asyncio.shield(task)
+
+    def _land(self, key: str, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        IN_FLIGHT_KEYS.set(len(self._flights))
+
+
+def flight_key(request: Request, identity: str) -> str:
+    """Requests are identical if path, query and authorization scope match"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{identity}|{request.url.path}?{query}"
+
+
+singleflight = SingleFlight(settings.singleflight_enabled)
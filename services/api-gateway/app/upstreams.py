@@ -0,0 +1,218 @@
+"""Long-lived pooled HTTP clients for the backend services.
+
+One httpx.AsyncClient per upstream is created at startup and closed at
+shutdown, so proxied requests reuse warm keep-alive connections instead of
+opening a new pool (and TCP/TLS handshake) per request.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from typing import Dict
+import asyncio
+import logging
+import time
+
+import httpx
+
+from .config import settings
+from .instrumentation import TimedResponseStream, UpstreamTrace, current_timings
+from .resilience import UpstreamResilience
+
+logger = logging.getLogger(__name__)
+
+# Each name is also the settings prefix of that upstream's URL and timeout
+UPSTREAMS = (
+    "event_ingestion",
+    "alert_rules_engine",
+    "query_analytics",
+    "user_management",
+)
+
+UPSTREAM_REQUESTS_IN_FLIGHT = Gauge(
+    "api_gateway_upstream_requests_in_flight",
+    "Upstream requests waiting for response headers",
+    ["upstream"]
+)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "api_gateway_upstream_request_duration_seconds",
+    "Time from sending an upstream request to its response headers",
+    ["upstream"]
+)
+
+UPSTREAM_POOL_TIMEOUTS = Counter(
+    "api_gateway_upstream_pool_timeouts_total",
+    "Upstream requests that gave up waiting for a pooled connection",
+    ["upstream"]
+)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Connection-pooling transport that records per-upstream metrics.
+    
+    Within a gateway request it also adds connect and wait times to the
+    request's phase timings, and marks when the response body was read.
+    With a resilience policy, calls go through its circuit breaker, adaptive
+    read timeout and hedging (see resilience.py).
+    """
+
+    def __init__(self, upstream: str, resilience: UpstreamResilience = None, **transport_options):
+        self.upstream = upstream
+        self.transport = httpx.AsyncHTTPTransport(**transport_options)
+        self.resilience = resilience
+        self.in_flight = UPSTREAM_REQUESTS_IN_FLIGHT.labels(upstream=upstream)
+        self.duration = UPSTREAM_REQUEST_DURATION.labels(upstream=upstream)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        probe = False
+        hedge_delay = None
+        if self.resilience is not None:
+            probe = self.resilience.breaker.admit(started)
+            if probe is None:
+                return self.resilience.fast_fail(request, started)
+            timeout = request.extensions.get("timeout", {})
+            request.extensions = {
+                **request.extensions,
+                "timeout": {**timeout, "read": self.resilience.read_timeout(started)},
+            }
+            hedge_delay = self.resilience.hedge_delay(request, started)
+
+        timings = current_timings()
+        if timings is not None:
+            request.extensions = {**request.extensions, "trace": UpstreamTrace(timings, started)}
+        self.in_flight.inc()
+        failed = True
+        try:
+            if hedge_delay is None:
+                response = await self.transport.handle_async_request(request)
+            else:
+                response = await self.resilience.hedged(
+                    self.transport.handle_async_request, request, hedge_delay
+                )
+            failed = response.status_code >= 500
+            if timings is not None:
+                response.stream = TimedResponseStream(response.stream, timings)
+            return response
+        except httpx.PoolTimeout:
+            UPSTREAM_POOL_TIMEOUTS.labels(upstream=self.upstream).inc()
+            raise
+        except asyncio.CancelledError:
+            # The caller went away; says nothing about the upstream
+            failed = None
+            raise
+        finally:
+            self.in_flight.dec()
+            elapsed = time.perf_counter() - started
+            self.duration.observe(elapsed)
+            if self.resilience is not None:
+                self.resilience.breaker.record(time.perf_counter(), elapsed, failed, probe)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def pool_connections(self) -> Dict[str, int]:
+        """Current connection counts by state, read from the httpcore pool"""
+        counts = {"active": 0, "idle": 0}
+        pool = getattr(self.transport, "_pool", None)
+        for connection in getattr(pool, "connections", ()):
+            if connection.is_closed():
+                continue
+            counts["idle" if connection.is_idle() else "active"] += 1
+        return counts
+
+
+class UpstreamClients:
+    def __init__(self):
+        self.transports: Dict[str, InstrumentedTransport] = {}
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    async def start(self):
+        limits = httpx.Limits(
+            max_connections=settings.upstream_max_connections,
+            max_keepalive_connections=settings.upstream_max_keepalive_connections,
+            keepalive_expiry=settings.upstream_keepalive_expiry_seconds
+        )
+        hedged = {name.strip() for name in settings.hedge_upstreams.split(",")}
+        for name in UPSTREAMS:
+            transport = InstrumentedTransport(
+                name,
+                resilience=UpstreamResilience(
+                    name,
+                    timeout_seconds=getattr(settings, f"{name}_timeout_seconds"),
+                    hedge=name in hedged
+                ),
+                limits=limits,
+                http2=settings.upstream_http2,
+                retries=settings.upstream_retries
+            )
+            self.transports[name] = transport
+            self.clients[name] = httpx.AsyncClient(
+                base_url=getattr(settings, f"{name}_url"),
+                transport=transport,
+                timeout=httpx.Timeout(
+                    getattr(settings, f"{name}_timeout_seconds"),
+                    connect=settings.upstream_connect_timeout_seconds,
+                    pool=settings.upstream_pool_timeout_seconds
+                )
+            )
+        logger.info(f"Upstream clients started for {', '.join(UPSTREAMS)}")
+
+    async def stop(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
+        self.transports = {}
+        logger.info("Upstream clients closed")
+
+    def __getitem__(self, name: str) -> httpx.AsyncClient:
+        try:
+            return self.clients[name]
+        except KeyError:
+            raise RuntimeError(f"Upstream client {name} is not started") from None
+
+    @property
+    def event_ingestion(self) -> httpx.AsyncClient:
+        return self["event_ingestion"]
+
+    @property
+    def alert_rules_engine(self) -> httpx.AsyncClient:
+        return self["alert_rules_engine"]
+
+    @property
+    def query_analytics(self) -> httpx.AsyncClient:
+        return self["query_analytics"]
+
+    @property
+    def user_management(self) -> httpx.AsyncClient:
+        return self["user_management"]
+
+
+class UpstreamPoolCollector:
+    """Exports pool occupancy at scrape time"""
+
+    def __init__(self, upstreams: UpstreamClients):
+        self.upstreams = upstreams
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "api_gateway_upstream_pool_connections",
+            "Open pooled connections per upstream by state",
+            labels=["upstream", "state"]
+        )
+        for name, transport in self.upstreams.transports.items():
+            for state, count in transport.pool_connections().items():
+                connections.add_metric([name, state], count)
+        yield connections
+
+        limit = GaugeMetricFamily(
+            "api_gateway_upstream_pool_max_connections",
+            "Configured connection limit per upstream pool",
+            labels=["upstream"]
+        )
+        for name in self.upstreams.transports:
+            limit.add_metric([name], settings.upstream_max_connections)
+        yield limit
+
+
+upstreams = UpstreamClients()
+REGISTRY.register(UpstreamPoolCollector(upstreams))
@@ -0,0 +1,106 @@
+"""Gateway CPU and peak memory per list request, buffered vs pass-through.
+
+"buffered" decodes the upstream page, validates it against EventResponse and
+re-encodes it; "passthrough" streams the upstream bytes unchanged. The
+upstream is an in-process mock serving a pre-encoded page in 64 KiB chunks,
+so only gateway work is measured.
+
+Run from services/api-gateway:
+
+    python -m benchmarks.bench_list_proxy [--page-size N]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.upstreams import upstreams
+
+CHUNK = 64 * 1024
+
+
+def make_page(page_size: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    events = [
+        {
+            "id": f"{rng.getrandbits(128):032x}",
+            "service": rng.choice(["checkout", "inventory", "payments", "pos-gateway"]),
+            "timestamp": 1_700_000_000 + rng.randrange(86_400),
+            "latency_ms": round(rng.lognormvariate(3.5, 0.6), 3),
+            "error_code": None,
+            "status": "OK",
+            "metadata": {"store_id": f"store-{rng.randrange(2000):04d}", "register": rng.randrange(12)},
+        }
+        for _ in range(page_size)
+    ]
+    return json.dumps({"events": events, "total": page_size * 10, "page": 1, "page_size": page_size}).encode()
+
+
+def mock_upstream(body: bytes) -> httpx.MockTransport:
+    async def chunks():
+        for start in range(0, len(body), CHUNK):
+            yield body[start:start + CHUNK]
+
+    def handler(request):
+        return httpx.Response(
+            200,
+            headers={"content-type": "application/json", "content-length": str(len(body))},
+            content=chunks()
+        )
+    return httpx.MockTransport(handler)
+
+
+async def run(page_size: int, requests: int):
+    body = make_page(page_size)
+    await app.router.startup()
+    upstreams.transports["query_analytics"].transport = mock_upstream(body)
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            headers = {"Authorization": "Bearer bench"}
+            path = f"{settings.api_v1_prefix}/events/?page_size={page_size}"
+            for mode, passthrough in (("buffered", ""), ("passthrough", "query_analytics")):
+                settings.passthrough_upstreams = passthrough
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+
+                started = time.process_time()
+                for _ in range(requests):
+                    await client.get(path, headers=headers)
+                cpu = (time.process_time() - started) / requests
+
+                # Peak includes the client's copy of the response body
+                tracemalloc.start()
+                await client.get(path, headers=headers)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                results.append({
+                    "mode": mode,
+                    "page_size": page_size,
+                    "body_bytes": len(body),
+                    "cpu_ms_per_request": round(cpu * 1000, 3),
+                    "peak_kib_per_request": round(peak / 1024, 1),
+                })
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.page_size, args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Per-request overhead of RateLimitMiddleware.
+
+Calls the ASGI stack directly with a no-op endpoint, with and without the
+middleware in front, so the difference is the limiter's own cost: group
+match, client key derivation, bucket update and header injection.
+
+Run from services/api-gateway:
+
+    python -m benchmarks.bench_ratelimit [--requests N] [--clients N]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.ratelimit import RateLimiter, RateLimitMiddleware
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+def make_scopes(clients: int, key: str):
+    scopes = []
+    for i in range(clients):
+        headers = [(b"host", b"gateway"), (b"user-agent", b"bench")]
+        if key == "user":
+            headers.append((b"authorization", f"Bearer opaque-token-{i}".encode()))
+        scopes.append({
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/rules/",
+            "headers": headers,
+            "client": (f"10.0.{i // 256}.{i % 256}", 40000),
+        })
+    return scopes
+
+
+async def per_request_ns(app, scopes, requests: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(requests):
+            await app(scopes[i % len(scopes)], receive, send)
+        best = min(best, time.perf_counter() - started)
+    return best / requests * 1e9
+
+
+async def run(args):
+    limiter = RateLimiter()
+    # Generous limits so every request takes the allowed path
+    for group in limiter.groups:
+        group.capacity = group.rate = float(10 ** 9)
+    limited = RateLimitMiddleware(endpoint, limiter)
+
+    results = []
+    for key in ("user", "ip"):
+        scopes = make_scopes(args.clients, key)
+        baseline = await per_request_ns(endpoint, scopes, args.requests, args.repeat)
+        with_limiter = await per_request_ns(limited, scopes, args.requests, args.repeat)
+        results.append({
+            "client_key": key,
+            "clients": args.clients,
+            "baseline_ns": round(baseline),
+            "with_limiter_ns": round(with_limiter),
+            "overhead_ns": round(with_limiter - baseline),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from jose import jwt
+from starlette.requests import Request
+
+from app.cache import ResponseCache, response_cache
+from app.config import settings
+from app.main import app
+from app.upstreams import upstreams
+
+RULE = {
+    "id": "r1",
+    "created_at": 0,
+    "service": "checkout",
+    "name": "slow",
+    "type": "THRESHOLD",
+    "condition": {"metric": "latency_ms", "operator": ">", "value": 500},
+    "severity": "HIGH",
+}
+
+
+def get(path, query=b""):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+def respond(cache, request, loads, identity="user-1:user"):
+    async def load():
+        loads.append(request.url.query)
+        return json.dumps({"query": request.url.query}).encode(), "application/json"
+
+    return asyncio.run(cache.respond(request, "rules", identity, ("rules",), load))
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(True, 100, 1 << 20, 1 << 16, {"rules": 30.0})
+
+
+def test_hits_are_keyed_by_query_and_identity(cache):
+    loads = []
+    first = respond(cache, get("/rules", b"b=2&a=1"), loads)
+    again = respond(cache, get("/rules", b"a=1&b=2"), loads)
+    other_user = respond(cache, get("/rules", b"a=1&b=2"), loads, identity="user-2:user")
+    assert (first.headers["x-cache"], again.headers["x-cache"]) == ("MISS", "HIT")
+    assert other_user.headers["x-cache"] == "MISS"
+    assert again.body == first.body and len(loads) == 2
+
+
+def test_escaped_queries_do_not_collide(cache):
+    loads = []
+    respond(cache, get("/rules", b"a=1&b=2"), loads)
+    single = respond(cache, get("/rules", b"a=1%26b%3D2"), loads)
+    assert single.headers["x-cache"] == "MISS" and len(loads) == 2
+
+
+def test_matching_etag_gets_304(cache):
+    loads = []
+    etag = respond(cache, get("/rules"), loads).headers["etag"]
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/rules",
+        "query_string": b"",
+        "headers": [(b"if-none-match", f'W/"other", {etag}'.encode())],
+    })
+    response = respond(cache, request, loads)
+    assert response.status_code == 304 and response.body == b""
+    assert response.headers["etag"] == etag and len(loads) == 1
+
+
+def test_writes_invalidate_cached_reads(monkeypatch):
+    reads = []
+
+    def handler(request):
+        if request.method == "GET":
+            reads.append(request.url.path)
+            return httpx.Response(200, json=[RULE])
+        return httpx.Response(201, json=RULE)
+
+    client = httpx.AsyncClient(base_url="http://alert-rules-engine", transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(upstreams.clients, "alert_rules_engine", client)
+    monkeypatch.setattr(response_cache, "enabled", True)
+    response_cache.clear()
+    token = jwt.encode(
+        {"sub": "user-1", "role": "admin", "exp": int(time.time()) + 600},
+        settings.jwt_secret_key,
+        algorithm=settings.jwt_algorithm,
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Authorization": f"Bearer {token}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", headers=headers) as gateway:
+            rules = f"{settings.api_v1_prefix}/rules/"
+            statuses = [(await gateway.get(rules)).headers["x-cache"] for _ in range(2)]
+            created = await gateway.post(rules, json={key: RULE[key] for key in RULE if key not in ("id", "created_at")})
+            statuses.append((await gateway.get(rules)).headers["x-cache"])
+            return created, statuses
+
+    created, statuses = asyncio.run(run())
+    response_cache.clear()
+    assert created.status_code == 201
+    assert statuses == ["MISS", "HIT", "MISS"]
+    assert len(reads) == 2
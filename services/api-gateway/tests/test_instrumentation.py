@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.instrumentation import InstrumentationMiddleware, current_timings
+
+
+def instrumented(server_timing=True):
+    app = FastAPI()
+
+    @app.get("/widgets/{widget_id}")
+    async def widget(widget_id: str):
+        current_timings().auth += 0.004
+        return {"id": widget_id}
+
+    app.add_middleware(InstrumentationMiddleware, server_timing=server_timing)
+    return app
+
+
+def requests(app, *calls):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            return [await client.request(method, path) for method, path in calls]
+
+    return asyncio.run(run())
+
+
+def count(method, endpoint, status):
+    labels = {"method": method, "endpoint": endpoint, "status": status}
+    return REGISTRY.get_sample_value("api_gateway_requests_total", labels) or 0
+
+
+def test_requests_are_labelled_by_route_template():
+    before = {
+        key: count(*key)
+        for key in [("GET", "/widgets/{widget_id}", "200"), ("GET", "unmatched", "404"), ("OTHER", "unmatched", "404")]
+    }
+    requests(instrumented(), ("GET", "/widgets/a"), ("GET", "/widgets/b"), ("GET", "/nope/c"), ("BREW", "/nope"))
+    assert {key: count(*key) - value for key, value in before.items()} == {
+        ("GET", "/widgets/{widget_id}", "200"): 2,
+        ("GET", "unmatched", "404"): 1,
+        ("OTHER", "unmatched", "404"): 1,
+    }
+    assert REGISTRY.get_sample_value("api_gateway_request_phase_seconds_count", {
+        "endpoint": "/widgets/{widget_id}", "phase": "auth"
+    }) >= 2
+
+
+def test_server_timing_lists_the_phases_that_took_time():
+    (response,) = requests(instrumented(), ("GET", "/widgets/a"))
+    metrics = dict(metric.split(";dur=") for metric in response.headers["server-timing"].split(", "))
+    assert set(metrics) == {"auth", "total"}
+    assert float(metrics["auth"]) == 4.0
+    assert float(metrics["total"]) > 0
+
+    (response,) = requests(instrumented(server_timing=False), ("GET", "/widgets/a"))
+    assert "server-timing" not in response.headers
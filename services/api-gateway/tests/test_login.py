@@ -0,0 +1,54 @@
+import asyncio
+import importlib
+import pathlib
+import sys
+import types
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+from app.upstreams import upstreams
+
+USER_MANAGEMENT = pathlib.Path(__file__).resolve().parents[2] / "user-management" / "app"
+
+
+@pytest.fixture
+def user_management(monkeypatch):
+    """The real user-management app as the gateway's upstream, signing with the gateway's secret"""
+    # Both services call their package "app"; load this one under another name
+    package = types.ModuleType("user_management_app")
+    package.__path__ = [str(USER_MANAGEMENT)]
+    monkeypatch.setitem(sys.modules, "user_management_app", package)
+    service = importlib.import_module("user_management_app.main")
+    monkeypatch.setattr(service.settings, "jwt_secret_key", settings.jwt_secret_key)
+    monkeypatch.setattr(service, "users_db", {})
+    client = httpx.AsyncClient(base_url="http://user-management", transport=httpx.ASGITransport(app=service.app))
+    monkeypatch.setitem(upstreams.clients, "user_management", client)
+    return service
+
+
+def test_login_then_call_the_gateway(user_management):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            prefix = f"{settings.api_v1_prefix}/auth"
+            credentials = {"email": "ana@example.com", "password": "s3cret-pass"}
+            registered = await client.post(f"{prefix}/register", json={**credentials, "role": "analyst"})
+            login = await client.post(f"{prefix}/login", json=credentials)
+            token = login.json()["access_token"]
+            me = await client.get(f"{prefix}/me", headers={"Authorization": f"Bearer {token}"})
+            forged = await client.get(f"{prefix}/me", headers={"Authorization": f"Bearer {token}x"})
+            return registered, login, me, forged
+
+    registered, login, me, forged = asyncio.run(run())
+    assert registered.status_code == 201 and login.status_code == 200
+    assert me.status_code == 200
+    assert me.json() == {
+        "id": registered.json()["id"],
+        "email": "ana@example.com",
+        "role": "analyst",
+        "expires_at": me.json()["expires_at"],
+    }
+    assert forged.status_code == 401
@@ -0,0 +1,64 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from app.proxy import stream_get
+
+PAGE = gzip.compress(b'[{"id": "a1"}]' * 100)
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+def upstream(status, stream, headers=()):
+    def handler(request):
+        return httpx.Response(status, headers=list(headers), stream=stream)
+
+    return httpx.AsyncClient(base_url="http://query-analytics", transport=httpx.MockTransport(handler))
+
+
+def test_body_streams_through_undecoded():
+    stream = TrackedStream([PAGE[:100], PAGE[100:]])
+    headers = [
+        ("content-type", "application/json"),
+        ("content-encoding", "gzip"),
+        ("x-total-count", "100"),
+        ("connection", "keep-alive"),
+        ("server", "uvicorn"),
+    ]
+
+    async def run():
+        response = await stream_get(upstream(206, stream, headers), "/alerts", params={"limit": 100})
+        open_while_streaming = not stream.closed
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await response.background()
+        return response, body, open_while_streaming
+
+    response, body, open_while_streaming = asyncio.run(run())
+    assert response.status_code == 206
+    assert body == PAGE
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["x-total-count"] == "100"
+    assert "connection" not in response.headers and "server" not in response.headers
+    # The upstream response stays open for the body, then is closed
+    assert open_while_streaming and stream.closed
+
+
+def test_error_status_raises_and_closes_the_upstream_response():
+    stream = TrackedStream([b'{"detail": "down"}'])
+    with pytest.raises(httpx.HTTPStatusError) as raised:
+        asyncio.run(stream_get(upstream(503, stream), "/alerts"))
+    assert raised.value.response.status_code == 503
+    assert stream.closed
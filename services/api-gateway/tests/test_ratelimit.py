@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+from app.models.auth import Principal
+from app.ratelimit import RateLimiter, TokenBuckets, parse_groups
+from app.security import authenticator
+
+
+def scope(headers=(), client=("203.0.113.7", 40000), path="/api/v1/rules"):
+    return {"type": "http", "path": path, "headers": list(headers), "client": client}
+
+
+def test_parse_groups_longest_prefix_first():
+    groups = parse_groups("/api/v1=user:default,/api/v1/auth=ip:30", 100)
+    assert [(group.prefix, group.key_type, group.per_minute) for group in groups] == [
+        ("/api/v1/auth", "ip", 30),
+        ("/api/v1", "user", 100),
+    ]
+
+
+def test_bucket_refills_at_rate():
+    buckets = TokenBuckets(shards=4, max_keys=100)
+    assert buckets.take("k", 2.0, 1.0, now=0.0) == (True, 1.0)
+    assert buckets.take("k", 2.0, 1.0, now=0.0) == (True, 0.0)
+    assert buckets.take("k", 2.0, 1.0, now=0.0)[0] is False
+    assert buckets.take("k", 2.0, 1.0, now=1.0)[0] is True
+
+
+def test_unverified_tokens_share_the_client_ip_bucket():
+    limiter = RateLimiter()
+    keys = {
+        limiter._client_key(scope([(b"authorization", f"Bearer made-up-{i}".encode())]), "user")
+        for i in range(10)
+    }
+    assert keys == {"ip:203.0.113.7"}
+
+
+def test_verified_token_keys_by_user():
+    limiter = RateLimiter()
+    token = b"verified-token"
+    digest = hashlib.sha256(token).digest()
+    authenticator.verified.put(digest, Principal(user_id="user-42", token="t"), time.time() + 60)
+    key = limiter._client_key(scope([(b"authorization", b"Bearer " + token)]), "user")
+    assert key == "user:user-42"
+
+
+def test_forwarded_for_ignored_unless_trusted():
+    limiter = RateLimiter()
+    limiter.trust_forwarded = False
+    headers = [(b"x-forwarded-for", b"198.51.100.1, 192.0.2.10")]
+    assert limiter._client_key(scope(headers), "ip") == "ip:203.0.113.7"
+
+
+def test_forwarded_for_reads_trusted_hops_from_the_right():
+    limiter = RateLimiter()
+    limiter.trust_forwarded = True
+    headers = [(b"x-forwarded-for", b"198.51.100.1, 192.0.2.10")]
+    limiter.proxy_hops = 1
+    assert limiter._client_key(scope(headers), "ip") == "ip:192.0.2.10"
+    limiter.proxy_hops = 2
+    assert limiter._client_key(scope(headers), "ip") == "ip:198.51.100.1"
+    # Fewer entries than trusted proxies: the header is not what they wrote
+    limiter.proxy_hops = 3
+    assert limiter._client_key(scope(headers), "ip") == "ip:203.0.113.7"
+
+
+def test_spoofed_forwarded_for_cannot_mint_buckets():
+    limiter = RateLimiter()
+    limiter.trust_forwarded = True
+    limiter.proxy_hops = 1
+    keys = {
+        limiter._client_key(scope([(b"x-forwarded-for", f"10.0.0.{i}, 192.0.2.10".encode())]), "ip")
+        for i in range(10)
+    }
+    assert keys == {"ip:192.0.2.10"}
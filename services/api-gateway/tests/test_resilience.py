@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+
+from app.resilience import UpstreamResilience
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield b"{}"
+
+    async def aclose(self):
+        self.closed = True
+
+
+def hedged(primary_waits_for_hedge):
+    """Run hedged() with a primary that answers with the hedge, or never"""
+    streams, cancelled = [], []
+
+    async def send(request):
+        stream = TrackedStream()
+        streams.append(stream)
+        if len(streams) == 2:
+            hedge_sent.set()
+            return httpx.Response(200, stream=stream, request=request)
+        try:
+            if primary_waits_for_hedge:
+                await hedge_sent.wait()
+            else:
+                await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(stream)
+            raise
+        return httpx.Response(200, stream=stream, request=request)
+
+    async def run():
+        nonlocal hedge_sent
+        hedge_sent = asyncio.Event()
+        resilience = UpstreamResilience("test", timeout_seconds=1.0, hedge=True)
+        request = httpx.Request("GET", "http://upstream/")
+        return await resilience.hedged(send, request, delay=0.01)
+
+    hedge_sent = None
+    return asyncio.run(run()), streams, cancelled
+
+
+def test_losing_response_closed_when_both_finish_together():
+    response, streams, cancelled = hedged(primary_waits_for_hedge=True)
+    assert response.stream is streams[0]
+    assert not streams[0].closed
+    assert streams[1].closed
+    assert cancelled == []
+
+
+def test_slow_attempt_cancelled_and_awaited():
+    response, streams, cancelled = hedged(primary_waits_for_hedge=False)
+    assert response.stream is streams[1]
+    assert cancelled == [streams[0]]
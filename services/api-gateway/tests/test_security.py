@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.config import settings
+from app.main import app
+from app.security import Authenticator
+from app.upstreams import upstreams
+
+
+@pytest.fixture
+def user_management(monkeypatch):
+    """A user-management that answers /auth/me with user-1 for any token"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers["authorization"])
+        return httpx.Response(200, json={"id": "user-1", "email": "demo@example.com", "role": "admin"})
+
+    client = httpx.AsyncClient(base_url="http://user-management", transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(upstreams.clients, "user_management", client)
+    return calls
+
+
+def signed(sub="user-42", role="user"):
+    claims = {"sub": sub, "role": role, "exp": int(time.time()) + 600}
+    return jwt.encode(claims, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+def test_opaque_tokens_rejected_by_default(user_management):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(Authenticator().authenticate("garbage"))
+    assert raised.value.status_code == 401
+    assert user_management == []
+
+
+def test_opaque_tokens_are_never_cached(user_management, monkeypatch):
+    monkeypatch.setattr(settings, "auth_allow_opaque_tokens", True)
+    auth = Authenticator()
+
+    first = asyncio.run(auth.authenticate("opaque-a"))
+    asyncio.run(auth.authenticate("opaque-a"))
+    second = asyncio.run(auth.authenticate("opaque-b"))
+
+    assert len(user_management) == 3
+    assert not first.verified
+    # Same reported user, but unverified callers never share cached responses
+    assert first.cache_identity != second.cache_identity
+
+
+def test_jwt_verified_once_then_cached():
+    auth = Authenticator()
+    token = signed()
+    principal = asyncio.run(auth.authenticate(token))
+    assert principal.verified and principal.user_id == "user-42"
+    assert asyncio.run(auth.authenticate(token)) is principal
+    assert principal.cache_identity == "user-42:user"
+
+
+def test_me_returns_the_resolved_principal(user_management):
+    async def me():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            return await client.get(
+                f"{settings.api_v1_prefix}/auth/me", headers={"Authorization": f"Bearer {signed()}"}
+            )
+
+    response = asyncio.run(me())
+    assert response.status_code == 200
+    assert response.json()["id"] == "user-42"
+    assert user_management == []
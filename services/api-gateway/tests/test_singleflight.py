@@ -0,0 +1,35 @@
+import asyncio
+
+from starlette.requests import Request
+
+from app.singleflight import SingleFlight, flight_key
+
+
+def get(query):
+    return Request({"type": "http", "method": "GET", "path": "/alerts", "query_string": query, "headers": []})
+
+
+def test_identical_reads_share_one_upstream_call():
+    calls = []
+
+    async def run(queries):
+        flights = SingleFlight(enabled=True)
+
+        async def fetch(query):
+            calls.append(query)
+            await asyncio.sleep(0.01)
+            return query
+
+        return await asyncio.gather(*(
+            flights.do("alerts", flight_key(get(query), "user-1:user"), lambda query=query: fetch(query))
+            for query in queries
+        ))
+
+    results = asyncio.run(run([b"a=1&b=2", b"b=2&a=1", b"a=1&b=2", b"a=1%26b%3D2", b"a=2"]))
+    # Parameter order does not matter, escaped separators do
+    assert calls == [b"a=1&b=2", b"a=1%26b%3D2", b"a=2"]
+    assert results == [b"a=1&b=2"] * 3 + [b"a=1%26b%3D2", b"a=2"]
+
+
+def test_callers_with_another_identity_fly_separately():
+    assert flight_key(get(b"a=1"), "user-1:user") != flight_key(get(b"a=1"), "user-2:user")
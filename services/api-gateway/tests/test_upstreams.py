@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.upstreams import UPSTREAMS, UpstreamClients
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+
+
+async def keep_alive_server(connections):
+    """A bare HTTP/1.1 upstream that counts the connections it accepts"""
+
+    async def serve(reader, writer):
+        connections.append(writer)
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(RESPONSE)
+            await writer.drain()
+
+    async def handle(reader, writer):
+        try:
+            await serve(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_requests_reuse_pooled_connections(monkeypatch):
+    connections = []
+
+    async def run():
+        server = await keep_alive_server(connections)
+        port = server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(settings, "event_ingestion_url", f"http://127.0.0.1:{port}")
+        clients = UpstreamClients()
+        await clients.start()
+        try:
+            for _ in range(5):
+                response = await clients.event_ingestion.get("/health")
+                assert response.status_code == 200
+            # Concurrent requests open more connections, which are then kept
+            await asyncio.gather(*(clients.event_ingestion.get("/health") for _ in range(3)))
+            pool = clients.transports["event_ingestion"].pool_connections()
+        finally:
+            await clients.stop()
+            server.close()
+            await server.wait_closed()
+        return clients, pool
+
+    clients, pool = asyncio.run(run())
+    assert len(connections) == 3
+    assert pool == {"active": 0, "idle": 3}
+    assert clients.clients == {}
+
+
+def test_one_client_per_upstream_until_stopped():
+    async def run():
+        clients = UpstreamClients()
+        await clients.start()
+        started = {name: clients[name] for name in UPSTREAMS}
+        same = all(getattr(clients, name) is client for name, client in started.items())
+        await clients.stop()
+        return started, same, clients
+
+    started, same, clients = asyncio.run(run())
+    assert same
+    assert {str(client.base_url).rstrip("/") for client in started.values()} == {
+        getattr(settings, f"{name}_url") for name in UPSTREAMS
+    }
+    assert all(client.is_closed for client in started.values())
+    with pytest.raises(RuntimeError):
+        clients.event_ingestion
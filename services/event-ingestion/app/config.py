@@ -18,6 +18,49 @@ class Settings(BaseSettings):
     kafka_compression_type: str = "gzip"
     kafka_max_batch_size: int = 16384
     kafka_linger_ms: int = 10
+    # Payload format: json, orjson, msgpack or binary (see app/serializers.py)
+    kafka_serializer: str = "json"
+    # Partition key strategy: service, salted or metadata (see app/partitioning.py)
+    kafka_partition_strategy: str = "service"
+    kafka_partition_metadata_field: str = "store_id"
+    kafka_ordered_services: str = ""
+    # Services with stateful alert rules (RATE, consecutive_events, ANOMALY),
+    # fetched from alert-rules-engine and kept ordered like the list above
+    kafka_ordered_services_url: str = "http://localhost:8002/rules/stateful-services"
+    kafka_ordered_services_refresh_seconds: float = 30.0
+    kafka_hot_key_share: float = 0.2
+    kafka_hot_key_window_seconds: float = 10.0
+    kafka_hot_key_salt_buckets: int = 8
+    kafka_hot_key_tracked: int = 64
+    
+    # Producer Delivery
+    # "sync": send_and_wait per request, "broker": queue and ack once the
+    # broker confirms, "enqueue": ack as soon as the event is queued
+    producer_delivery_mode: str = "broker"
+    producer_queue_max_size: int = 50000
+    producer_flush_max_batch: int = 1000
+    producer_max_inflight_flushes: int = 4
+    producer_retry_after_seconds: int = 1
+    
+    # Local Disk Spool (used while Kafka is unreachable or the queue is full)
+    spool_enabled: bool = True
+    spool_dir: str = "/var/spool/event-ingestion"
+    spool_segment_bytes: int = 64 * 1024 * 1024
+    spool_max_bytes: int = 2 * 1024 * 1024 * 1024
+    spool_replay_batch_size: int = 5000
+    spool_replay_interval_seconds: float = 1.0
+    
+    # Batch Ingestion
+    ingest_batch_max_items: int = 10000
+    ingest_batch_chunk_size: int = 500
+    ingest_ndjson_max_line_bytes: int = 65536
+    
+    # Idempotency (deduplication of client-supplied event IDs)
+    dedup_enabled: bool = True
+    dedup_recent_ttl_seconds: int = 600
+    dedup_recent_max_keys: int = 200000
+    dedup_horizon_seconds: int = 86400
+    dedup_filter_capacity: int = 4000000
     
     # OpenTelemetry
     jaeger_agent_host: str = "localhost"
@@ -0,0 +1,236 @@
+"""Duplicate detection for client-supplied event IDs / idempotency keys.
+
+Recent keys are held exactly in a bounded, TTL'd cache; a pair of rotating
+cuckoo filters remembers confirmed keys for a much longer horizon at about
+four bytes per key. Filter hits are treated as duplicates; with 32-bit
+fingerprints the false positive rate is on the order of 1e-9.
+
+Keys are located with the interpreter's string hash (SipHash, cached on the
+str object). It is salted per process, which is fine because the filters
+never leave the process.
+
+Deduplication is therefore per pod: both the cache and the filters live in
+this process's memory, and another replica hashes keys with its own salt.
+A retry that the load balancer routes to a different replica is not caught
+as a duplicate.
+"""
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+import random
+import time
+
+from prometheus_client.core import CounterMetricFamily, REGISTRY
+
+from .config import settings
+
+# (bucket index, fingerprint) of a key in the cuckoo filters
+Location = Tuple[int, int]
+
+
+class RecentKeyCache:
+    """Exact map of recently seen keys, bounded by TTL and entry count.
+
+    Keys leave in insertion order, which is also expiry order because every
+    entry gets the same TTL, so eviction is O(1) amortized.
+    """
+
+    def __init__(self, ttl_seconds: float, max_keys: int):
+        self.ttl = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[float, Location]]" = OrderedDict()
+        self._adds = 0
+
+    def get(self, key: str) -> Optional[Location]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: str, location: Location):
+        now = time.monotonic()
+        entries = self._entries
+        if key in entries:
+            del entries[key]
+        entries[key] = (now + self.ttl, location)
+        if len(entries) > self.max_keys:
+            entries.popitem(last=False)
+        self._adds += 1
+        if self._adds & 63 == 0:
+            self._expire(now)
+
+    def _expire(self, now: float):
+        entries = self._entries
+        while entries:
+            oldest_key, (expires, _) = next(iter(entries.items()))
+            if expires > now:
+                break
+            del entries[oldest_key]
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+
+class CuckooFilter:
+    """Cuckoo filter with 4-slot buckets of 32-bit fingerprints.
+
+    A lookup reads two buckets, each a C-level slice scan, so the cost does
+    not grow with the target false positive rate like a Bloom filter's.
+    """
+    SLOTS = 4
+    MAX_KICKS = 500
+
+    def __init__(self, capacity: int):
+        buckets = 1
+        while buckets * self.SLOTS * 0.9 < capacity:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.table = array("I", bytes(4 * buckets * self.SLOTS))
+        self.count = 0
+
+    def _alternate(self, index: int, fingerprint: int) -> int:
+        return (index ^ (fingerprint * 0x5BD1E995)) & self.mask
+
+    def contains(self, location: Location) -> bool:
+        index, fingerprint = location
+        index &= self.mask
+        start = index * 4
+        if fingerprint in self.table[start:start + 4]:
+            return True
+        start = ((index ^ (fingerprint * 0x5BD1E995)) & self.mask) * 4
+        return fingerprint in self.table[start:start + 4]
+
+    def add(self, location: Location) -> bool:
+        """Insert a key; returns False once the filter is too full to take it"""
+        index, fingerprint = location
+        index &= self.mask
+        if self._place(index, fingerprint) or self._place(self._alternate(index, fingerprint), fingerprint):
+            return True
+
+        table = self.table
+        bucket = index
+        for _ in range(self.MAX_KICKS):
+            slot = bucket * self.SLOTS + random.randrange(self.SLOTS)
+            fingerprint, table[slot] = table[slot], fingerprint
+            bucket = self._alternate(bucket, fingerprint)
+            if self._place(bucket, fingerprint):
+                return True
+        return False
+
+    def _place(self, bucket: int, fingerprint: int) -> bool:
+        start = bucket * self.SLOTS
+        slots = self.table[start:start + self.SLOTS]
+        if 0 not in slots:
+            return False
+        self.table[start + slots.index(0)] = fingerprint
+        self.count += 1
+        return True
+
+
+class RotatingCuckooFilter:
+    """Two filter generations covering the horizon between them.
+
+    The current generation is retired after half the horizon or once it
+    reaches capacity, so any key is remembered for at least half the
+    horizon and at most the full horizon.
+    """
+
+    def __init__(self, horizon_seconds: float, capacity: int):
+        self.generation_seconds = horizon_seconds / 2
+        self.capacity = capacity
+        self.current = CuckooFilter(capacity)
+        self.previous: Optional[CuckooFilter] = None
+        self._rotated_at = time.monotonic()
+
+    def _rotate(self):
+        self.previous = self.current
+        self.current = CuckooFilter(self.capacity)
+        self._rotated_at = time.monotonic()
+
+    def add(self, location: Location):
+        if (
+            self.current.count >= self.capacity
+            or time.monotonic() - self._rotated_at >= self.generation_seconds
+        ):
+            self._rotate()
+        if not self.current.add(location):
+            self._rotate()
+            self.current.add(location)
+
+    def contains(self, location: Location) -> bool:
+        if self.current.contains(location):
+            return True
+        return self.previous is not None and self.previous.contains(location)
+
+
+def _locate(key: str) -> Location:
+    h = hash(key) & 0xFFFFFFFFFFFFFFFF
+    return h & 0xFFFFFFFF, (h >> 32) or 1
+
+
+class Deduplicator:
+    """Reserve, confirm or release idempotency keys.
+
+    `seen()` reserves a new key in the recent cache straight away so
+    concurrent retries of an in-flight event are caught. `confirm()` adds
+    it to the long-horizon filter once delivery succeeded, and `release()`
+    forgets it after a failed delivery so the client can retry.
+    """
+
+    def __init__(self):
+        self.recent = RecentKeyCache(
+            settings.dedup_recent_ttl_seconds,
+            settings.dedup_recent_max_keys
+        )
+        self.history = RotatingCuckooFilter(
+            settings.dedup_horizon_seconds,
+            settings.dedup_filter_capacity
+        )
+        # Plain ints on the hot path; exported by DedupCollector at scrape time
+        self.unique = 0
+        self.recent_hits = 0
+        self.filter_hits = 0
+
+    def seen(self, key: str) -> bool:
+        if self.recent.get(key) is not None:
+            self.recent_hits += 1
+            return True
+        location = _locate(key)
+        if self.history.contains(location):
+            self.filter_hits += 1
+            return True
+        self.recent.add(key, location)
+        self.unique += 1
+        return False
+
+    def confirm(self, key: str):
+        location = self.recent.get(key)
+        self.history.add(location if location is not None else _locate(key))
+
+    def release(self, key: str):
+        self.recent.discard(key)
+
+
+class DedupCollector:
+    """Exports dedup counters without touching Prometheus on every lookup"""
+
+    def __init__(self, deduplicator: Deduplicator):
+        self.deduplicator = deduplicator
+
+    def collect(self):
+        checks = CounterMetricFamily(
+            "event_dedup_checks",
+            "Idempotency key lookups by outcome",
+            labels=["result"]
+        )
+        checks.add_metric(["unique"], self.deduplicator.unique)
+        checks.add_metric(["recent"], self.deduplicator.recent_hits)
+        checks.add_metric(["filter"], self.deduplicator.filter_hits)
+        yield checks
+
+
+deduplicator = Deduplicator()
+REGISTRY.register(DedupCollector(deduplicator))
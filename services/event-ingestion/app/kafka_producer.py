@@ -1,52 +1,465 @@
 from aiokafka import AIOKafkaProducer
-import json
+from prometheus_client import Counter, Gauge, Histogram
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
 import logging
+import time
 from .config import settings
+from .serializers import get_serializer
+from .partitioning import Partitioner, HeavyHitterSketch, PARTITION_STRATEGY_HEADER
+from .spool import DiskSpool, SpoolRecord
 
 logger = logging.getLogger(__name__)
 
+DELIVERY_MODES = ("sync", "broker", "enqueue")
+
+PRODUCER_QUEUE_DEPTH = Gauge(
+    "event_producer_queue_depth",
+    "Events waiting in the producer queue"
+)
+
+PRODUCER_FLUSH_DURATION = Histogram(
+    "event_producer_flush_duration_seconds",
+    "Time from handing a batch to the producer until the broker acknowledged it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+PRODUCER_FLUSH_BATCH_SIZE = Histogram(
+    "event_producer_flush_batch_size",
+    "Events per producer flush",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+
+PRODUCER_QUEUE_REJECTED = Counter(
+    "event_producer_queue_rejected_total",
+    "Events rejected because the producer queue was full"
+)
+
+PRODUCER_DELIVERY_FAILURES = Counter(
+    "event_producer_delivery_failures_total",
+    "Events the broker failed to acknowledge"
+)
+
+PRODUCER_HEALTHY = Gauge(
+    "event_producer_healthy",
+    "1 while events go straight to Kafka, 0 while they are being spooled"
+)
+
+SPOOL_PENDING_EVENTS = Gauge(
+    "event_spool_pending_events",
+    "Events in the disk spool waiting to be replayed"
+)
+
+SPOOL_DISK_BYTES = Gauge(
+    "event_spool_disk_bytes",
+    "Disk space allocated to spool segments"
+)
+
+SPOOL_EVENTS_WRITTEN = Counter(
+    "event_spool_written_total",
+    "Events written to the disk spool"
+)
+
+SPOOL_EVENTS_REPLAYED = Counter(
+    "event_spool_replayed_total",
+    "Events replayed from the disk spool to Kafka"
+)
+
+SPOOL_EVENTS_DROPPED = Counter(
+    "event_spool_dropped_total",
+    "Spooled events discarded because the spool reached its size limit"
+)
+
+SPOOL_REPLAY_DURATION = Histogram(
+    "event_spool_replay_batch_duration_seconds",
+    "Time to replay one batch from the disk spool",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+
+class ProducerQueueFull(Exception):
+    """Raised when the producer queue cannot take more events"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("Producer queue is full")
+        self.retry_after = retry_after
+
+
+class _PendingEvent:
+    __slots__ = ("record", "waiter")
+    
+    def __init__(self, record: SpoolRecord, waiter):
+        self.record = record
+        self.waiter = waiter
+
 
 class KafkaProducerManager:
-    def __init__(self):
+    def __init__(self, producer_factory: Callable[..., Any] = AIOKafkaProducer):
+        # Anything with AIOKafkaProducer's start/stop/send/send_and_wait,
+        # e.g. the in-process fake broker used by the benchmarks
+        self.producer_factory = producer_factory
         self.producer: AIOKafkaProducer = None
+        self.delivery_mode = settings.producer_delivery_mode
+        if self.delivery_mode not in DELIVERY_MODES:
+            raise ValueError(f"Unknown producer delivery mode: {self.delivery_mode}")
+        self.serializer = get_serializer(settings.kafka_serializer)
+        self.healthy = False
+        self.spool: Optional[DiskSpool] = None
+        self.partitioner = Partitioner(
+            settings.kafka_partition_strategy,
+            metadata_field=settings.kafka_partition_metadata_field,
+            salt_buckets=settings.kafka_hot_key_salt_buckets,
+            ordered_services={
+                service.strip()
+                for service in settings.kafka_ordered_services.split(",")
+                if service.strip()
+            },
+            sketch=HeavyHitterSketch(
+                settings.kafka_hot_key_tracked,
+                window_seconds=settings.kafka_hot_key_window_seconds,
+                hot_share=settings.kafka_hot_key_share
+            ),
+            ordered_services_url=settings.kafka_ordered_services_url
+        )
+        # Header lists are shared between messages, one per applied strategy
+        self._headers: Dict[str, list] = {}
+        self._queue: asyncio.Queue = None
+        self._flusher: asyncio.Task = None
+        self._replayer: asyncio.Task = None
+        self._ordered_refresher: asyncio.Task = None
+        self._inflight: asyncio.Semaphore = None
+        self._flush_tasks = set()
         
     async def start(self):
-        """Start Kafka producer"""
+        """Start Kafka producer, falling back to the disk spool if Kafka is down"""
+        if settings.spool_enabled:
+            self._open_spool()
+        
         try:
-            self.producer = AIOKafkaProducer(
-                bootstrap_servers=settings.kafka_bootstrap_servers,
-                client_id=settings.kafka_client_id,
-                acks=settings.kafka_acks,
-                compression_type=settings.kafka_compression_type,
-                max_batch_size=settings.kafka_max_batch_size,
-                linger_ms=settings.kafka_linger_ms,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8')
-            )
-            await self.producer.start()
-            logger.info("Kafka producer started successfully")
+            await self._start_producer()
         except Exception as e:
             logger.error(f"Failed to start Kafka producer: {e}")
-            raise
+            if self.spool is None:
+                raise
+            logger.warning("Kafka unavailable, spooling events to disk until it recovers")
+        
+        if self.delivery_mode != "sync":
+            self._queue = asyncio.Queue(maxsize=settings.producer_queue_max_size)
+            self._inflight = asyncio.Semaphore(settings.producer_max_inflight_flushes)
+            PRODUCER_QUEUE_DEPTH.set_function(self._queue.qsize)
+            self._flusher = asyncio.create_task(self._flush_loop())
+            logger.info(f"Producer queue started in '{self.delivery_mode}' delivery mode")
+        if self.spool is not None:
+            self._replayer = asyncio.create_task(self._replay_loop())
+        if self.partitioner.strategy != "service" and self.partitioner.ordered_services_url:
+            self._ordered_refresher = asyncio.create_task(
+                self.partitioner.refresh_loop(settings.kafka_ordered_services_refresh_seconds)
+            )
     
     async def stop(self):
         """Stop Kafka producer"""
+        if self._ordered_refresher:
+            self._ordered_refresher.cancel()
+            await asyncio.gather(self._ordered_refresher, return_exceptions=True)
+            self._ordered_refresher = None
+        if self._replayer:
+            self._replayer.cancel()
+            await asyncio.gather(self._replayer, return_exceptions=True)
+            self._replayer = None
+        if self._flusher:
+            # Let the flusher drain whatever is still queued before stopping
+            await self._queue.join()
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, *self._flush_tasks, return_exceptions=True)
+            self._flusher = None
         if self.producer:
             await self.producer.stop()
             logger.info("Kafka producer stopped")
+        if self.spool is not None:
+            self.spool.close()
     
-    async def send_event(self, topic: str, event: dict, key: str = None):
-        """Send event to Kafka topic"""
+    async def send_event(self, topic: str, event: Any):
+        """Send event (a models.EventRecord) to Kafka topic"""
+        record = self._encode(topic, event)
+        if self.delivery_mode != "sync":
+            waiters = self._enqueue([record])
+            if waiters:
+                await waiters[0]
+            return
+        
+        if self._spooling:
+            self._spool([record])
+            return
         try:
-            key_bytes = key.encode('utf-8') if key else None
             await self.producer.send_and_wait(
                 topic,
-                value=event,
-                key=key_bytes
+                value=record[3],
+                key=record[1],
+                headers=record[2]
             )
-            logger.debug(f"Event sent to topic {topic}: {event.get('id')}")
+            logger.debug(f"Event sent to topic {topic}: {event.id}")
         except Exception as e:
             logger.error(f"Failed to send event to Kafka: {e}")
+            if self.spool is None:
+                raise
+            self._mark_unhealthy()
+            self._spool([record])
+    
+    async def send_batch(
+        self,
+        topic: str,
+        events: List[Any]
+    ) -> List[Optional[Exception]]:
+        """Send a batch of EventRecords and wait for all deliveries.
+        
+        Returns one entry per event: None on success, or the exception that
+        failed that event, so a single bad delivery does not fail the batch.
+        Raises ProducerQueueFull if the batch does not fit in the queue.
+        Events spooled to disk count as delivered.
+        """
+        records = [self._encode(topic, event) for event in events]
+        if self.delivery_mode != "sync":
+            waiters = self._enqueue(records)
+            if not waiters:
+                return [None] * len(records)
+            return list(await asyncio.gather(*waiters, return_exceptions=True))
+        
+        if self._spooling:
+            self._spool(records)
+            return [None] * len(records)
+        
+        results = await self._send_records(records)
+        failed = [i for i, r in enumerate(results) if r is not None]
+        if failed:
+            logger.error(f"Failed to send {len(failed)}/{len(records)} events to Kafka")
+            if self.spool is not None:
+                self._mark_unhealthy()
+                self._spool([records[i] for i in failed])
+                return [None] * len(records)
+        logger.debug(f"Batch of {len(records)} events sent to topic {topic}")
+        return results
+    
+    @property
+    def _spooling(self) -> bool:
+        return self.spool is not None and not self.healthy
+    
+    def _encode(self, topic: str, event: Any) -> SpoolRecord:
+        key, strategy = self.partitioner.key_for(event)
+        headers = self._headers.get(strategy)
+        if headers is None:
+            headers = self._headers[strategy] = [
+                *self.serializer.headers,
+                (PARTITION_STRATEGY_HEADER, strategy.encode('utf-8'))
+            ]
+        return topic, key.encode('utf-8'), headers, self.serializer.encode_record(event)
+    
+    async def _start_producer(self):
+        producer = self.producer_factory(
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            client_id=settings.kafka_client_id,
+            acks=settings.kafka_acks,
+            compression_type=settings.kafka_compression_type,
+            max_batch_size=settings.kafka_max_batch_size,
+            linger_ms=settings.kafka_linger_ms
+        )
+        try:
+            await producer.start()
+        except Exception:
+            await producer.stop()
             raise
+        self.producer = producer
+        logger.info("Kafka producer started successfully")
+        # Events left in the spool go out before any new ones
+        self._resume_if_drained()
+    
+    async def _send_records(self, records: List[SpoolRecord]) -> List[Optional[Exception]]:
+        """Hand records to the producer and gather the delivery outcomes"""
+        futures = []
+        for topic, key, headers, value in records:
+            try:
+                future = await self.producer.send(topic, value=value, key=key, headers=headers)
+            except Exception as e:
+                future = asyncio.get_running_loop().create_future()
+                future.set_exception(e)
+            futures.append(future)
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        return [o if isinstance(o, Exception) else None for o in outcomes]
+    
+    def _enqueue(self, records: List[SpoolRecord]) -> list:
+        """Queue records for the flusher, all or nothing.
+        
+        Returns the futures resolved on broker acknowledgement in "broker"
+        mode, or an empty list in "enqueue" mode or when the records went to
+        the disk spool instead. An overflow with a spool moves the queued
+        records to it and routes later traffic there as well, until the
+        replay loop has drained it, so no live event overtakes a spooled one.
+        """
+        if self._spooling:
+            self._spool(records)
+            return []
+        if self._queue.maxsize - self._queue.qsize() < len(records):
+            if self.spool is not None:
+                self._mark_unhealthy("Producer queue full")
+                self._spool_queued()
+                self._spool(records)
+                return []
+            PRODUCER_QUEUE_REJECTED.inc(len(records))
+            raise ProducerQueueFull(settings.producer_retry_after_seconds)
+        
+        loop = asyncio.get_running_loop()
+        waiters = []
+        for record in records:
+            waiter = None
+            if self.delivery_mode == "broker":
+                waiter = loop.create_future()
+                waiters.append(waiter)
+            self._queue.put_nowait(_PendingEvent(record, waiter))
+        return waiters
+    
+    async def _flush_loop(self):
+        """Drain the queue in batches and hand them to the producer"""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < settings.producer_flush_max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            await self._inflight.acquire()
+            task = asyncio.create_task(self._flush(batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush(self, batch: List[_PendingEvent]):
+        started = time.perf_counter()
+        try:
+            if self._spooling:
+                outcomes = [None] * len(batch)
+                self._spool([pending.record for pending in batch])
+            else:
+                outcomes = await self._send_records([pending.record for pending in batch])
+            
+            failed = [pending for pending, error in zip(batch, outcomes) if error is not None]
+            if failed:
+                PRODUCER_DELIVERY_FAILURES.inc(len(failed))
+                logger.error(f"Failed to deliver {len(failed)}/{len(batch)} queued events to Kafka")
+                if self.spool is not None:
+                    self._mark_unhealthy()
+                    self._spool([pending.record for pending in failed])
+                    outcomes = [None] * len(batch)
+            
+            for pending, error in zip(batch, outcomes):
+                if pending.waiter is not None and not pending.waiter.done():
+                    if error is None:
+                        pending.waiter.set_result(None)
+                    else:
+                        pending.waiter.set_exception(error)
+            
+            PRODUCER_FLUSH_BATCH_SIZE.observe(len(batch))
+            PRODUCER_FLUSH_DURATION.observe(time.perf_counter() - started)
+        except Exception as e:
+            for pending in batch:
+                if pending.waiter is not None and not pending.waiter.done():
+                    pending.waiter.set_exception(e)
+            logger.error(f"Failed to flush queued events: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            self._inflight.release()
+    
+    def _open_spool(self):
+        spool = DiskSpool(
+            settings.spool_dir,
+            segment_bytes=settings.spool_segment_bytes,
+            max_bytes=settings.spool_max_bytes
+        )
+        try:
+            spool.open()
+        except OSError as e:
+            logger.error(f"Failed to open disk spool at {settings.spool_dir}, spooling disabled: {e}")
+            return
+        self.spool = spool
+        SPOOL_PENDING_EVENTS.set_function(lambda: spool.pending_records)
+        SPOOL_DISK_BYTES.set_function(lambda: spool.disk_bytes)
+    
+    def _spool(self, records: List[SpoolRecord]):
+        dropped = self.spool.dropped_records
+        self.spool.append(records)
+        SPOOL_EVENTS_WRITTEN.inc(len(records))
+        if self.spool.dropped_records > dropped:
+            SPOOL_EVENTS_DROPPED.inc(self.spool.dropped_records - dropped)
+    
+    def _spool_queued(self):
+        """Move records still waiting for the flusher to the spool, in order"""
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if not batch:
+            return
+        self._spool([pending.record for pending in batch])
+        for pending in batch:
+            if pending.waiter is not None and not pending.waiter.done():
+                pending.waiter.set_result(None)
+            self._queue.task_done()
+    
+    def _set_healthy(self, healthy: bool):
+        self.healthy = healthy
+        PRODUCER_HEALTHY.set(1 if healthy else 0)
+    
+    def _mark_unhealthy(self, reason: str = "Kafka deliveries failing"):
+        if self.healthy:
+            logger.warning(f"{reason}, spooling events to disk")
+        self._set_healthy(False)
+    
+    async def _replay_loop(self):
+        """Reconnect to Kafka and drain the spool in large batches.
+        
+        A replay batch doubles as the health probe. Live traffic keeps
+        going to the spool, behind the events already there, until a fully
+        acknowledged batch leaves it empty; only then do direct sends resume,
+        so nothing overtakes an older spooled event.
+        """
+        while True:
+            try:
+                if self.producer is None:
+                    await self._start_producer()
+                self.spool.flush()
+                replayed = await self._replay_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Spool replay attempt failed: {e}")
+                replayed = 0
+            if not replayed:
+                await asyncio.sleep(settings.spool_replay_interval_seconds)
+    
+    async def _replay_batch(self) -> int:
+        records, position = self.spool.read_batch(settings.spool_replay_batch_size)
+        if not records:
+            self._resume_if_drained()
+            return 0
+        
+        started = time.perf_counter()
+        results = await self._send_records(records)
+        failed = sum(1 for r in results if r is not None)
+        if failed:
+            # Leave the batch in the spool; delivered records may be resent
+            self._mark_unhealthy()
+            logger.warning(f"Spool replay failed for {failed}/{len(records)} events, will retry")
+            return 0
+        
+        self.spool.commit(position, len(records))
+        SPOOL_EVENTS_REPLAYED.inc(len(records))
+        SPOOL_REPLAY_DURATION.observe(time.perf_counter() - started)
+        self._resume_if_drained()
+        return len(records)
+    
+    def _resume_if_drained(self):
+        if self.healthy or self.producer is None:
+            return
+        if self.spool is not None and not self.spool.drained:
+            return
+        if self.spool is not None:
+            logger.info("Spool drained, sending events to Kafka directly")
+        self._set_healthy(True)
 
 
 kafka_producer = KafkaProducerManager()
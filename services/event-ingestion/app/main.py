@@ -1,12 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import make_asgi_app, Counter, Histogram
+from pydantic import ValidationError
+from collections import Counter as Tally
+from typing import List, Optional, Tuple
+import json
 import logging
+import time
 from pythonjsonlogger import jsonlogger
 
 from .config import settings
-from .models import EventCreate, Event, EventResponse
-from .kafka_producer import kafka_producer
+from .models import (
+    EventRecord,
+    EventResponse,
+    BatchItemError,
+    BatchEventResponse,
+    EVENT_RECORD_ADAPTER,
+    EVENT_RECORDS_ADAPTER,
+)
+from .kafka_producer import kafka_producer, ProducerQueueFull
+from .dedup import deduplicator
 
 # Configure structured logging
 logHandler = logging.StreamHandler()
@@ -36,6 +49,15 @@ INGESTION_DURATION = Histogram(
     ["service"]
 )
 
+INGESTION_BATCH_SIZE = Histogram(
+    "event_ingestion_batch_size",
+    "Number of events per batch ingestion request",
+    ["mode"],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -55,18 +77,41 @@ async def health_check():
 
 
 @app.post("/events", response_model=EventResponse, status_code=201)
-async def ingest_event(event_create: EventCreate):
-    """Ingest an event and publish to Kafka"""
+async def ingest_event(
+    event: EventRecord,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=128)
+):
+    """Ingest an event and publish to Kafka
+    
+    A client-supplied event ID (or Idempotency-Key header) makes retries
+    safe: repeats are answered with 200 and status "duplicate".
+    """
+    if event.id is None and idempotency_key:
+        event.id = idempotency_key
+    client_id = event.finalize(int(time.time()))
+    dedup_key = event.id if client_id and settings.dedup_enabled else None
+    if dedup_key is not None and deduplicator.seen(dedup_key):
+        response.status_code = 200
+        return EventResponse(
+            id=dedup_key,
+            status="duplicate",
+            message="Event already ingested"
+        )
+    
     try:
-        # Create event with ID
-        event = Event.from_create(event_create)
-        
         # Send to Kafka
-        await kafka_producer.send_event(
-            topic=settings.kafka_topic_events,
-            event=event.model_dump(),
-            key=event.service  # Partition by service name
-        )
+        try:
+            await kafka_producer.send_event(
+                topic=settings.kafka_topic_events,
+                event=event  # Partition key chosen by kafka_producer.partitioner
+            )
+        except Exception:
+            if dedup_key is not None:
+                deduplicator.release(dedup_key)
+            raise
+        if dedup_key is not None:
+            deduplicator.confirm(dedup_key)
         
         # Update metrics
         EVENTS_INGESTED.labels(
@@ -83,17 +128,266 @@ async def ingest_event(event_create: EventCreate):
             }
         )
         
+        if kafka_producer.delivery_mode == "enqueue":
+            return EventResponse(
+                id=event.id,
+                status="accepted",
+                message="Event queued for delivery"
+            )
         return EventResponse(
             id=event.id,
             status="success",
             message="Event ingested successfully"
         )
         
+    except ProducerQueueFull as e:
+        raise _queue_full_error(e)
     except Exception as e:
         logger.error(f"Error ingesting event: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _queue_full_error(error: ProducerQueueFull) -> HTTPException:
+    logger.warning("Producer queue full, rejecting request")
+    return HTTPException(
+        status_code=429,
+        detail="Ingestion queue is full, retry later",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'event'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+class _BatchOutcome:
+    """Per-item results collected while a batch is processed"""
+    
+    def __init__(self):
+        self.accepted: List[str] = []
+        self.duplicates: List[str] = []
+        self.errors: List[BatchItemError] = []
+
+
+# (index in the batch, event, whether its ID came from the client)
+_ChunkItem = Tuple[int, EventRecord, bool]
+
+
+async def _publish_chunk(chunk: List[_ChunkItem], outcome: _BatchOutcome):
+    """Publish a chunk of validated events and record per-item outcomes.
+    
+    A full producer queue rejects the whole request with 429 while nothing
+    has been accepted yet, so clients can simply retry the batch. Once part
+    of the batch is in, the rejected chunk is reported per item instead.
+    """
+    try:
+        results = await kafka_producer.send_batch(
+            topic=settings.kafka_topic_events,
+            events=[event for _, event, _ in chunk]
+        )
+    except ProducerQueueFull as e:
+        if not outcome.accepted:
+            _release_chunk(chunk)
+            raise _queue_full_error(e)
+        results = [e] * len(chunk)
+    
+    ingested = Tally()
+    for (index, event, deduplicated), error in zip(chunk, results):
+        if error is None:
+            outcome.accepted.append(event.id)
+            ingested[(event.service, event.status.value)] += 1
+            if deduplicated:
+                deduplicator.confirm(event.id)
+        else:
+            outcome.errors.append(BatchItemError(index=index, error=f"publish failed: {error}"))
+            if deduplicated:
+                deduplicator.release(event.id)
+    
+    for (service, status), count in ingested.items():
+        EVENTS_INGESTED.labels(service=service, status=status).inc(count)
+
+
+def _admit_record(
+    index: int,
+    event: EventRecord,
+    now: int,
+    outcome: _BatchOutcome
+) -> Optional[_ChunkItem]:
+    """Fill in defaults for a validated record and filter out duplicate client IDs"""
+    deduplicated = event.finalize(now) and settings.dedup_enabled
+    if deduplicated and deduplicator.seen(event.id):
+        outcome.duplicates.append(event.id)
+        return None
+    return index, event, deduplicated
+
+
+def _validate_item(index: int, validate, data, outcome: _BatchOutcome) -> Optional[EventRecord]:
+    try:
+        return validate(data)
+    except ValidationError as e:
+        outcome.errors.append(BatchItemError(index=index, error=_format_validation_error(e)))
+        return None
+
+
+def _release_chunk(chunk: List[_ChunkItem]):
+    """Forget reserved client IDs of events that were never published"""
+    for _, event, deduplicated in chunk:
+        if deduplicated:
+            deduplicator.release(event.id)
+
+
+async def _ingest_json_array(request: Request, outcome: _BatchOutcome) -> int:
+    """Validate a JSON array body and publish it in chunks.
+    
+    The whole array is validated in a single pydantic-core pass straight
+    from the raw bytes. Only when that fails is the body re-parsed and each
+    item validated on its own, to report per-item errors.
+    """
+    body = await request.body()
+    try:
+        events = EVENT_RECORDS_ADAPTER.validate_json(body)
+    except ValidationError:
+        events = None
+    
+    if events is None:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array of events")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array of events")
+        items = payload
+    else:
+        items = events
+    if len(items) > settings.ingest_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.ingest_batch_max_items} events"
+        )
+    
+    now = int(time.time())
+    chunk: List[_ChunkItem] = []
+    for index, item in enumerate(items):
+        event = item if events is not None else _validate_item(
+            index, EVENT_RECORD_ADAPTER.validate_python, item, outcome
+        )
+        if event is not None:
+            admitted = _admit_record(index, event, now, outcome)
+            if admitted is not None:
+                chunk.append(admitted)
+        if len(chunk) >= settings.ingest_batch_chunk_size:
+            await _publish_chunk(chunk, outcome)
+            chunk = []
+    if chunk:
+        await _publish_chunk(chunk, outcome)
+    return len(items)
+
+
+async def _ingest_ndjson(request: Request, outcome: _BatchOutcome) -> int:
+    """Validate and publish an NDJSON body as it streams in.
+    
+    Lines are published in chunks of `ingest_batch_chunk_size` while the rest
+    of the body is still being received, so memory stays bounded by the chunk
+    size plus the accepted ID list. A line over `ingest_ndjson_max_line_bytes`
+    is reported as an item error and ends the batch: earlier chunks may
+    already be published, so the results so far are returned, not a 413.
+    """
+    chunk: List[_ChunkItem] = []
+    buffer = b""
+    index = 0
+    
+    async def handle_line(line: bytes) -> bool:
+        nonlocal chunk, index
+        line = line.strip()
+        if not line:
+            return True
+        if index >= settings.ingest_batch_max_items:
+            outcome.errors.append(BatchItemError(
+                index=index,
+                error=f"batch exceeds {settings.ingest_batch_max_items} events; remaining lines ignored"
+            ))
+            return False
+        if len(line) > settings.ingest_ndjson_max_line_bytes:
+            outcome.errors.append(BatchItemError(
+                index=index,
+                error=f"line exceeds {settings.ingest_ndjson_max_line_bytes} bytes; remaining lines ignored"
+            ))
+            return False
+        event = _validate_item(index, EVENT_RECORD_ADAPTER.validate_json, line, outcome)
+        if event is not None:
+            admitted = _admit_record(index, event, int(time.time()), outcome)
+            if admitted is not None:
+                chunk.append(admitted)
+        index += 1
+        if len(chunk) >= settings.ingest_batch_chunk_size:
+            await _publish_chunk(chunk, outcome)
+            chunk = []
+        return True
+    
+    open_stream = True
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            open_stream = await handle_line(line)
+            if not open_stream:
+                break
+        if open_stream and len(buffer) > settings.ingest_ndjson_max_line_bytes:
+            # Stop buffering an unterminated line that is already too long
+            open_stream = await handle_line(buffer)
+        if not open_stream:
+            break
+    
+    if open_stream and buffer:
+        await handle_line(buffer)
+    if chunk:
+        await _publish_chunk(chunk, outcome)
+    return index
+
+
+@app.post("/events/batch", response_model=BatchEventResponse)
+async def ingest_events_batch(request: Request):
+    """Ingest a batch of events from a JSON array or an NDJSON stream.
+    
+    Invalid items and failed deliveries are reported per item instead of
+    failing the whole batch; items whose client ID was already ingested are
+    listed as duplicates.
+    """
+    outcome = _BatchOutcome()
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(NDJSON_MEDIA_TYPE):
+        mode = "ndjson"
+        received = await _ingest_ndjson(request, outcome)
+    else:
+        mode = "json"
+        received = await _ingest_json_array(request, outcome)
+    
+    INGESTION_BATCH_SIZE.labels(mode=mode).observe(received)
+    logger.info(
+        "Event batch ingested",
+        extra={
+            "mode": mode,
+            "received": received,
+            "accepted": len(outcome.accepted),
+            "duplicates": len(outcome.duplicates),
+            "errors": len(outcome.errors)
+        }
+    )
+    
+    return BatchEventResponse(
+        accepted=outcome.accepted,
+        duplicates=outcome.duplicates,
+        errors=outcome.errors,
+        accepted_count=len(outcome.accepted),
+        duplicate_count=len(outcome.duplicates),
+        error_count=len(outcome.errors)
+    )
+
+
 # Mount Prometheus metrics endpoint
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
@@ -0,0 +1,159 @@
+"""Partition key selection for the service-events topic.
+
+Strategies (``kafka_partition_strategy``):
+
+- ``service``: key by service name, so each service's events stay in order
+  on one partition. This is the original behaviour.
+- ``salted``: like ``service``, but services that a heavy-hitter sketch
+  detects as hot are spread over ``kafka_hot_key_salt_buckets`` sub-keys.
+  The salt is derived from a metadata field (``kafka_partition_metadata_field``,
+  e.g. store_id) when present, so events of one (service, store) pair keep
+  their order.
+- ``metadata``: key by the configured metadata field, falling back to the
+  service name when the field is missing.
+
+Both of those split a service across partitions, which the alert rules
+engine cannot allow for services with stateful rules: their RATE windows,
+run lengths and ANOMALY baselines live in the one partition the service
+maps to. Services in ``kafka_ordered_services`` and those the rules engine
+lists at ``kafka_ordered_services_url`` are therefore always keyed by
+service. Until that list has been fetched once, every service is.
+
+The strategy applied to each message is recorded in the
+``partition-strategy`` header so consumers know whether per-service ordering
+holds for it.
+"""
+from typing import Dict, Iterable, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+import urllib.request
+import zlib
+
+from prometheus_client import Counter, Gauge
+
+PARTITION_STRATEGY_HEADER = "partition-strategy"
+PARTITION_STRATEGIES = ("service", "salted", "metadata")
+
+HOT_SERVICES = Gauge(
+    "event_partition_hot_services",
+    "Services currently detected as hot and salted across partitions"
+)
+
+logger = logging.getLogger(__name__)
+
+SALTED_EVENTS = Counter(
+    "event_partition_salted_total",
+    "Events whose partition key was salted because their service is hot",
+    ["service"]
+)
+
+
+class HeavyHitterSketch:
+    """Space-Saving top-k counter over tumbling windows.
+
+    At the end of each window, every tracked key holding at least
+    `hot_share` of that window's traffic becomes hot for the next window.
+    Memory is bounded by `capacity` counters no matter how many distinct
+    keys are seen.
+    """
+
+    def __init__(self, capacity: int, window_seconds: float, hot_share: float):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.hot_share = hot_share
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+        self.hot: Set[str] = set()
+        self._window_end = time.monotonic() + window_seconds
+
+    def observe(self, key: str) -> bool:
+        """Count one occurrence of key; returns True if key is currently hot"""
+        if time.monotonic() >= self._window_end:
+            self._roll()
+        counts = self.counts
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + 1
+        elif len(counts) < self.capacity:
+            counts[key] = 1
+        else:
+            # Space-Saving: the newcomer inherits the smallest counter
+            victim = min(counts, key=counts.__getitem__)
+            counts[key] = counts.pop(victim) + 1
+        self.total += 1
+        return key in self.hot
+
+    def _roll(self):
+        threshold = self.total * self.hot_share
+        self.hot = {key for key, count in self.counts.items() if count >= threshold} if self.total else set()
+        HOT_SERVICES.set(len(self.hot))
+        self.counts = {}
+        self.total = 0
+        self._window_end = time.monotonic() + self.window_seconds
+
+
+class Partitioner:
+    def __init__(
+        self,
+        strategy: str,
+        metadata_field: str,
+        salt_buckets: int,
+        ordered_services: Set[str],
+        sketch: Optional[HeavyHitterSketch] = None,
+        ordered_services_url: str = ""
+    ):
+        if strategy not in PARTITION_STRATEGIES:
+            raise ValueError(f"Unknown partition strategy: {strategy}")
+        self.strategy = strategy
+        self.metadata_field = metadata_field
+        self.salt_buckets = salt_buckets
+        self.configured_services = set(ordered_services)
+        self.ordered_services = set(ordered_services)
+        self.sketch = sketch
+        self.ordered_services_url = ordered_services_url
+        # No service is split until the rules engine's list is known
+        self.splitting = strategy == "service" or not ordered_services_url
+
+    def set_stateful_services(self, services: Iterable[str]):
+        """Keep these services, besides the configured ones, on one partition"""
+        self.ordered_services = self.configured_services | set(services)
+        self.splitting = True
+
+    async def refresh_loop(self, interval: float):
+        """Poll the rules engine for services with stateful rules"""
+        while True:
+            try:
+                services = await asyncio.to_thread(self._fetch_stateful_services)
+                self.set_stateful_services(services)
+            except Exception as e:
+                # Keep the last list; before the first one nothing is split
+                logger.warning(f"Failed to fetch stateful rule services: {e}")
+            await asyncio.sleep(interval)
+
+    def _fetch_stateful_services(self) -> Set[str]:
+        with urllib.request.urlopen(self.ordered_services_url, timeout=10) as response:
+            return set(json.load(response))
+
+    def key_for(self, event) -> Tuple[str, str]:
+        """Return (partition key, strategy applied) for an EventRecord"""
+        service = event.service
+        if self.strategy == "service":
+            return service, "service"
+
+        if self.strategy == "metadata":
+            if not self.splitting or service in self.ordered_services:
+                return service, "service"
+            value = event.metadata.get(self.metadata_field) if event.metadata else None
+            if value is None:
+                return service, "service"
+            return f"{self.metadata_field}:{value}", f"metadata:{self.metadata_field}"
+
+        if not self.sketch.observe(service) or not self.splitting or service in self.ordered_services:
+            return service, "service"
+        value = event.metadata.get(self.metadata_field) if event.metadata else None
+        sub_key = str(value) if value is not None else event.id
+        salt = zlib.crc32(sub_key.encode("utf-8")) % self.salt_buckets
+        SALTED_EVENTS.labels(service=service).inc()
+        return f"{service}#{salt}", "salted"
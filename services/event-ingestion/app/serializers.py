@@ -0,0 +1,295 @@
+"""Wire formats for events published to Kafka.
+
+Every message carries its format in the ``content-format`` header so
+consumers can decode a topic that mixes formats during a rollout. Messages
+without the header are treated as JSON, which is what older producers wrote.
+"""
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional fast path
+    msgpack = None
+
+FORMAT_HEADER = "content-format"
+
+# Binary layout, version 1 (little endian):
+#   B version, B flags, q timestamp, d latency_ms, B status
+#   id:         16 raw UUID bytes if FLAG_UUID_ID, else H length + UTF-8
+#   service:    H length + UTF-8
+#   error_code: H length + UTF-8, only if FLAG_ERROR_CODE
+#   metadata:   I length + JSON bytes, only if FLAG_METADATA
+BINARY_VERSION = 1
+FLAG_LATENCY = 0x01
+FLAG_ERROR_CODE = 0x02
+FLAG_METADATA = 0x04
+FLAG_UUID_ID = 0x08
+
+_FIXED = struct.Struct("<BBqdB")
+_SHORT = struct.Struct("<H")
+_LONG = struct.Struct("<I")
+
+STATUS_CODES = {"OK": 0, "ERROR": 1, "WARNING": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+def _dumps_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _dumps_blob(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _dumps_json(value)
+
+
+def _loads_blob(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _record_dict(record: Any) -> Dict[str, Any]:
+    return {name: getattr(record, name) for name in record.__slots__}
+
+
+class Serializer:
+    """Encodes events to bytes; `wire_format` goes in the Kafka header"""
+    name: str = ""
+    wire_format: str = ""
+    
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+    
+    def encode_record(self, record: Any) -> bytes:
+        """Encode a slotted record such as models.EventRecord"""
+        return self.encode(_record_dict(record))
+    
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    @property
+    def headers(self) -> Sequence[Tuple[str, bytes]]:
+        return [(FORMAT_HEADER, self.wire_format.encode("ascii"))]
+
+
+class JsonSerializer(Serializer):
+    name = "json"
+    wire_format = "json"
+    
+    def encode(self, event):
+        return json.dumps(event).encode("utf-8")
+    
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class OrjsonSerializer(Serializer):
+    """Same JSON wire format as JsonSerializer, produced several times faster"""
+    name = "orjson"
+    wire_format = "json"
+    
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("The 'orjson' serializer requires the orjson package")
+    
+    def encode(self, event):
+        return orjson.dumps(event)
+    
+    def encode_record(self, record):
+        # orjson serializes slotted dataclasses natively, no dict needed
+        return orjson.dumps(record)
+    
+    def decode(self, payload):
+        return orjson.loads(payload)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+    wire_format = "msgpack"
+    
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("The 'msgpack' serializer requires the msgpack package")
+    
+    def encode(self, event):
+        return msgpack.packb(event)
+    
+    def decode(self, payload):
+        return msgpack.unpackb(payload)
+
+
+class BinarySerializer(Serializer):
+    """Compact fixed-field encoding with metadata carried as an opaque JSON blob"""
+    name = "binary"
+    wire_format = "binary"
+    
+    def encode(self, event):
+        return _pack_binary(
+            event["id"],
+            event["service"],
+            event["timestamp"],
+            event.get("latency_ms"),
+            event.get("error_code"),
+            event["status"],
+            event.get("metadata")
+        )
+    
+    def encode_record(self, record):
+        return _pack_binary(
+            record.id,
+            record.service,
+            record.timestamp,
+            record.latency_ms,
+            record.error_code,
+            record.status,
+            record.metadata
+        )
+    
+    def decode(self, payload):
+        version, flags, timestamp, latency, status = _FIXED.unpack_from(payload, 0)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary event version: {version}")
+        offset = _FIXED.size
+        
+        if flags & FLAG_UUID_ID:
+            h = bytes(payload[offset:offset + 16]).hex()
+            event_id = f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+            offset += 16
+        else:
+            event_id, offset = _read_short_str(payload, offset)
+        service, offset = _read_short_str(payload, offset)
+        error_code = None
+        if flags & FLAG_ERROR_CODE:
+            error_code, offset = _read_short_str(payload, offset)
+        metadata = None
+        if flags & FLAG_METADATA:
+            (length,) = _LONG.unpack_from(payload, offset)
+            offset += _LONG.size
+            metadata = _loads_blob(payload[offset:offset + length])
+        
+        return {
+            "id": event_id,
+            "service": service,
+            "timestamp": timestamp,
+            "latency_ms": latency if flags & FLAG_LATENCY else None,
+            "error_code": error_code,
+            "status": STATUS_NAMES[status],
+            "metadata": metadata,
+        }
+
+
+def _pack_binary(event_id, service, timestamp, latency, error_code, status, metadata) -> bytes:
+    flags = 0
+    if latency is not None:
+        flags |= FLAG_LATENCY
+    if error_code is not None:
+        flags |= FLAG_ERROR_CODE
+    if metadata is not None:
+        flags |= FLAG_METADATA
+    id_bytes = _uuid_bytes(event_id)
+    if id_bytes is not None:
+        flags |= FLAG_UUID_ID
+    else:
+        id_bytes = event_id.encode("utf-8")
+    
+    parts = [_FIXED.pack(
+        BINARY_VERSION,
+        flags,
+        timestamp,
+        latency if latency is not None else 0.0,
+        STATUS_CODES[status]
+    )]
+    if not flags & FLAG_UUID_ID:
+        parts.append(_SHORT.pack(len(id_bytes)))
+    parts.append(id_bytes)
+    service_bytes = service.encode("utf-8")
+    parts.append(_SHORT.pack(len(service_bytes)))
+    parts.append(service_bytes)
+    if error_code is not None:
+        error_bytes = error_code.encode("utf-8")
+        parts.append(_SHORT.pack(len(error_bytes)))
+        parts.append(error_bytes)
+    if metadata is not None:
+        blob = _dumps_blob(metadata)
+        parts.append(_LONG.pack(len(blob)))
+        parts.append(blob)
+    return b"".join(parts)
+
+
+def _uuid_bytes(value: str) -> Optional[bytes]:
+    """Raw bytes of a canonical lowercase UUID string, else None.
+    
+    Only canonical strings are packed so decoding reproduces the exact ID.
+    """
+    if (
+        len(value) != 36
+        or value[8] != "-" or value[13] != "-" or value[18] != "-" or value[23] != "-"
+        or value != value.lower()
+    ):
+        return None
+    try:
+        return bytes.fromhex(value.replace("-", ""))
+    except ValueError:
+        return None
+
+
+def _read_short_str(payload: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _SHORT.unpack_from(payload, offset)
+    offset += _SHORT.size
+    return bytes(payload[offset:offset + length]).decode("utf-8"), offset + length
+
+
+SERIALIZERS: Dict[str, Callable[[], Serializer]] = {
+    JsonSerializer.name: JsonSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+    BinarySerializer.name: BinarySerializer,
+}
+
+
+def get_serializer(name: str) -> Serializer:
+    """Look up a serializer by its configured name"""
+    try:
+        factory = SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown serializer '{name}', expected one of: {', '.join(SERIALIZERS)}"
+        )
+    return factory()
+
+
+def _decoder_for(wire_format: str) -> Serializer:
+    if wire_format == "json":
+        return OrjsonSerializer() if orjson is not None else JsonSerializer()
+    if wire_format == "msgpack":
+        return MsgpackSerializer()
+    if wire_format == "binary":
+        return BinarySerializer()
+    raise ValueError(f"Unknown event wire format: {wire_format}")
+
+
+_decoders: Dict[str, Serializer] = {}
+
+
+def decode_event(
+    payload: bytes,
+    headers: Optional[Sequence[Tuple[str, bytes]]] = None
+) -> Dict[str, Any]:
+    """Decode a Kafka message value using the format named in its headers"""
+    wire_format = "json"
+    for key, value in headers or ():
+        if key == FORMAT_HEADER:
+            wire_format = value.decode("ascii")
+            break
+    decoder = _decoders.get(wire_format)
+    if decoder is None:
+        decoder = _decoders[wire_format] = _decoder_for(wire_format)
+    return decoder.decode(payload)
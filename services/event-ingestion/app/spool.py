@@ -0,0 +1,265 @@
+"""Append-only local disk spool for events that could not reach Kafka.
+
+The spool is a directory of fixed-size, memory-mapped segment files. Each
+record is framed as ``<length:u32><crc32:u32><body>`` and the frame header is
+written after the body, so a crash mid-write leaves a zero or mismatching
+header that recovery treats as the end of the segment. A small ``cursor``
+file records how far the replayer has got; fully replayed segments are
+deleted and, when the spool reaches its size limit, the oldest segment is
+dropped to make room for new data.
+"""
+from typing import List, Optional, Sequence, Tuple
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# (topic, key, headers, value) as handed to AIOKafkaProducer.send
+SpoolRecord = Tuple[str, Optional[bytes], Sequence[Tuple[str, bytes]], bytes]
+
+_FRAME = struct.Struct("<II")
+# Key and header value lengths are u32: no segment can hold 4 GiB, so the
+# all-ones "no key" marker never collides with a real length
+_BODY = struct.Struct("<HIH")
+_HEADER_KEY = struct.Struct("<H")
+_HEADER_VALUE = struct.Struct("<I")
+_NO_KEY = 0xFFFFFFFF
+
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+
+class SpoolFull(Exception):
+    """Raised when a record can never fit in a spool segment"""
+
+
+def _encode_record(record: SpoolRecord) -> bytes:
+    topic, key, headers, value = record
+    topic_bytes = topic.encode("utf-8")
+    parts = [
+        _BODY.pack(len(topic_bytes), _NO_KEY if key is None else len(key), len(headers)),
+        topic_bytes,
+    ]
+    if key is not None:
+        parts.append(key)
+    for header_key, header_value in headers:
+        header_key_bytes = header_key.encode("utf-8")
+        parts.append(_HEADER_KEY.pack(len(header_key_bytes)))
+        parts.append(header_key_bytes)
+        parts.append(_HEADER_VALUE.pack(len(header_value)))
+        parts.append(header_value)
+    parts.append(value)
+    return b"".join(parts)
+
+
+def _decode_record(body: bytes) -> SpoolRecord:
+    topic_len, key_len, header_count = _BODY.unpack_from(body, 0)
+    offset = _BODY.size
+    topic = body[offset:offset + topic_len].decode("utf-8")
+    offset += topic_len
+    key = None
+    if key_len != _NO_KEY:
+        key = body[offset:offset + key_len]
+        offset += key_len
+    headers = []
+    for _ in range(header_count):
+        (length,) = _HEADER_KEY.unpack_from(body, offset)
+        offset += _HEADER_KEY.size
+        header_key = body[offset:offset + length].decode("utf-8")
+        offset += length
+        (length,) = _HEADER_VALUE.unpack_from(body, offset)
+        offset += _HEADER_VALUE.size
+        headers.append((header_key, body[offset:offset + length]))
+        offset += length
+    return topic, key, headers, body[offset:]
+
+
+class _Segment:
+    def __init__(self, path: str, seq: int, size: int, create: bool):
+        self.path = path
+        self.seq = seq
+        self.size = size
+        with open(path, "w+b" if create else "r+b") as f:
+            if create:
+                f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size)
+        self.end, self.records = (0, 0) if create else self.scan(0)
+
+    def scan(self, offset: int) -> Tuple[int, int]:
+        """Walk valid frames from offset; returns (end offset, frame count)"""
+        count = 0
+        while offset + _FRAME.size <= self.size:
+            length, crc = _FRAME.unpack_from(self.mm, offset)
+            start = offset + _FRAME.size
+            if length == 0 or start + length > self.size:
+                break
+            if zlib.crc32(self.mm[start:start + length]) != crc:
+                break
+            offset = start + length
+            count += 1
+        return offset, count
+
+    def append(self, body: bytes) -> bool:
+        needed = _FRAME.size + len(body)
+        if self.end + needed > self.size:
+            return False
+        start = self.end + _FRAME.size
+        self.mm[start:start + len(body)] = body
+        _FRAME.pack_into(self.mm, self.end, len(body), zlib.crc32(body))
+        self.end += needed
+        self.records += 1
+        return True
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class DiskSpool:
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.segments: List[_Segment] = []
+        self.cursor: Tuple[int, int] = (0, 0)
+        self.pending_records = 0
+        self.dropped_records = 0
+
+    def open(self):
+        """Recover existing segments and the replay cursor from disk"""
+        os.makedirs(self.directory, exist_ok=True)
+        cursor_path = os.path.join(self.directory, CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            with open(cursor_path) as f:
+                saved = json.load(f)
+            self.cursor = (saved["segment"], saved["offset"])
+
+        seqs = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        for seq in seqs:
+            path = self._segment_path(seq)
+            if seq < self.cursor[0]:
+                os.remove(path)
+                continue
+            self.segments.append(_Segment(path, seq, self.segment_bytes, create=False))
+
+        if not self.segments:
+            self._new_segment(self.cursor[0])
+        if self.cursor[0] != self.segments[0].seq:
+            self.cursor = (self.segments[0].seq, 0)
+
+        first = self.segments[0]
+        replayed = first.records - first.scan(self.cursor[1])[1]
+        self.pending_records = sum(s.records for s in self.segments) - replayed
+        if self.pending_records:
+            logger.info(f"Recovered {self.pending_records} spooled events from {self.directory}")
+
+    def close(self):
+        for segment in self.segments:
+            segment.flush()
+            segment.close()
+        self.segments = []
+
+    @property
+    def disk_bytes(self) -> int:
+        return len(self.segments) * self.segment_bytes
+
+    @property
+    def drained(self) -> bool:
+        """Whether everything appended has been committed"""
+        seq, offset = self.cursor
+        return all(
+            segment.end == (offset if segment.seq == seq else 0)
+            for segment in self.segments
+            if segment.seq >= seq
+        )
+
+    def append(self, records: Sequence[SpoolRecord]):
+        """Append records, rolling segments and dropping the oldest when full"""
+        for record in records:
+            body = _encode_record(record)
+            if _FRAME.size + len(body) > self.segment_bytes:
+                raise SpoolFull(f"Record of {len(body)} bytes exceeds spool segment size")
+            if not self.segments[-1].append(body):
+                self.segments[-1].flush()
+                if len(self.segments) >= self.max_segments:
+                    self._drop_oldest()
+                self._new_segment(self.segments[-1].seq + 1)
+                self.segments[-1].append(body)
+            self.pending_records += 1
+
+    def read_batch(self, max_records: int) -> Tuple[List[SpoolRecord], Tuple[int, int]]:
+        """Read up to max_records from the cursor without consuming them.
+
+        Returns the records and the position to pass to commit() once they
+        have been delivered.
+        """
+        records: List[SpoolRecord] = []
+        seq, offset = self.cursor
+        index = next(i for i, s in enumerate(self.segments) if s.seq == seq)
+        while len(records) < max_records:
+            segment = self.segments[index]
+            if offset >= segment.end:
+                if index + 1 >= len(self.segments):
+                    break
+                index += 1
+                seq, offset = self.segments[index].seq, 0
+                continue
+            length, _ = _FRAME.unpack_from(segment.mm, offset)
+            start = offset + _FRAME.size
+            records.append(_decode_record(segment.mm[start:start + length]))
+            offset = start + length
+        return records, (seq, offset)
+
+    def commit(self, position: Tuple[int, int], count: int):
+        """Mark everything before position as delivered"""
+        if position[0] < self.segments[0].seq:
+            # The segment was dropped for space while the batch was in flight
+            return
+        while self.segments[0].seq < position[0]:
+            segment = self.segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+        self.cursor = position
+        self.pending_records = max(0, self.pending_records - count)
+        self._write_cursor()
+
+    def flush(self):
+        self.segments[-1].flush()
+
+    def _new_segment(self, seq: int):
+        self.segments.append(
+            _Segment(self._segment_path(seq), seq, self.segment_bytes, create=True)
+        )
+
+    def _drop_oldest(self):
+        segment = self.segments.pop(0)
+        unread = segment.records
+        if segment.seq == self.cursor[0]:
+            unread = segment.scan(self.cursor[1])[1]
+        segment.close()
+        os.remove(segment.path)
+        self.cursor = (self.segments[0].seq, 0)
+        self._write_cursor()
+        self.pending_records -= unread
+        self.dropped_records += unread
+        logger.warning(f"Spool full, dropped {unread} unreplayed events from segment {segment.seq}")
+
+    def _write_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segment": self.cursor[0], "offset": self.cursor[1]}, f)
+        os.replace(tmp_path, path)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
@@ -0,0 +1,49 @@
+"""Measure per-event cost of idempotency key checks.
+
+Run from services/event-ingestion:
+
+    python -m benchmarks.bench_dedup [--keys N] [--duplicate-ratio R]
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from app.dedup import Deduplicator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=200_000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+    
+    rng = random.Random(11)
+    keys = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(args.keys)]
+    stream = [
+        rng.choice(keys[:i]) if i and rng.random() < args.duplicate_ratio else key
+        for i, key in enumerate(keys)
+    ]
+    
+    deduplicator = Deduplicator()
+    duplicates = 0
+    started = time.perf_counter()
+    for key in stream:
+        if deduplicator.seen(key):
+            duplicates += 1
+        else:
+            deduplicator.confirm(key)
+    elapsed = time.perf_counter() - started
+    
+    print(json.dumps({
+        "keys": len(stream),
+        "duplicates_detected": duplicates,
+        "ns_per_event": round(elapsed / len(stream) * 1e9),
+        "recent_cache_keys": len(deduplicator.recent),
+        "filter_bytes": len(deduplicator.history.current.table) * 4,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Per-event CPU time of the ingestion validate-and-encode path, before/after.
+
+"before" is the original path, kept here as the baseline: EventCreate
+validation, Event.from_create (a second validation), model_dump() and the
+serializer's dict encoder.
+"after" is the EventRecord fast path used by the endpoints: one validation
+straight into a slotted record, encoded without an intermediate dict. The
+batch variants start from a raw JSON array body, as /events/batch does.
+
+Run from services/event-ingestion:
+
+    python -m benchmarks.bench_event_path [--events N] [--serializer NAME]
+"""
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+import argparse
+import json
+import time
+import uuid
+
+from app.models import EVENT_RECORD_ADAPTER, EVENT_RECORDS_ADAPTER, EventStatus
+from app.serializers import SERIALIZERS, get_serializer
+from benchmarks.bench_serializers import make_events
+
+
+class EventCreate(BaseModel):
+    id: Optional[str] = Field(default=None, min_length=1, max_length=128)
+    service: str
+    timestamp: Optional[int] = None
+    latency_ms: Optional[float] = None
+    error_code: Optional[str] = None
+    status: EventStatus = EventStatus.OK
+    metadata: Optional[Dict[str, Any]] = None
+    
+    def model_post_init(self, __context):
+        if self.timestamp is None:
+            self.timestamp = int(time.time())
+
+
+class Event(EventCreate):
+    id: str
+    
+    @classmethod
+    def from_create(cls, event_create: EventCreate):
+        return cls(
+            id=event_create.id or str(uuid.uuid4()),
+            service=event_create.service,
+            timestamp=event_create.timestamp or int(time.time()),
+            latency_ms=event_create.latency_ms,
+            error_code=event_create.error_code,
+            status=event_create.status,
+            metadata=event_create.metadata
+        )
+
+
+def client_payloads(count: int):
+    payloads = []
+    for event in make_events(count):
+        payload = {key: value for key, value in event.items() if value is not None}
+        payload.pop("id")
+        payloads.append(payload)
+    return payloads
+
+
+def single_before(bodies, serializer):
+    for body in bodies:
+        event = Event.from_create(EventCreate.model_validate(json.loads(body)))
+        serializer.encode(event.model_dump())
+
+
+def single_after(bodies, serializer):
+    now = int(time.time())
+    for body in bodies:
+        record = EVENT_RECORD_ADAPTER.validate_python(json.loads(body))
+        record.finalize(now)
+        serializer.encode_record(record)
+
+
+def batch_before(batch_body, serializer):
+    for item in json.loads(batch_body):
+        event = Event.from_create(EventCreate.model_validate(item))
+        serializer.encode(event.model_dump())
+
+
+def batch_after(batch_body, serializer):
+    now = int(time.time())
+    for record in EVENT_RECORDS_ADAPTER.validate_json(batch_body):
+        record.finalize(now)
+        serializer.encode_record(record)
+
+
+def cpu_ns_per_event(fn, data, serializer, count: int, repeat: int) -> int:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(data, serializer)
+        best = min(best, time.process_time() - started)
+    return round(best / count * 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--serializer", choices=list(SERIALIZERS), action="append")
+    args = parser.parse_args()
+    
+    payloads = client_payloads(args.events)
+    bodies = [json.dumps(payload).encode() for payload in payloads]
+    batch_body = json.dumps(payloads).encode()
+    
+    results = []
+    for name in args.serializer or ["json", "orjson"]:
+        serializer = get_serializer(name)
+        result = {"serializer": name}
+        for label, fn, data in (
+            ("single_before", single_before, bodies),
+            ("single_after", single_after, bodies),
+            ("batch_before", batch_before, batch_body),
+            ("batch_after", batch_after, batch_body),
+        ):
+            result[f"{label}_ns"] = cpu_ns_per_event(fn, data, serializer, args.events, args.repeat)
+        result["single_speedup"] = round(result["single_before_ns"] / result["single_after_ns"], 2)
+        result["batch_speedup"] = round(result["batch_before_ns"] / result["batch_after_ns"], 2)
+        results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
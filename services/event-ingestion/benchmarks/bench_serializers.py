@@ -0,0 +1,94 @@
+"""Compare encode/decode cost and payload size of the event serializers.
+
+Run from services/event-ingestion:
+
+    python -m benchmarks.bench_serializers [--events N]
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from app.serializers import SERIALIZERS, get_serializer
+
+
+def make_events(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    services = ["checkout", "inventory", "payments", "pos-gateway", "loyalty"]
+    events = []
+    for _ in range(count):
+        is_error = rng.random() < 0.05
+        events.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "service": rng.choice(services),
+            "timestamp": 1_700_000_000 + rng.randrange(86_400),
+            "latency_ms": round(rng.lognormvariate(3.5, 0.6), 3),
+            "error_code": "E_TIMEOUT" if is_error else None,
+            "status": "ERROR" if is_error else "OK",
+            "metadata": {
+                "store_id": f"store-{rng.randrange(2000):04d}",
+                "register": rng.randrange(12),
+            } if rng.random() < 0.7 else None,
+        })
+    return events
+
+
+def bench(name: str, events, repeat: int):
+    try:
+        serializer = get_serializer(name)
+    except RuntimeError as e:
+        return {"serializer": name, "skipped": str(e)}
+    
+    encode = serializer.encode
+    payloads = [encode(event) for event in events]
+    best_encode = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for event in events:
+            encode(event)
+        best_encode = min(best_encode, time.perf_counter() - started)
+    
+    decode = serializer.decode
+    best_decode = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        best_decode = min(best_decode, time.perf_counter() - started)
+    
+    return {
+        "serializer": name,
+        "wire_format": serializer.wire_format,
+        "encode_ns_per_event": round(best_encode / len(events) * 1e9),
+        "decode_ns_per_event": round(best_decode / len(events) * 1e9),
+        "bytes_per_event": round(sum(map(len, payloads)) / len(payloads), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    args = parser.parse_args()
+    
+    events = make_events(args.events)
+    results = [bench(name, events, args.repeat) for name in SERIALIZERS]
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'serializer':<10} {'encode ns':>10} {'decode ns':>10} {'bytes':>8}")
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['serializer']:<10} skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['serializer']:<10} {result['encode_ns_per_event']:>10} "
+            f"{result['decode_ns_per_event']:>10} {result['bytes_per_event']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""In-process stand-in for AIOKafkaProducer.
+
+Messages are acknowledged after a simulated broker round trip instead of
+being sent anywhere. Like the real producer, sends made within one linger
+window are acknowledged together, so a single timer serves each batch.
+Latency, jitter and failures are configurable:
+
+    factory = functools.partial(FakeKafkaProducer, latency_ms=5, failure_rate=0.01)
+    kafka_producer.producer_factory = factory
+"""
+from typing import List, Optional
+import asyncio
+import random
+
+
+class FakeBrokerError(Exception):
+    """Delivery failure injected by FakeKafkaProducer"""
+
+
+class FakeKafkaProducer:
+    # Shared by every instance so a benchmark can toggle an outage or read
+    # totals without holding a reference to the producer the app created
+    available = True
+    stats = {"sent": 0, "failed": 0, "bytes": 0, "batches": 0}
+
+    def __init__(
+        self,
+        latency_ms: float = 2.0,
+        jitter_ms: float = 0.5,
+        failure_rate: float = 0.0,
+        linger_ms: Optional[float] = None,
+        seed: int = 1,
+        **producer_config
+    ):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        # Honour the app's kafka_linger_ms unless overridden
+        if linger_ms is None:
+            linger_ms = producer_config.get("linger_ms", 0)
+        self.linger = linger_ms / 1000
+        self.rng = random.Random(seed)
+        self.started = False
+        self._batch: List[asyncio.Future] = []
+
+    @classmethod
+    def reset_stats(cls):
+        cls.stats = {"sent": 0, "failed": 0, "bytes": 0, "batches": 0}
+
+    async def start(self):
+        if not FakeKafkaProducer.available:
+            raise FakeBrokerError("Fake broker unavailable")
+        self.started = True
+
+    async def stop(self):
+        self.started = False
+
+    async def send(self, topic, value=None, key=None, headers=None, **kwargs) -> asyncio.Future:
+        """Buffer one message; the returned future resolves on acknowledgement"""
+        if not self.started:
+            raise FakeBrokerError("Producer not started")
+        future = asyncio.get_running_loop().create_future()
+        if not self._batch:
+            delay = self.linger + max(0.0, self.rng.gauss(self.latency, self.jitter))
+            asyncio.get_running_loop().call_later(delay, self._complete, self._batch)
+        self._batch.append(future)
+        FakeKafkaProducer.stats["bytes"] += len(value)
+        return future
+
+    async def send_and_wait(self, topic, value=None, key=None, headers=None, **kwargs):
+        future = await self.send(topic, value=value, key=key, headers=headers)
+        return await future
+
+    def _complete(self, batch: List[asyncio.Future]):
+        if batch is self._batch:
+            self._batch = []
+        stats = FakeKafkaProducer.stats
+        stats["batches"] += 1
+        for future in batch:
+            if future.done():
+                continue
+            if not FakeKafkaProducer.available or self.rng.random() < self.failure_rate:
+                future.set_exception(FakeBrokerError("Injected delivery failure"))
+                stats["failed"] += 1
+            else:
+                future.set_result(None)
+                stats["sent"] += 1
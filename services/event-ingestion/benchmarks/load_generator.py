@@ -0,0 +1,301 @@
+"""Drive the ingestion app with realistic event mixes and report capacity.
+
+Kafka is replaced by the in-process FakeKafkaProducer, so only the service
+itself is measured. Two transports are supported:
+
+- ``asgi``: requests go straight into the app through httpx's ASGI
+  transport. No sockets or HTTP parsing; CPU per event includes the client.
+- ``socket``: the app runs under uvicorn in a background thread and is
+  driven over real TCP connections. CPU per event is the server thread's
+  own CPU time (Linux), so client cost is excluded.
+
+Results (throughput, request latency p50/p99/p999, CPU per event and fake
+broker totals) are printed as JSON, one object per run, so they can be
+stored and compared across releases. Needs httpx, which is not a service
+dependency.
+
+Run from services/event-ingestion:
+
+    python -m benchmarks.load_generator --transport asgi --mix steady
+    python -m benchmarks.load_generator --transport socket --mix batch-heavy \\
+        --concurrency 64 --duration 30 --broker-latency-ms 5 --output run.json
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_serializers import make_events
+
+NDJSON = "application/x-ndjson"
+
+# Share of requests per request kind, batch size and share of retried
+# (already ingested) client IDs
+MIXES = {
+    # Mostly single events from SDKs, occasional small batches
+    "steady": {"single": 0.8, "batch": 0.2, "ndjson": 0.0, "batch_size": 50, "retries": 0.01},
+    # Collectors shipping large batches
+    "batch-heavy": {"single": 0.1, "batch": 0.6, "ndjson": 0.3, "batch_size": 500, "retries": 0.01},
+    # Clients replaying after an outage: many duplicate IDs
+    "retry-storm": {"single": 0.5, "batch": 0.5, "ndjson": 0.0, "batch_size": 100, "retries": 0.3},
+}
+
+
+def client_events(count: int, seed: int):
+    """Event payloads as clients send them, with skewed service popularity"""
+    rng = random.Random(seed)
+    services = ["checkout", "inventory", "payments", "pos-gateway", "loyalty", "search", "auth"]
+    weights = [1 / (rank + 1) for rank in range(len(services))]
+    events = []
+    for event in make_events(count, seed):
+        event = {key: value for key, value in event.items() if value is not None}
+        event["service"] = rng.choices(services, weights)[0]
+        events.append(event)
+    return events
+
+
+def build_requests(mix: dict, count: int, seed: int = 11):
+    """Pre-encode request bodies so the client spends little time per request.
+
+    Returns (path, body, content type, event count) tuples. Retried IDs are
+    drawn from earlier requests; other events carry no ID and get a fresh
+    one on the server.
+    """
+    rng = random.Random(seed)
+    pool = client_events(max(count, 1000), seed)
+    issued_ids = []
+    kinds = ["single", "batch", "ndjson"]
+    weights = [mix[kind] for kind in kinds]
+    requests = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        size = 1 if kind == "single" else max(1, int(rng.expovariate(1 / mix["batch_size"])))
+        events = []
+        for _ in range(size):
+            event = dict(rng.choice(pool))
+            event.pop("id", None)
+            if issued_ids and rng.random() < mix["retries"]:
+                event["id"] = rng.choice(issued_ids)
+            elif rng.random() < 0.5:
+                event["id"] = f"client-{len(issued_ids)}-{seed}"
+                issued_ids.append(event["id"])
+            events.append(event)
+
+        if kind == "single":
+            requests.append(("/events", json.dumps(events[0]).encode(), "application/json", 1))
+        elif kind == "batch":
+            requests.append(("/events/batch", json.dumps(events).encode(), "application/json", size))
+        else:
+            body = "\n".join(json.dumps(event) for event in events).encode()
+            requests.append(("/events/batch", body, NDJSON, size))
+    return requests
+
+
+def percentile(ordered, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def drive(client, requests, concurrency: int, duration: float, warmup: float):
+    """Replay requests from `concurrency` workers for warmup + duration seconds"""
+    source = itertools.cycle(requests)
+    latencies = []
+    statuses = {}
+    totals = {"events": 0, "requests": 0}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker():
+        while True:
+            path, body, content_type, events = next(source)
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            response = await client.post(path, content=body, headers={"content-type": content_type})
+            done = time.perf_counter()
+            if sent < measure_from:
+                continue
+            latencies.append(done - sent)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            totals["requests"] += 1
+            if response.status_code < 300:
+                totals["events"] += events
+
+    await asyncio.sleep(0)
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, totals
+
+
+class CpuClock:
+    """CPU time of one thread where the platform allows, else of the process"""
+
+    def __init__(self, thread: threading.Thread = None):
+        self.clock_id = None
+        if thread is not None and hasattr(time, "pthread_getcpuclockid"):
+            self.clock_id = time.pthread_getcpuclockid(thread.ident)
+        self.scope = "server_thread" if self.clock_id is not None else "process"
+
+    def read(self) -> float:
+        if self.clock_id is not None:
+            return time.clock_gettime(self.clock_id)
+        return time.process_time()
+
+
+async def run_asgi(app, requests, args):
+    import httpx
+
+    await app.router.startup()
+    clock = CpuClock()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ingestion") as client:
+            return await measure(client, requests, args, clock)
+    finally:
+        await app.router.shutdown()
+
+
+async def run_socket(app, requests, args):
+    import httpx
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(app, log_level="warning", access_log=False, lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        await asyncio.sleep(0.05)
+
+    clock = CpuClock(thread)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            return await measure(client, requests, args, clock)
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+async def measure(client, requests, args, clock: CpuClock):
+    from benchmarks.fake_broker import FakeKafkaProducer
+
+    # Let warm-up traffic settle before sampling CPU and broker totals
+    await drive(client, requests, args.concurrency, 0, args.warmup)
+    FakeKafkaProducer.reset_stats()
+    cpu_started = clock.read()
+    latencies, statuses, totals = await drive(client, requests, args.concurrency, args.duration, 0)
+    cpu = clock.read() - cpu_started
+
+    latencies.sort()
+    events = totals["events"]
+    return {
+        "requests": totals["requests"],
+        "events": events,
+        "status_counts": {str(code): count for code, count in sorted(statuses.items())},
+        "requests_per_second": round(totals["requests"] / args.duration, 1),
+        "events_per_second": round(events / args.duration, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "p999": round(percentile(latencies, 0.999) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "cpu_us_per_event": round(cpu / events * 1e6, 2) if events else None,
+        "cpu_scope": clock.scope,
+        "broker": dict(FakeKafkaProducer.stats),
+    }
+
+
+def configure_environment(args, spool_dir: str):
+    """Settings are read at import time, so set them before importing app"""
+    os.environ["PRODUCER_DELIVERY_MODE"] = args.delivery_mode
+    os.environ["KAFKA_SERIALIZER"] = args.serializer
+    os.environ["SPOOL_ENABLED"] = "true" if args.spool else "false"
+    os.environ["SPOOL_DIR"] = spool_dir
+    os.environ["DEDUP_ENABLED"] = "false" if args.no_dedup else "true"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=["asgi", "socket"], action="append")
+    parser.add_argument("--mix", choices=list(MIXES), action="append")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=5000, help="Distinct pre-built requests per mix")
+    parser.add_argument("--delivery-mode", choices=["sync", "broker", "enqueue"], default="broker")
+    parser.add_argument("--serializer", default="json")
+    parser.add_argument("--spool", action="store_true", help="Enable the disk spool (temp directory)")
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--broker-latency-ms", type=float, default=2.0)
+    parser.add_argument("--broker-jitter-ms", type=float, default=0.5)
+    parser.add_argument("--broker-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Also write results to this file")
+    args = parser.parse_args()
+    started_at = int(time.time())
+
+    with tempfile.TemporaryDirectory(prefix="ingestion-bench-") as spool_dir:
+        configure_environment(args, spool_dir)
+        from app.kafka_producer import kafka_producer
+        from app.main import app
+        from benchmarks.fake_broker import FakeKafkaProducer
+
+        kafka_producer.producer_factory = functools.partial(
+            FakeKafkaProducer,
+            latency_ms=args.broker_latency_ms,
+            jitter_ms=args.broker_jitter_ms,
+            failure_rate=args.broker_failure_rate
+        )
+
+        results = []
+        for mix_name in args.mix or ["steady"]:
+            requests = build_requests(MIXES[mix_name], args.requests)
+            for transport in args.transport or ["asgi"]:
+                runner = run_asgi if transport == "asgi" else run_socket
+                result = {
+                    "mix": mix_name,
+                    "transport": transport,
+                    "concurrency": args.concurrency,
+                    "duration_seconds": args.duration,
+                    "delivery_mode": args.delivery_mode,
+                    "serializer": args.serializer,
+                    "spool": args.spool,
+                    "dedup": not args.no_dedup,
+                    "broker_latency_ms": args.broker_latency_ms,
+                    "broker_failure_rate": args.broker_failure_rate,
+                }
+                result.update(asyncio.run(runner(app, requests, args)))
+                results.append(result)
+
+    report = {
+        "service": "event-ingestion",
+        "version": app.version,
+        "python": platform.python_version(),
+        "started_at": started_at,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import time
+
+from app.dedup import CuckooFilter, Deduplicator, RotatingCuckooFilter, _locate
+
+
+def keys(count, prefix="key"):
+    return [_locate(f"{prefix}-{i}") for i in range(count)]
+
+
+def test_no_false_negatives_up_to_capacity():
+    cuckoo = CuckooFilter(10_000)
+    added = keys(10_000)
+    assert all(cuckoo.add(location) for location in added)
+    assert all(cuckoo.contains(location) for location in added)
+    assert cuckoo.count == len(added)
+
+
+def test_false_positive_rate_is_small():
+    cuckoo = CuckooFilter(10_000)
+    for location in keys(10_000):
+        cuckoo.add(location)
+    false_positives = sum(cuckoo.contains(location) for location in keys(100_000, prefix="other"))
+    # 8 candidate slots of 32-bit fingerprints: ~2e-9 per lookup
+    assert false_positives <= 2
+
+
+def test_add_reports_a_full_filter():
+    cuckoo = CuckooFilter(16)
+    assert not all(cuckoo.add(location) for location in keys(1_000))
+
+
+def test_rotation_keeps_the_previous_generation():
+    history = RotatingCuckooFilter(horizon_seconds=3600, capacity=100)
+    first = keys(100, prefix="first")
+    for location in first:
+        history.add(location)
+    second = keys(100, prefix="second")
+    for location in second:
+        history.add(location)
+    # Adding past capacity rotated once: both sets are still remembered
+    assert all(history.contains(location) for location in first + second)
+    for location in keys(100, prefix="third"):
+        history.add(location)
+    assert not any(history.contains(location) for location in first)
+
+
+def test_rotation_after_half_the_horizon(monkeypatch):
+    history = RotatingCuckooFilter(horizon_seconds=10, capacity=100)
+    history.add(_locate("old"))
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    history.add(_locate("new"))
+    assert history.previous is not None
+    assert history.contains(_locate("old")) and history.contains(_locate("new"))
+
+
+def test_reserve_confirm_release():
+    dedup = Deduplicator()
+    assert dedup.seen("a") is False
+    # In flight: a concurrent retry is caught by the recent cache
+    assert dedup.seen("a") is True
+    dedup.confirm("a")
+    dedup.recent.discard("a")
+    # Past the recent TTL the long-horizon filter still knows it
+    assert dedup.seen("a") is True
+    assert (dedup.recent_hits, dedup.filter_hits) == (1, 1)
+
+    assert dedup.seen("b") is False
+    dedup.release("b")
+    # A failed delivery can be retried
+    assert dedup.seen("b") is False
@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+from pydantic import ValidationError
+
+from app.models import EVENT_RECORD_ADAPTER, MAX_SHORT_STRING, new_event_id
+from app.serializers import SERIALIZERS, get_serializer
+
+
+def test_new_event_id_is_a_uuid4():
+    ids = {new_event_id() for _ in range(1000)}
+    assert len(ids) == 1000
+    for event_id in ids:
+        assert str(uuid.UUID(event_id)) == event_id
+        assert uuid.UUID(event_id).version == 4
+
+
+def test_finalize_keeps_client_ids_and_fills_defaults():
+    client = EVENT_RECORD_ADAPTER.validate_python({"id": "client-1", "service": "checkout"})
+    assert client.finalize(now=100) is True
+    assert (client.id, client.timestamp) == ("client-1", 100)
+
+    server = EVENT_RECORD_ADAPTER.validate_python({"service": "checkout", "timestamp": 5})
+    assert server.finalize(now=100) is False
+    assert server.timestamp == 5 and uuid.UUID(server.id).version == 4
+
+
+@pytest.mark.parametrize("name", list(SERIALIZERS))
+def test_largest_valid_record_encodes(name):
+    record = EVENT_RECORD_ADAPTER.validate_python({
+        "service": "é" * MAX_SHORT_STRING,
+        "error_code": "\U0001F600" * MAX_SHORT_STRING,
+        "timestamp": 2**63 - 1,
+    })
+    record.finalize(now=0)
+    get_serializer(name).encode_record(record)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("service", "s" * (MAX_SHORT_STRING + 1)),
+    ("error_code", "e" * (MAX_SHORT_STRING + 1)),
+    ("timestamp", 10**20),
+])
+def test_unencodable_fields_fail_validation(field, value):
+    with pytest.raises(ValidationError):
+        EVENT_RECORD_ADAPTER.validate_python({"service": "checkout", field: value})
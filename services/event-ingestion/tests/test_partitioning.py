@@ -0,0 +1,55 @@
+from app.models import EventRecord
+from app.partitioning import HeavyHitterSketch, Partitioner
+
+
+class AlwaysHot(HeavyHitterSketch):
+    def __init__(self):
+        super().__init__(capacity=8, window_seconds=60, hot_share=0.0)
+
+    def observe(self, key):
+        return True
+
+
+def event(service="checkout", store_id=None):
+    return EventRecord(id="e1", service=service, metadata={"store_id": store_id} if store_id else None)
+
+
+def partitioner(strategy, ordered=(), url=""):
+    return Partitioner(
+        strategy,
+        metadata_field="store_id",
+        salt_buckets=8,
+        ordered_services=set(ordered),
+        sketch=AlwaysHot(),
+        ordered_services_url=url,
+    )
+
+
+def test_service_strategy_keys_by_service():
+    assert partitioner("service").key_for(event(store_id=7)) == ("checkout", "service")
+
+
+def test_hot_service_is_salted_by_metadata():
+    key, strategy = partitioner("salted").key_for(event(store_id=7))
+    assert strategy == "salted"
+    assert key.startswith("checkout#")
+    assert partitioner("salted").key_for(event(store_id=7)) == (key, strategy)
+
+
+def test_metadata_strategy_falls_back_to_service():
+    assert partitioner("metadata").key_for(event(store_id=7)) == ("store_id:7", "metadata:store_id")
+    assert partitioner("metadata").key_for(event()) == ("checkout", "service")
+
+
+def test_ordered_services_are_never_split():
+    for strategy in ("salted", "metadata"):
+        assert partitioner(strategy, ordered={"checkout"}).key_for(event(store_id=7)) == ("checkout", "service")
+
+
+def test_nothing_is_split_until_stateful_services_are_known():
+    for strategy in ("salted", "metadata"):
+        keys = partitioner(strategy, url="http://rules/stateful-services")
+        assert keys.key_for(event(store_id=7)) == ("checkout", "service")
+        keys.set_stateful_services({"checkout"})
+        assert keys.key_for(event(store_id=7)) == ("checkout", "service")
+        assert keys.key_for(event("payments", store_id=7))[1] != "service"
@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from app.config import settings
+from app.dedup import Deduplicator
+from app.kafka_producer import KafkaProducerManager, ProducerQueueFull, _PendingEvent
+from app.models import EVENT_RECORD_ADAPTER
+from benchmarks.fake_broker import FakeKafkaProducer
+
+
+@pytest.fixture(autouse=True)
+def broker(monkeypatch):
+    monkeypatch.setattr(settings, "spool_enabled", False)
+    monkeypatch.setattr(FakeKafkaProducer, "available", True)
+    FakeKafkaProducer.reset_stats()
+    yield FakeKafkaProducer.stats
+    FakeKafkaProducer.reset_stats()
+
+
+def manager(monkeypatch, mode):
+    monkeypatch.setattr(settings, "producer_delivery_mode", mode)
+    return KafkaProducerManager(lambda **_: FakeKafkaProducer(latency_ms=5, jitter_ms=0))
+
+
+def events(count):
+    records = [EVENT_RECORD_ADAPTER.validate_python({"service": "checkout", "latency_ms": i}) for i in range(count)]
+    for record in records:
+        record.finalize(now=0)
+    return records
+
+
+@pytest.mark.parametrize("mode, acked_on_return", [("sync", True), ("broker", True), ("enqueue", False)])
+def test_delivery_modes(monkeypatch, broker, mode, acked_on_return):
+    producer = manager(monkeypatch, mode)
+
+    async def run():
+        await producer.start()
+        first, *rest = events(5)
+        await producer.send_event(settings.kafka_topic_events, first)
+        results = await producer.send_batch(settings.kafka_topic_events, rest)
+        sent_on_return = broker["sent"]
+        # Stopping flushes whatever is still queued
+        await producer.stop()
+        return results, sent_on_return
+
+    results, sent_on_return = asyncio.run(run())
+    assert results == [None] * 4
+    assert sent_on_return == (5 if acked_on_return else 0)
+    assert broker["sent"] == 5
+
+
+def test_broker_mode_reports_failed_deliveries(monkeypatch, broker):
+    producer = manager(monkeypatch, "broker")
+
+    async def run():
+        await producer.start()
+        FakeKafkaProducer.available = False
+        try:
+            return await producer.send_batch(settings.kafka_topic_events, events(2))
+        finally:
+            FakeKafkaProducer.available = True
+            await producer.stop()
+
+    assert [type(result).__name__ for result in asyncio.run(run())] == ["FakeBrokerError"] * 2
+
+
+def test_full_queue_is_all_or_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "producer_queue_max_size", 3)
+    producer = manager(monkeypatch, "enqueue")
+
+    async def run():
+        # Not started, so nothing drains the queue
+        producer._queue = asyncio.Queue(maxsize=settings.producer_queue_max_size)
+        await producer.send_batch(settings.kafka_topic_events, events(2))
+        with pytest.raises(ProducerQueueFull):
+            await producer.send_batch(settings.kafka_topic_events, events(2))
+        return producer._queue.qsize()
+
+    assert asyncio.run(run()) == 2
+
+
+def test_full_queue_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "producer_retry_after_seconds", 7)
+    monkeypatch.setattr(settings, "dedup_filter_capacity", 1024)
+    monkeypatch.setattr(main, "deduplicator", Deduplicator())
+    producer = manager(monkeypatch, "enqueue")
+    monkeypatch.setattr(main, "kafka_producer", producer)
+
+    async def run():
+        producer._queue = asyncio.Queue(maxsize=1)
+        producer._queue.put_nowait(_PendingEvent(None, None))
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ingestion") as client:
+            single = await client.post("/events", json={"id": "e1", "service": "checkout"})
+            batch = await client.post("/events/batch", json=[{"id": "e1", "service": "checkout"}])
+        return single, batch
+
+    single, batch = asyncio.run(run())
+    for response in (single, batch):
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "7"
+    # The rejected ID was released, so the client's retry is not a duplicate
+    assert not main.deduplicator.seen("e1")
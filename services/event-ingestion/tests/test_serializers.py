@@ -0,0 +1,62 @@
+import pytest
+
+from app.models import EVENT_RECORD_ADAPTER
+from app.serializers import FORMAT_HEADER, SERIALIZERS, BinarySerializer, get_serializer
+
+EVENTS = [
+    {
+        "id": "0b5e7c1a-3f4d-4e2a-9c8b-7a6f5e4d3c2b",
+        "service": "checkout",
+        "timestamp": 1_700_000_000,
+        "latency_ms": 12.5,
+        "error_code": None,
+        "status": "OK",
+        "metadata": None,
+    },
+    {
+        # Not a canonical UUID, so it travels as a string
+        "id": "0B5E7C1A-3F4D-4E2A-9C8B-7A6F5E4D3C2B",
+        "service": "paiement-é",
+        "timestamp": -1,
+        "latency_ms": None,
+        "error_code": "E42",
+        "status": "ERROR",
+        "metadata": {"store_id": "s-1", "items": [1, 2.5, None], "nested": {"ok": True}},
+    },
+    {
+        "id": "client-supplied",
+        "service": "inventory",
+        "timestamp": 0,
+        "latency_ms": 0.0,
+        "error_code": "",
+        "status": "WARNING",
+        "metadata": {},
+    },
+]
+
+
+@pytest.mark.parametrize("name", list(SERIALIZERS))
+@pytest.mark.parametrize("event", EVENTS, ids=["uuid-id", "string-id", "zero-values"])
+def test_round_trip(name, event):
+    serializer = get_serializer(name)
+    assert serializer.decode(serializer.encode(event)) == event
+    record = EVENT_RECORD_ADAPTER.validate_python(event)
+    assert serializer.decode(serializer.encode_record(record)) == event
+
+
+def test_binary_packs_canonical_uuids_raw():
+    serializer = BinarySerializer()
+    uuid_id, string_id = EVENTS[0], dict(EVENTS[0], id="not-a-uuid-but-36-characters-long-xx")
+    assert len(serializer.encode(string_id)) - len(serializer.encode(uuid_id)) == 36 + 2 - 16
+
+
+def test_binary_rejects_unknown_versions():
+    payload = bytearray(BinarySerializer().encode(EVENTS[0]))
+    payload[0] = 2
+    with pytest.raises(ValueError):
+        BinarySerializer().decode(bytes(payload))
+
+
+def test_format_header():
+    assert get_serializer("orjson").headers == [(FORMAT_HEADER, b"json")]
+    assert get_serializer("binary").headers == [(FORMAT_HEADER, b"binary")]
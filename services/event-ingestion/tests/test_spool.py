@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.kafka_producer import KafkaProducerManager
+from app.spool import DiskSpool, _decode_record, _encode_record
+from benchmarks.fake_broker import FakeKafkaProducer
+
+
+def spool_at(path, segment_bytes=4096, max_bytes=64 * 1024):
+    spool = DiskSpool(str(path), segment_bytes=segment_bytes, max_bytes=max_bytes)
+    spool.open()
+    return spool
+
+
+def record(i, key=b"checkout"):
+    return "events", key, [("content-type", b"application/json")], b'{"n": %d}' % i
+
+
+@pytest.mark.parametrize(
+    "key", [None, b"", b"k" * 0xFFFF, b"k" * 70_000], ids=["none", "empty", "u16-max", "over-u16"]
+)
+def test_record_framing_round_trip(key):
+    headers = [("content-type", b"application/json"), ("trace", b"t" * 70_000)]
+    assert _decode_record(_encode_record(("events", key, headers, b"body"))) == ("events", key, headers, b"body")
+
+
+def test_records_survive_reopen_and_torn_write(tmp_path):
+    spool = spool_at(tmp_path)
+    spool.append([record(i) for i in range(3)])
+    end = spool.segments[-1].end
+    # A crash mid-append leaves the body without its frame header
+    spool.segments[-1].mm[end + 8:end + 12] = b"torn"
+    spool.close()
+
+    spool = spool_at(tmp_path)
+    records, _ = spool.read_batch(10)
+    assert records == [record(i) for i in range(3)]
+    assert spool.pending_records == 3
+
+
+def test_commit_rolls_segments_and_drains(tmp_path):
+    spool = spool_at(tmp_path, segment_bytes=256)
+    spool.append([record(i) for i in range(10)])
+    assert len(spool.segments) > 1 and not spool.drained
+
+    records, position = spool.read_batch(4)
+    spool.commit(position, len(records))
+    assert not spool.drained
+    rest, position = spool.read_batch(100)
+    assert records + rest == [record(i) for i in range(10)]
+    spool.commit(position, len(rest))
+    assert spool.drained and spool.pending_records == 0
+    spool.close()
+
+
+def test_oldest_segment_dropped_when_full(tmp_path):
+    spool = spool_at(tmp_path, segment_bytes=256, max_bytes=512)
+    spool.append([record(i) for i in range(20)])
+    assert len(spool.segments) == 2
+    records, _ = spool.read_batch(100)
+    assert spool.dropped_records == 20 - len(records)
+    assert records == [record(i) for i in range(20 - len(records), 20)]
+    spool.close()
+
+
+def test_direct_sends_resume_only_once_spool_is_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "spool_replay_batch_size", 2)
+
+    async def run():
+        manager = KafkaProducerManager(lambda **_: FakeKafkaProducer(latency_ms=0, jitter_ms=0))
+        manager.spool = spool_at(tmp_path)
+        manager.spool.append([record(i) for i in range(3)])
+        await manager._start_producer()
+        states = [manager.healthy]
+        while await manager._replay_batch():
+            states.append(manager.healthy)
+        await manager.producer.stop()
+        manager.spool.close()
+        return states
+
+    # Still spooling after the first batch, so newer events queue behind it
+    assert asyncio.run(run()) == [False, False, True]
+
+
+def test_queue_overflow_keeps_order_through_the_spool(tmp_path):
+    async def run():
+        manager = KafkaProducerManager(lambda **_: FakeKafkaProducer(latency_ms=0, jitter_ms=0))
+        manager.delivery_mode = "enqueue"
+        manager.spool = spool_at(tmp_path)
+        manager._queue = asyncio.Queue(maxsize=2)
+        await manager._start_producer()
+        manager._set_healthy(True)
+        manager._enqueue([record(0), record(1)])
+        # The overflow takes the queued records along, and later ones follow
+        manager._enqueue([record(2), record(3)])
+        healthy = manager.healthy
+        manager._enqueue([record(4)])
+        spooled, _ = manager.spool.read_batch(100)
+        while await manager._replay_batch():
+            pass
+        await manager.producer.stop()
+        manager.spool.close()
+        return healthy, manager._queue.qsize(), spooled, manager.healthy
+
+    healthy, queued, spooled, resumed = asyncio.run(run())
+    assert not healthy and queued == 0
+    assert spooled == [record(i) for i in range(5)]
+    assert resumed
@@ -0,0 +1,23 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # App Configuration
+    app_name: str = "User Management Service"
+    environment: str = "development"
+    port: int = 8004
+    
+    # JWT Configuration: shared with the API gateway, which verifies the
+    # tokens issued here without calling back
+    jwt_secret_key: str = "change-this-secret-key-in-production"
+    jwt_algorithm: str = "HS256"
+    jwt_expiration_minutes: int = 60
+    jwt_issuer: str = ""
+    jwt_audience: str = ""
+    
+    class Config:
+        env_file = ".env"
+        case_sensitive = False
+
+
+settings = Settings()
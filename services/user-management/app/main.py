@@ -1,8 +1,12 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import jwt, JWTError
 from pydantic import BaseModel
 import time
 import hashlib
 
+from .config import settings
+
 app = FastAPI(title="User Management Service")
 
 # Simple in-memory storage (for demo)
@@ -22,6 +26,41 @@ def hash_password(password: str) -> str:
     """Simple password hashing for demo"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+def create_access_token(user: dict) -> str:
+    """Signed JWT the API gateway verifies with the shared secret"""
+    now = int(time.time())
+    claims = {
+        "sub": user["id"],
+        "email": user["email"],
+        "role": user["role"],
+        "iat": now,
+        "exp": now + settings.jwt_expiration_minutes * 60,
+    }
+    if settings.jwt_issuer:
+        claims["iss"] = settings.jwt_issuer
+    if settings.jwt_audience:
+        claims["aud"] = settings.jwt_audience
+    return jwt.encode(claims, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+bearer = HTTPBearer()
+
+def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer)) -> dict:
+    try:
+        claims = jwt.decode(
+            credentials.credentials,
+            settings.jwt_secret_key,
+            algorithms=[settings.jwt_algorithm],
+            audience=settings.jwt_audience or None,
+            issuer=settings.jwt_issuer or None,
+            options={"verify_aud": bool(settings.jwt_audience)}
+        )
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user = next((user for user in users_db.values() if user["id"] == claims.get("sub")), None)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return user
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "user-management"}
@@ -64,20 +103,19 @@ async def login(credentials: UserLogin):
     if user["password"] != hash_password(credentials.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Return simple token
     return {
-        "access_token": f"token-{user['id']}-{int(time.time())}",
+        "access_token": create_access_token(user),
         "token_type": "bearer",
-        "expires_in": 3600
+        "expires_in": settings.jwt_expiration_minutes * 60
     }
 
 @app.get("/auth/me")
-async def get_me():
+async def get_me(user: dict = Depends(current_user)):
     return {
-        "id": "user-1",
-        "email": "demo@example.com",
-        "full_name": "Demo User",
-        "role": "admin",
+        "id": user["id"],
+        "email": user["email"],
+        "full_name": user["full_name"],
+        "role": user["role"],
         "is_active": True,
-        "created_at": int(time.time())
+        "created_at": user["created_at"]
     }